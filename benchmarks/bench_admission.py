@@ -0,0 +1,125 @@
+"""
+Worker latency during an import burst, with and without admission control.
+
+Many concurrent clients post webhooks while a handful of workers keep
+claiming from /job/next. With admission control on, webhooks beyond the
+webhook concurrency limit (or past the queue-depth and DB-latency thresholds)
+are shed with 429/503 + Retry-After. The senders retry them like the *arr
+apps do, after Retry-After scaled by --retry-scale so a run stays short.
+Reports claim latency, how long the whole burst took to get in and how many
+attempts were shed, driving the app in-process.
+
+    python -m benchmarks.bench_admission --webhooks 5000 --clients 200
+    python -m benchmarks.bench_admission --webhook-concurrency 8 --max-pending 1000
+"""
+import argparse
+import asyncio
+import dataclasses
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from benchmarks.load import summarize, webhook_requests
+from main import app, get_db_session
+from src.admission import AdmissionControl
+from src.config import settings
+from src.db import Base, create_async_db_engine, create_db_engine
+from src.metrics import db_latency
+from src.queue_index import pending_index, reconcile_once
+
+async def send_webhooks(client: httpx.AsyncClient, args) -> dict:
+    """Post every webhook from `args.clients` senders, retrying shed ones after Retry-After."""
+    queue = iter(webhook_requests(args.webhooks))
+    statuses = {}
+
+    async def sender():
+        for path, body in queue:
+            while True:
+                response = await client.post(path, json=body)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code not in (429, 503):
+                    break
+                await asyncio.sleep(float(response.headers["Retry-After"]) * args.retry_scale)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(args.clients)))
+    return {"seconds": time.perf_counter() - started, "statuses": statuses}
+
+async def burst(args, control: AdmissionControl) -> dict:
+    url = f"sqlite:///{Path(tempfile.mkdtemp()) / 'admission.db'}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    engine = create_async_db_engine(url)
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def bench_db_session():
+        async with sessions() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = bench_db_session
+    app.state.admission = control
+    pending_index.reset()
+    db_latency.reset()
+    await reconcile_once(sessions)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            flood = asyncio.create_task(send_webhooks(client, args))
+
+            latencies, statuses = [], {}
+            async def worker(n: int):
+                while not flood.done():
+                    started = time.perf_counter()
+                    response = await client.get("/job/next", params={"worker_id": f"bench-{n}"})
+                    latencies.append(time.perf_counter() - started)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    await asyncio.sleep(args.claim_interval)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(n) for n in range(args.workers)))
+            return {"webhook": await flood, "job_next": summarize(latencies, statuses, time.perf_counter() - started)}
+    finally:
+        app.dependency_overrides.pop(get_db_session, None)
+        pending_index.reset()
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--webhooks", type=int, default=3000, help="webhooks in the burst")
+    parser.add_argument("--clients", type=int, default=200, help="concurrent webhook senders")
+    parser.add_argument("--workers", type=int, default=8, help="workers claiming during the burst")
+    parser.add_argument("--claim-interval", type=float, default=0.01, help="pause between a worker's claims")
+    parser.add_argument("--retry-scale", type=float, default=0.1, help="fraction of Retry-After senders wait")
+    parser.add_argument("--webhook-concurrency", type=int, default=settings.admission_webhook_concurrency)
+    parser.add_argument("--max-pending", type=int, default=settings.admission_max_pending)
+    parser.add_argument("--max-db-latency-ms", type=float, default=settings.admission_max_db_latency_ms)
+    args = parser.parse_args()
+
+    enabled = dataclasses.replace(
+        settings,
+        admission_webhook_concurrency=args.webhook_concurrency,
+        admission_max_pending=args.max_pending,
+        admission_max_db_latency_ms=args.max_db_latency_ms,
+    )
+    disabled = dataclasses.replace(
+        settings,
+        admission_webhook_concurrency=10**9,
+        admission_worker_concurrency=10**9,
+        admission_max_pending=0,
+        admission_max_db_latency_ms=0,
+    )
+    for name, run_settings in [("without admission", disabled), ("with admission", enabled)]:
+        results = asyncio.run(burst(args, AdmissionControl(run_settings)))
+        claims, hooks = results["job_next"], results["webhook"]
+        print(
+            f"{name:>17}: /job/next p50 {claims['p50_ms']:7.2f} ms  p99 {claims['p99_ms']:8.2f} ms  "
+            f"({claims['requests']} claims)   burst in {hooks['seconds']:6.1f} s  {hooks['statuses']}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Cost of a single /job/next claim, searching the jobs table versus picking the
+job from the in-process pending index (src/queue_index.py) and claiming it
+by id. Both runs get an identically seeded SQLite file: --pending queued jobs
+with mixed priorities and size classes behind --history finished ones, and
+claim them one at a time for a registered worker.
+
+    python -m benchmarks.bench_claim --pending 20000 --history 200000 --claims 2000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.db import Base, Job, create_async_db_engine, create_db_engine
+from src.JobService import AsyncJobService
+from src.queue_index import pending_entries_query, pending_index
+from src.workers import LARGE, SMALL, WorkerCapabilities
+
+def seed(url: str, pending: int, history: int, seed: int) -> None:
+    rng = random.Random(seed)
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+    rows = [
+        {
+            "job_type": "episode",
+            "source_path": f"/bench/{n}.mkv",
+            "status": "done" if n < history else "pending",
+            "schedule_key": rng.uniform(0, 1e6),
+            "size_class": LARGE if rng.random() < 0.1 else SMALL,
+            "encoder": rng.choice(["hevc", "av1"]),
+            "size_bytes": rng.randint(1, 80) * 1024 ** 3,
+        }
+        for n in range(history + pending)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Job), rows)
+    engine.dispose()
+
+async def claim_latencies(url: str, claims: int, indexed: bool) -> list:
+    engine = create_async_db_engine(url)
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    async with sessions() as session:
+        service = AsyncJobService(session)
+        await service.register_worker("bench", WorkerCapabilities(cores=64, ram_mb=131072, encoders=["hevc"]))
+        pending_index.reset()
+        if indexed:
+            version = pending_index.version
+            pending_index.load((await session.execute(pending_entries_query())).all(), version)
+
+        latencies = []
+        for _ in range(claims):
+            started = time.perf_counter()
+            await service.claim_pending_jobs(worker_id="bench")
+            latencies.append(time.perf_counter() - started)
+    await engine.dispose()
+    pending_index.reset()
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pending", type=int, default=20000, help="queued jobs")
+    parser.add_argument("--history", type=int, default=200000, help="finished jobs in the same table")
+    parser.add_argument("--claims", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp())
+    for name, indexed in (("db query", False), ("index", True)):
+        url = f"sqlite:///{directory / (name.replace(' ', '_') + '.db')}"
+        seed(url, args.pending, args.history, args.seed)
+        latencies = sorted(asyncio.run(claim_latencies(url, args.claims, indexed)))
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        print(f"{name:>9}: mean {statistics.fmean(latencies) * 1e6:8.0f} us  p50 {p50:8.0f} us  p99 {p99:8.0f} us")
+
+if __name__ == "__main__":
+    main()
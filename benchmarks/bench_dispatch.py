@@ -0,0 +1,96 @@
+"""
+Makespan of a simulated mixed queue on a heterogeneous fleet, dispatched FIFO
+(any free worker takes the next job) versus with capability matching as done
+by /job/next (src/workers.py: big nodes take large jobs first; small nodes take
+them only once small work runs out, and only on a fleet without big nodes).
+
+    python -m benchmarks.bench_dispatch --big-nodes 2 --small-nodes 10 --movies 12 --episodes 300
+"""
+import argparse
+import heapq
+import random
+from typing import List, NamedTuple
+
+from src.workers import WorkerCapabilities, accepts, claim_order, is_big_node, job_size_class
+
+GB = 1024 ** 3
+CPU_SECONDS_PER_GB = 600    # single-core encode time of 1 GB of 1080p source
+UHD_COST = 4                # 4K sources cost this many times more per GB
+SEGMENTS_PER_GB = 4         # segments a source splits into, bounding useful parallelism
+
+class SimJob(NamedTuple):
+    size_bytes: int
+    height: int
+    size_class: str
+
+def encode_seconds(job: SimJob, cores: int) -> float:
+    size_gb = job.size_bytes / GB
+    cpu_seconds = size_gb * CPU_SECONDS_PER_GB * (UHD_COST if job.height > 1080 else 1)
+    usable_cores = min(cores, max(1, int(size_gb * SEGMENTS_PER_GB)))
+    return cpu_seconds / usable_cores
+
+def make_jobs(movies: int, episodes: int, seed: int) -> List[SimJob]:
+    rng = random.Random(seed)
+    jobs = []
+    for _ in range(movies):
+        size = int(rng.uniform(40, 80) * GB)
+        jobs.append(SimJob(size, 2160, job_size_class(size, 2160)))
+    for _ in range(episodes):
+        size = int(rng.uniform(0.5, 3) * GB)
+        height = rng.choice([720, 1080])
+        jobs.append(SimJob(size, height, job_size_class(size, height)))
+    rng.shuffle(jobs)
+    return jobs
+
+def pick_fifo(worker: WorkerCapabilities, queue: List[SimJob]):
+    return queue.pop(0)
+
+def pick_matched(worker: WorkerCapabilities, queue: List[SimJob], big_nodes: bool):
+    for size_class, max_key in claim_order(worker, now=0, big_nodes=big_nodes):
+        if max_key is not None:
+            continue  # Simulated jobs have no schedule keys to age by
+        for index, job in enumerate(queue):
+            if job.size_class == size_class and accepts(worker, job.size_bytes, "hevc"):
+                return queue.pop(index)
+    return None
+
+def makespan(fleet: List[WorkerCapabilities], jobs: List[SimJob], pick) -> float:
+    """Time until the last job finishes when every free worker claims with `pick`."""
+    queue = list(jobs)
+    free_at = [(0.0, index) for index in range(len(fleet))]
+    heapq.heapify(free_at)
+    finished = 0.0
+    while queue and free_at:
+        now, index = heapq.heappop(free_at)
+        job = pick(fleet[index], queue)
+        if job is None:
+            continue  # Nothing left this worker can run; it retires
+        done = now + encode_seconds(job, fleet[index].cores)
+        finished = max(finished, done)
+        heapq.heappush(free_at, (done, index))
+    return finished
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--big-nodes", type=int, default=2, help="64 cores, 128 GB RAM")
+    parser.add_argument("--small-nodes", type=int, default=10, help="4 cores, 8 GB RAM")
+    parser.add_argument("--movies", type=int, default=12, help="4K remuxes, 40-80 GB")
+    parser.add_argument("--episodes", type=int, default=300, help="720p/1080p episodes, 0.5-3 GB")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    fleet = (
+        [WorkerCapabilities(cores=64, ram_mb=128 * 1024, encoders=["hevc"])] * args.big_nodes
+        + [WorkerCapabilities(cores=4, ram_mb=8 * 1024, encoders=["hevc"])] * args.small_nodes
+    )
+    jobs = make_jobs(args.movies, args.episodes, args.seed)
+
+    fifo = makespan(fleet, jobs, pick_fifo)
+    big_nodes = any(is_big_node(worker) for worker in fleet)
+    matched = makespan(fleet, jobs, lambda worker, queue: pick_matched(worker, queue, big_nodes))
+    print(f"    fifo: {fifo / 3600:8.2f} h makespan")
+    print(f" matched: {matched / 3600:8.2f} h makespan")
+    print(f" speedup: {fifo / matched:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Backfill ingestion throughput: one add_job commit per webhook versus batched
+add_jobs transactions, against a tuned file-backed SQLite DB.
+
+    python -m benchmarks.bench_ingest --jobs 5000 --batch 500
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db import Base, create_async_db_engine, create_db_engine
+from src.JobService import AsyncJobService, JobSpec
+
+async def ingest_one_by_one(session, specs):
+    for spec in specs:
+        await AsyncJobService(session).add_job(spec.source_path, spec.job_type)
+
+async def ingest_batched(session, specs, batch):
+    for start in range(0, len(specs), batch):
+        await AsyncJobService(session).add_jobs(specs[start:start + batch])
+
+async def timed(url, ingest, *args) -> float:
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+
+    engine = create_async_db_engine(url)
+    started = time.perf_counter()
+    try:
+        async with AsyncSession(engine, autoflush=False, expire_on_commit=False) as session:
+            await ingest(session, *args)
+    finally:
+        await engine.dispose()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    specs = [JobSpec(source_path=f"/media/tv/show/{n}.mkv") for n in range(args.jobs)]
+    with tempfile.TemporaryDirectory() as tmp:
+        single = asyncio.run(timed(f"sqlite:///{Path(tmp) / 'single.db'}", ingest_one_by_one, specs))
+        batched = asyncio.run(timed(f"sqlite:///{Path(tmp) / 'batched.db'}", ingest_batched, specs, args.batch))
+
+    print(f"  single: {args.jobs / single:8.0f} jobs/sec")
+    print(f" batched: {args.jobs / batched:8.0f} jobs/sec (batch={args.batch})")
+    print(f" speedup: {single / batched:8.2f}x")
+
+if __name__ == "__main__":
+    main()
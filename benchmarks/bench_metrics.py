@@ -0,0 +1,95 @@
+"""
+Overhead of the Prometheus instrumentation on the hot paths: a request through
+MetricsMiddleware versus the bare app, a statement on an engine with the
+query-timing hooks versus a plain one (SELECT 1 on in-memory SQLite, the worst
+case for relative overhead), and the cost of counting a transition.
+Bare and instrumented runs alternate and the best of --rounds is kept, which
+keeps a noisy machine from drowning out the difference.
+
+    python -m benchmarks.bench_metrics --requests 5000 --queries 50000
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from src.metrics import MetricsMiddleware, instrument_queries, record_transition
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/job/{job_id}")
+    async def get_job(job_id: int):
+        return {"id": job_id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+def per_request(app: FastAPI, requests: int) -> float:
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/job/0")  # Warm up routing and label caches
+            started = time.perf_counter()
+            for n in range(requests):
+                await client.get(f"/job/{n}")
+            return (time.perf_counter() - started) / requests
+    return asyncio.run(run())
+
+def per_query(instrumented: bool, queries: int) -> float:
+    engine = create_engine("sqlite://")
+    if instrumented:
+        instrument_queries(engine)
+    with engine.connect() as conn:
+        statement = text("SELECT 1")
+        conn.execute(statement)
+        started = time.perf_counter()
+        for _ in range(queries):
+            conn.execute(statement)
+        elapsed = time.perf_counter() - started
+    engine.dispose()
+    return elapsed / queries
+
+def per_transition(transitions: int) -> float:
+    started = time.perf_counter()
+    for _ in range(transitions):
+        record_transition("pending", "processing")
+    return (time.perf_counter() - started) / transitions
+
+def best_of(rounds: int, bare, instrumented):
+    """Alternate the two measurements `rounds` times; the fastest of each."""
+    results = [(bare(), instrumented()) for _ in range(rounds)]
+    return min(bare for bare, _ in results), min(instrumented for _, instrumented in results)
+
+def report(name: str, bare: float, instrumented: float):
+    overhead = instrumented - bare
+    print(f"{name:>10}: {bare * 1e6:8.1f} us bare, {instrumented * 1e6:8.1f} us instrumented, "
+          f"+{overhead * 1e6:6.1f} us ({overhead / bare:6.1%})")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=50000)
+    parser.add_argument("--transitions", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    bare_app, instrumented_app = make_app(False), make_app(True)
+    report("request", *best_of(
+        args.rounds,
+        lambda: per_request(bare_app, args.requests),
+        lambda: per_request(instrumented_app, args.requests),
+    ))
+    report("query", *best_of(
+        args.rounds,
+        lambda: per_query(False, args.queries),
+        lambda: per_query(True, args.queries),
+    ))
+    print(f"{'transition':>10}: {per_transition(args.transitions) * 1e6:8.2f} us per counted transition")
+
+if __name__ == "__main__":
+    main()
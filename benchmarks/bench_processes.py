@@ -0,0 +1,145 @@
+"""
+Multi-process serving: runs uvicorn with 1, 2, 4... worker processes on one
+SQLite file and measures
+
+  * GET /job/{id} throughput, driven from several client processes so the
+    load generator is not the bottleneck, and its speedup over the first count given;
+  * how fast long-polling workers parked on GET /job/next are woken by
+    webhooks, which land on whichever process accepts them. Without the
+    cross-process wakeups (--no-relay) a poller parked in another process
+    only finds the job when its wait runs out.
+
+Throughput can only scale up to the number of cores the server gets; the
+clients need cores too, so run it on a machine with spare ones.
+
+    python -m benchmarks.bench_processes --processes 1,2,4 --seconds 10
+    python -m benchmarks.bench_processes --processes 4 --no-relay
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.load import free_port, seed_history, wait_until_up, webhook_requests
+
+def start_server(url: str, processes: int, relay: bool, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+            "--workers", str(processes), "--log-level", "warning",
+        ],
+        env=dict(
+            os.environ,
+            DATABASE_URL=url,
+            CROSS_PROCESS_WAKEUPS="true" if relay else "false",
+            WAKEUP_DIR=tempfile.mkdtemp(),
+        ),
+    )
+
+async def read_loop(port: int, clients: int, seconds: float, max_id: int, seed: int) -> int:
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    deadline = time.monotonic() + seconds
+    done = 0
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+        async def one_client():
+            nonlocal done
+            while time.monotonic() < deadline:
+                await client.get(f"/job/{rng.randint(1, max_id)}")
+                done += 1
+
+        await asyncio.gather(*(one_client() for _ in range(clients)))
+    return done
+
+def read_worker(args) -> int:
+    return asyncio.run(read_loop(*args))
+
+def measure_reads(port: int, client_processes: int, clients: int, seconds: float, max_id: int) -> float:
+    """Requests per second over all client processes."""
+    jobs = [(port, clients, seconds, max_id, seed) for seed in range(client_processes)]
+    with multiprocessing.get_context("spawn").Pool(client_processes) as pool:
+        started = time.perf_counter()
+        total = sum(pool.map(read_worker, jobs))
+        elapsed = time.perf_counter() - started
+    return total / elapsed
+
+async def measure_wakeups(port: int, pollers: int, wait: float) -> dict:
+    """Park `pollers` long-polls, queue as many jobs, and time how long each poller takes to get one."""
+    limits = httpx.Limits(max_connections=2 * pollers, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=wait + 30) as client:
+        posted_at = None
+
+        async def poll(n: int):
+            response = await client.get("/job/next", params={"worker_id": f"poller-{n}", "wait": wait})
+            return response.status_code, time.perf_counter() - posted_at
+
+        polls = []
+        for n in range(pollers):
+            polls.append(asyncio.create_task(poll(n)))
+            await asyncio.sleep(0.05)  # Let the connections spread over the processes
+        await asyncio.sleep(1.0)  # Let every poller park
+        posted_at = time.perf_counter()
+        await asyncio.gather(*(client.post(path, json=body) for path, body in webhook_requests(pollers)))
+        results = await asyncio.gather(*polls)
+
+    latencies = sorted(latency for status, latency in results if status == 200)
+    return {
+        "woken": len(latencies),
+        "missed": pollers - len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "max_ms": latencies[-1] * 1000 if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", default="1,2,4", help="comma-separated server process counts")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each throughput run")
+    parser.add_argument("--client-processes", type=int, default=4, help="load generator processes")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients per load generator")
+    parser.add_argument("--history", type=int, default=10_000, help="jobs in the DB to read back")
+    parser.add_argument("--pollers", type=int, default=20, help="long-polling workers in the wakeup test")
+    parser.add_argument("--wait", type=float, default=5, help="long-poll wait in seconds")
+    parser.add_argument("--no-relay", action="store_true", help="disable cross-process wakeups")
+    args = parser.parse_args()
+
+    first = None
+    for processes in (int(count) for count in args.processes.split(",")):
+        db_path = Path(tempfile.mkdtemp()) / "processes.db"
+        url = f"sqlite:///{db_path}"
+        seed_history(url, args.history)
+        port = free_port()
+        server = start_server(url, processes, not args.no_relay, port)
+        try:
+            async def up():
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+                    await wait_until_up(client)
+            asyncio.run(up())
+            # Every process answers once its lifespan has run; give the last ones a moment
+            time.sleep(1.0)
+
+            rps = measure_reads(port, args.client_processes, args.clients, args.seconds, args.history)
+            first = first or rps
+            wakeups = asyncio.run(measure_wakeups(port, args.pollers, args.wait))
+        finally:
+            server.terminate()
+            server.wait()
+
+        p50 = f"{wakeups['p50_ms']:7.1f} ms" if wakeups["p50_ms"] is not None else "      -"
+        slowest = f"{wakeups['max_ms']:7.1f} ms" if wakeups["max_ms"] is not None else "      -"
+        print(
+            f"{processes} process(es): {rps:8.1f} req/s  x{rps / first:4.2f} of the first  "
+            f"wakeup p50 {p50}  max {slowest}  missed {wakeups['missed']}/{args.pollers}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Writes/sec of AsyncJobService.add_job against a file-backed SQLite DB,
+comparing the old untuned engine (rollback journal, synchronous=FULL) with
+create_async_db_engine.
+
+    python -m benchmarks.bench_sqlite_writes --threads 8 --jobs 500
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.db import Base, create_async_db_engine, create_db_engine
+from src.JobService import AsyncJobService
+
+def untuned_engine(url: str):
+    return create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://", 1), connect_args={"timeout": 30})
+
+async def run(url: str, factory, threads: int, jobs_per_thread: int) -> float:
+    """Insert threads * jobs_per_thread jobs, one commit each, from concurrent writers. Returns writes/sec."""
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=sync_engine)
+    sync_engine.dispose()
+    engine = factory(url)
+    sessions = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def writer(thread_id: int):
+        async with sessions() as session:
+            for n in range(jobs_per_thread):
+                await AsyncJobService(session).add_job(f"/media/{thread_id}/{n}.mkv")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(n) for n in range(threads)))
+    elapsed = time.perf_counter() - started
+
+    await engine.dispose()
+    return threads * jobs_per_thread / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent writers")
+    parser.add_argument("--jobs", type=int, default=250, help="jobs inserted per thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, factory in (("untuned", untuned_engine), ("tuned", create_async_db_engine)):
+            url = f"sqlite:///{Path(tmp) / f'{name}.db'}"
+            results[name] = asyncio.run(run(url, factory, args.threads, args.jobs))
+            print(f"{name:>8}: {results[name]:8.0f} writes/sec")
+
+    print(f" speedup: {results['tuned'] / results['untuned']:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Cold-start cost of the API: imports `main` in a fresh interpreter under
+`python -X importtime` and reports the total import time, the slowest
+top-level imports and the slowest of our own modules. Importing must not
+touch the database; the run checks that no DB file appears.
+
+tests/test_startup.py runs the same profile, so modules that must stay out of
+the import path (factories, the full *arr payload models) are tracked there.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --module src.db --repeat 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, NamedTuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int   # 0 for the profiled module itself, 1 for what it imports, ...
+
+class ImportProfile(NamedTuple):
+    module: str
+    records: List[ImportRecord]
+    created_files: List[str]   # anything the import wrote to its working dir
+
+    @property
+    def modules(self) -> set:
+        return {record.module for record in self.records}
+
+    @property
+    def total_us(self) -> int:
+        return next(record.cumulative_us for record in self.records if record.module == self.module)
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        records.append(ImportRecord(name.strip(), int(self_us), int(cumulative_us), depth))
+    return records
+
+def import_profile(module: str = "main") -> ImportProfile:
+    """Import `module` in a fresh interpreter, from an empty working dir with the default DB URL unset."""
+    workdir = tempfile.mkdtemp()
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return ImportProfile(module, parse_importtime(result.stderr), sorted(os.listdir(workdir)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=10, help="modules to list")
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.repeat)]
+    totals = [profile.total_us / 1000 for profile in profiles]
+    print(f"import {args.module}: median {statistics.median(totals):.1f} ms, min {min(totals):.1f} ms over {args.repeat} runs")
+
+    # The run with the median total, for the breakdown
+    profile = sorted(profiles, key=lambda p: p.total_us)[len(profiles) // 2]
+    direct = sorted((r for r in profile.records if r.depth == 1), key=lambda r: -r.cumulative_us)
+    print(f"\nslowest imports made by {args.module} (cumulative):")
+    for record in direct[:args.top]:
+        print(f"  {record.cumulative_us / 1000:8.1f} ms  {record.module}")
+
+    ours = sorted(
+        (r for r in profile.records if r.module == "main" or r.module.startswith("src")),
+        key=lambda r: -r.self_us,
+    )
+    print("\nslowest of our modules (self):")
+    for record in ours[:args.top]:
+        print(f"  {record.self_us / 1000:8.1f} ms  {record.module}")
+
+    if profile.created_files:
+        print(f"\nimporting created {profile.created_files}; it must not touch the database")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
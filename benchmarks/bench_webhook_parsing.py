@@ -0,0 +1,57 @@
+"""
+Webhook parsing cost on the reference Radarr and Sonarr payloads: full
+validation of the parsed body (what the routes did through FastAPI) versus the
+fast path, which reads eventType first and validates only the fields the
+pipeline uses. Non-import events (e.g. Test) are answered from eventType alone.
+
+    python -m benchmarks.bench_webhook_parsing --iterations 20000
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+from src.schemas.radarr import RadarrWebhookPayload
+from src.schemas.sonarr import SonarrWebhookPayload
+from src.schemas.webhook import RadarrImport, SonarrImport, webhook_event
+
+REFERENCE = Path(__file__).resolve().parent.parent / "reference"
+
+def per_call(parse, body: bytes, iterations: int) -> float:
+    parse(body)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        parse(body)
+    return (time.perf_counter() - started) / iterations
+
+def full(model):
+    return lambda body: model.model_validate(json.loads(body))
+
+def fast(model):
+    def parse(body):
+        if webhook_event(body) == "Download":
+            return model.from_json(body)
+    return parse
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    for name, full_model, import_model in [
+        ("radarr", RadarrWebhookPayload, RadarrImport),
+        ("sonarr", SonarrWebhookPayload, SonarrImport),
+    ]:
+        payload = json.loads((REFERENCE / f"{name}payload.json").read_text())
+        body = json.dumps(dict(payload, eventType="Download")).encode()
+        test_body = json.dumps(dict(payload, eventType="Test")).encode()
+
+        before = per_call(full(full_model), body, args.iterations)
+        after = per_call(fast(import_model), body, args.iterations)
+        test_before = per_call(full(full_model), test_body, args.iterations)
+        test_after = per_call(fast(import_model), test_body, args.iterations)
+        print(f"{name} import: {before * 1e6:7.1f} us full, {after * 1e6:7.1f} us fast ({before / after:4.1f}x)")
+        print(f"{name}   test: {test_before * 1e6:7.1f} us full, {test_after * 1e6:7.1f} us fast ({test_before / test_after:4.1f}x)")
+
+if __name__ == "__main__":
+    main()
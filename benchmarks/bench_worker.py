@@ -0,0 +1,43 @@
+"""
+Wall-clock time to transcode one source with the reference worker, encoding
+its segments on 1 process versus N, with the CPU-bound FakeEncoder.
+
+    python -m benchmarks.bench_worker --size-mb 64 --processes 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from worker.encoders import FakeEncoder
+from worker.transcode import transcode
+
+def timed(source: str, output: str, encoder: FakeEncoder, processes: int) -> float:
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        started = time.perf_counter()
+        transcode(source, output, "hevc", encoder, pool, processes, min_segment_seconds=1)
+        return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--rounds", type=int, default=20, help="hash passes per byte, i.e. encode cost")
+    args = parser.parse_args()
+
+    encoder = FakeEncoder(rounds=args.rounds)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source.mkv"
+        source.write_bytes(os.urandom(args.size_mb * 1024 * 1024))
+
+        single = timed(str(source), str(Path(tmp) / "single.mkv"), encoder, 1)
+        parallel = timed(str(source), str(Path(tmp) / "parallel.mkv"), encoder, args.processes)
+
+    print(f"{'1 process':>13}: {single:8.2f} s")
+    print(f"{f'{args.processes} processes':>13}: {parallel:8.2f} s")
+    print(f"{'speedup':>13}: {single / parallel:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Load test of the job API: many concurrent clients post Radarr/Sonarr webhooks,
+claim the resulting jobs from /job/next and read them back from /job/{id}.
+Reports throughput and p50/p99 latency per endpoint and saves them as JSON so
+runs can be compared.
+
+The app is driven in-process through its ASGI interface, or over HTTP against
+a uvicorn server started on the same DB. --history pre-seeds that many
+finished jobs first, to expose queries that slow down as the table grows.
+
+    python -m benchmarks.load --webhooks 2000 --clients 50
+    python -m benchmarks.load --server uvicorn --history 1000000 --output results.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from main import app, get_db_session
+from src.db import Base, Job, create_async_db_engine, create_db_engine
+from src.factories import JobFactory, RadarrWebhookPayloadFactory, SonarrWebhookPayloadFactory
+
+SEED_CHUNK = 10_000
+
+def seed_history(url: str, count: int) -> float:
+    """Insert `count` finished jobs in bulk; returns the seconds it took."""
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+    # A few hundred factory jobs as templates, so the rows look like real ones
+    templates = [JobFactory.build() for _ in range(min(count, 500))]
+    columns = ["job_type", "output_path", "created_at", "updated_at", "schedule_key"]
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for start in range(0, count, SEED_CHUNK):
+            rows = []
+            for n in range(start, min(start + SEED_CHUNK, count)):
+                template = templates[n % len(templates)]
+                row = {column: getattr(template, column) for column in columns}
+                row.update(
+                    source_path=f"/history/{n}/{os.path.basename(template.source_path)}",
+                    status="done" if n % 20 else "failed",
+                )
+                rows.append(row)
+            conn.execute(insert(Job), rows)
+    engine.dispose()
+    return time.perf_counter() - started
+
+def webhook_requests(count: int) -> List[tuple]:
+    """Pre-built (path, body) pairs, half movies and half episodes, all for distinct files."""
+    requests = []
+    for n in range(count):
+        if n % 2:
+            payload = SonarrWebhookPayloadFactory(episodeFile__path=f"/load/tv/{n}/episode.mkv")
+            requests.append(("/webhook/sonarr", payload.model_dump()))
+        else:
+            payload = RadarrWebhookPayloadFactory(movieFile__path=f"/load/movies/{n}/movie.mkv")
+            requests.append(("/webhook/radarr", payload.model_dump()))
+    return requests
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    percentile = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+    return {
+        "requests": len(ordered),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 1) if elapsed else 0,
+        "p50_ms": round(percentile(0.50), 2) if ordered else None,
+        "p99_ms": round(percentile(0.99), 2) if ordered else None,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2) if ordered else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+async def drive(client: httpx.AsyncClient, calls: List[tuple], clients: int) -> dict:
+    """Run (method, path, kwargs) calls from `clients` concurrent clients."""
+    queue = iter(calls)
+    latencies, statuses = [], {}
+
+    async def client_loop():
+        for method, path, kwargs in queue:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(clients)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+async def run_scenarios(client: httpx.AsyncClient, args) -> dict:
+    results = {}
+    webhooks = [("POST", path, {"json": body}) for path, body in webhook_requests(args.webhooks)]
+    results["webhook"] = await drive(client, webhooks, args.clients)
+
+    claims = [("GET", "/job/next", {"params": {"worker_id": f"load-{n % args.clients}"}}) for n in range(args.webhooks)]
+    results["job_next"] = await drive(client, claims, args.clients)
+
+    rng = random.Random(args.random_seed)
+    max_id = args.history + args.webhooks
+    reads = [("GET", f"/job/{rng.randint(1, max_id)}", {}) for _ in range(args.reads)]
+    results["job_get"] = await drive(client, reads, args.clients)
+    return results
+
+def git_commit() -> str:
+    """The commit under test, so saved results can be matched to code."""
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.get("/job/0")
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+async def against_uvicorn(url: str, args) -> dict:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ, DATABASE_URL=url),
+    )
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_until_up(client)
+            return await run_scenarios(client, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+async def in_process(url: str, args) -> dict:
+    engine = create_async_db_engine(url)
+    LoadSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def load_db_session():
+        async with LoadSessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = load_db_session
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as client:
+            return await run_scenarios(client, args)
+    finally:
+        app.dependency_overrides.pop(get_db_session, None)
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--webhooks", type=int, default=2000, help="webhooks to post; as many claims follow")
+    parser.add_argument("--reads", type=int, default=2000, help="GET /job/{id} requests")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent clients")
+    parser.add_argument("--history", type=int, default=0, help="finished jobs to pre-seed, e.g. 1000000")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--db", help="SQLite file to use (a fresh temporary one by default)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    db_path = args.db or str(Path(tempfile.mkdtemp()) / "load.db")
+    url = f"sqlite:///{db_path}"
+    seed_seconds = seed_history(url, args.history)
+
+    runner = against_uvicorn if args.server == "uvicorn" else in_process
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "server": args.server,
+        "clients": args.clients,
+        "history": args.history,
+        "seed_seconds": round(seed_seconds, 1),
+        "scenarios": asyncio.run(runner(url, args)),
+    }
+
+    for name, result in results["scenarios"].items():
+        print(
+            f"{name:>9}: {result['throughput_rps']:8.1f} req/s  p50 {result['p50_ms']:7.2f} ms  "
+            f"p99 {result['p99_ms']:7.2f} ms  {result['statuses']}"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
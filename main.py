@@ -1,12 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException, Body
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from typing import Optional, List
+import asyncio
+import contextlib
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Body, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import Any, Dict, Literal, Optional, List, Type, Union
 
-from src.db import SessionLocal, Job
-from src.JobService import JobService, JobResponse, JobValidationRequest
-from src.schemas.radarr import RadarrWebhookPayload
-from src.schemas.sonarr import SonarrWebhookPayload
+from src.admission import AdmissionControl, admit_webhook, admit_worker
+from src.db import create_async_db_engine, create_db_engine, prepare_database
+from src.config import Settings, settings
+from src.dispatch import job_notifier, result_notifier, validation_notifier
+from src.ingest import IngestBuffer, ReplyCache, idempotency_key, job_spec_from_payload, media_key
+from src.metrics import MetricsMiddleware, render
+from src.notify import Outbox, pooled_http_client, run_outbox
+from src.archive import run_archiver
+from src.JobService import (
+    AsyncJobService, ArchivedJobResponse, JobFilter, JobPage, JobResponse, JobValidationRequest, JobHeartbeatRequest,
+    JobPriorityRequest, ServiceContext,
+)
+from src.queue_index import pending_index, reconcile_once, run_index_reconciler
+from src.reaper import run_lease_reaper
+from src.validation_stage import run_validation_stage
+from src.wakeups import WakeupBus, wakeup_dir
+from src.schemas.webhook import RadarrImport, SonarrImport, WebhookImport, webhook_event
+from src.workers import WorkerCapabilities, WorkerResponse
 
 # Pydantic models\
 
@@ -14,103 +32,363 @@ class JobUpdate(BaseModel):
     status: Optional[str] = None
     path: Optional[str] = None
 
-app = FastAPI()
+class WebhookBatchResult(BaseModel):
+    index: int
+    status: Literal["created", "duplicate", "ignored", "invalid"]
+    job: Optional[JobResponse] = None
+    error: Optional[str] = None
 
-# Dependency to get db session
-def get_db_session():
-    session = SessionLocal()
+def migrate_database(settings: Settings) -> None:
+    engine = create_db_engine(settings.database_url, settings)
     try:
-        yield session
+        prepare_database(engine)
+    finally:
+        engine.dispose()
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings, context = app.state.settings, app.state.context
+    # Every process runs this; the migration lock lets only the first do the work
+    await asyncio.to_thread(migrate_database, settings)
+    engine = create_async_db_engine(settings.database_url, settings)
+    sessions = app.state.session_factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    bus = None
+    if settings.cross_process_wakeups:
+        bus = WakeupBus(wakeup_dir(settings), (job_notifier, validation_notifier, result_notifier))
+        bus.start()
+    http = pooled_http_client(settings)
+    # Warm the pending index so /job/next can claim without searching the table
+    await reconcile_once(sessions)
+    tasks = [
+        asyncio.create_task(run_index_reconciler(sessions, settings.queue_index_reconcile_seconds)),
+        asyncio.create_task(run_lease_reaper(sessions, settings.reaper_interval_seconds, context=context)),
+        asyncio.create_task(run_validation_stage(sessions, settings.validation_workers, settings.validation_poll_seconds, context)),
+        asyncio.create_task(run_outbox(sessions, Outbox(http, context.notify_targets, settings), settings.notify_poll_seconds)),
+        asyncio.create_task(run_archiver(sessions, settings.archive_interval_seconds, settings)),
+    ]
+    try:
+        yield
     finally:
-        session.close()
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await http.aclose()
+        pending_index.reset()
+        if bus is not None:
+            bus.stop()
+        await engine.dispose()
+
+router = APIRouter()
+
+# Admission control (src/admission.py): webhooks are shed under load, worker
+# endpoints have their own concurrency limit
+WebhookAdmission = Depends(admit_webhook)
+WorkerAdmission = Depends(admit_worker)
+
+# Dependency to get db session
+async def get_db_session(request: Request):
+    async with request.app.state.session_factory() as session:
+        yield session
+
+def get_job_service(request: Request, db: AsyncSession = Depends(get_db_session)) -> AsyncJobService:
+    """The job service on the request's session, with the app's context (see create_app)."""
+    return AsyncJobService(db, request.app.state.context)
 
-@app.post("/webhook/radarr", response_model=JobResponse)
-def webhook_listener(payload: RadarrWebhookPayload, db: Session = Depends(get_db_session)):
+async def parse_webhook(request: Request, model: Type[WebhookImport]) -> Optional[WebhookImport]:
     """
-    Receives Radarr webhook → inserts into SQLite job table
+    Fast path for *arr webhooks: read eventType first and answer anything but
+    an import (Test, Grab, Rename, ...) without validating the rest, then
+    validate only the fields the pipeline uses. None for non-imports.
+    """
+    body = await request.body()
+    try:
+        if webhook_event(body) != "Download":
+            return None
+        return model.from_json(body)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors(include_url=False))
+
+async def ingest_webhook(request: Request, model: Type[WebhookImport], priority: int, service: AsyncJobService):
+    """
+    Queue a job for an import webhook through the group-commit buffer. A
+    retried delivery of the same import gets its original job back (200), from
+    memory when it was seen recently; another import of a file that already
+    has a job is a 400.
     """
+    # Only act on imports
+    payload = await parse_webhook(request, model)
+    if payload is None:
+        return Response(status_code=204)
+
+    webhook_replies = request.app.state.webhook_replies
+    key = idempotency_key(payload)
+    reply = webhook_replies.get(key) if key else None
+    if reply is not None:
+        return reply
 
-    # Only act on movie downloads
-    if payload.eventType != "Download":
-        raise HTTPException(status_code=204, detail="Ignoring event")
-    
-    movie_path = payload.movieFile.path
+    spec = job_spec_from_payload(payload, priority, service.context)
+    if spec is None:
+        # Already in its target format; the file it replaces is still gone
+        await service.supersede([media_key(payload)])
+        return Response(status_code=204)
 
-    # Check if job already exists (prevents duplicates)
-    existing = db.query(Job).filter(Job.path == movie_path).first()
-    if existing:
+    job, created = await request.app.state.ingest_buffer.submit(service.db, spec)
+    if not created and (key is None or job.idempotency_key != key):
         raise HTTPException(status_code=400, detail="Job already exists")
+    if key:
+        webhook_replies.put(key, job)
+    if not created:
+        return job  # A retry that missed the cache; the stored key still matches
 
-    # Create and save the new job
-    new_job = Job(job_type="movie", source_path=movie_path, status="pending")
-    db.add(new_job)
-    db.commit()
-    db.refresh(new_job)  # refresh gets the auto-generated job ID
+    if job.status == "pending":
+        job_notifier.notify()
+    return job
 
-    return JobResponse(
-        id=new_job.id,
-        path=new_job.path,
-        status=new_job.status
-    )
+# Priority of the queued jobs; set per *arr connection in its webhook URL
+WebhookPriority = Query(0, description="Queue priority for jobs from this webhook, e.g. ?priority=5")
+
+@router.post("/webhook/radarr", response_model=JobResponse, dependencies=[WebhookAdmission])
+async def radarr_webhook_listener(
+    request: Request,
+    priority: int = WebhookPriority,
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Receives Radarr webhook → inserts into SQLite job table
+    """
+    return await ingest_webhook(request, RadarrImport, priority, service)
 
-@app.post("/webhook/sonarr", response_model=JobResponse)
-def webhook_listener(payload: SonarrWebhookPayload, db: Session = Depends(get_db_session)):
+@router.post("/webhook/sonarr", response_model=JobResponse, dependencies=[WebhookAdmission])
+async def sonarr_webhook_listener(
+    request: Request,
+    priority: int = WebhookPriority,
+    service: AsyncJobService = Depends(get_job_service),
+):
     """
     Receives Sonarr webhook → inserts into SQLite job table
     """
+    return await ingest_webhook(request, SonarrImport, priority, service)
 
-    # Only act on import downloads
-    if payload.eventType != "Download":
-        raise HTTPException(status_code=204, detail="Ignoring event")
-    
-    episode_path = payload.episodeFile.path
+MAX_WEBHOOK_BATCH = 1000
 
-    # Check if job already exists (prevents duplicates)
-    existing = db.query(Job).filter(Job.path == episode_path).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Job already exists")
+@router.post("/webhook/batch", response_model=List[WebhookBatchResult], dependencies=[WebhookAdmission])
+async def batch_webhook_listener(
+    payloads: List[Dict[str, Any]] = Body(..., max_length=MAX_WEBHOOK_BATCH),
+    priority: int = WebhookPriority,
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Receives an array of Radarr/Sonarr webhooks → inserts them in one transaction.
+    Items are validated one by one, so a malformed item is reported as invalid
+    without rejecting the rest of the batch.
+    """
+    results = [WebhookBatchResult(index=index, status="ignored") for index in range(len(payloads))]
+    downloads, ignored = [], []
+    for index, raw in enumerate(payloads):
+        if raw.get("eventType") != "Download":
+            continue
+        try:
+            # Radarr payloads carry a movie, Sonarr payloads a series
+            model = RadarrImport if "movie" in raw else SonarrImport
+            payload = model.model_validate(raw)
+        except ValidationError as exc:
+            results[index] = WebhookBatchResult(
+                index=index,
+                status="invalid",
+                error="; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                    for error in exc.errors()[:3]
+                ),
+            )
+            continue
+        spec = job_spec_from_payload(payload, priority, service.context)
+        if spec is not None:
+            downloads.append((index, spec))
+        else:
+            ignored.append(media_key(payload))
+
+    await service.supersede(ignored)
+    added = await service.add_jobs([spec for _, spec in downloads])
+    for (index, _), (job, created) in zip(downloads, added):
+        results[index] = WebhookBatchResult(
+            index=index,
+            status="created" if created else "duplicate",
+            job=job,
+        )
+
+    if any(created and job.status == "pending" for job, created in added):
+        job_notifier.notify()
+    return results
+
+@router.put("/workers/{worker_id}", response_model=WorkerResponse, dependencies=[WorkerAdmission])
+async def register_worker(
+    worker_id: str,
+    capabilities: WorkerCapabilities = Body(...),
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Registers a worker's cores, RAM, encoders and size limit; /job/next then
+    only hands it jobs it can run
+    """
+    return await service.register_worker(worker_id, capabilities)
+
+MAX_CLAIM_BATCH = 50
+MAX_LONG_POLL_SECONDS = 60
+
+@router.get("/job/next", response_model=Union[JobResponse, List[JobResponse]], dependencies=[WorkerAdmission])
+async def get_next_job(
+    count: Optional[int] = Query(None, ge=1, le=MAX_CLAIM_BATCH),
+    worker_id: Optional[str] = None,
+    wait: float = Query(0, ge=0, le=MAX_LONG_POLL_SECONDS),
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Claims the next pending job in schedule order, or up to `count` jobs when a batch is requested.
+    Claimed jobs are leased to `worker_id` and must be kept alive with heartbeats.
+
+    With `wait` the request is parked for up to that many seconds until a job is
+    queued, instead of returning 404 straight away.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
 
-    # Create and save the new job
-    new_job = Job(path=episode_path, status="pending")
-    db.add(new_job)
-    db.commit()
-    db.refresh(new_job)  # refresh gets the auto-generated job ID
-
-    return JobResponse(
-        id=new_job.id,
-        path=new_job.path,
-        status=new_job.status
-    )
-
-
-@app.get("/job/next", response_model=JobResponse)
-def get_next_job(db: Session = Depends(get_db_session)):
-    return JobService(db).get_next_pending_job()
-    
-@app.patch("/job/{job_id}", response_model=JobResponse)
-def validate_job(
+    while True:
+        # Watch before claiming so a job queued mid-claim still wakes us
+        queued = job_notifier.watch()
+        jobs = await service.claim_pending_jobs(count or 1, worker_id=worker_id)
+        if jobs:
+            return jobs if count is not None else jobs[0]
+
+        remaining = deadline - loop.time()
+        if remaining <= 0 or not await job_notifier.wait(queued, remaining):
+            raise HTTPException(status_code=404, detail="No pending jobs")
+
+@router.get("/job/{job_id}", response_model=JobResponse, dependencies=[WorkerAdmission])
+async def get_job(
+    job_id: int,
+    wait: float = Query(0, ge=0, le=MAX_LONG_POLL_SECONDS),
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Returns a job, live or archived. With `wait` a validating job is held for
+    up to that many seconds until its validation finishes, so clients can
+    subscribe to the result instead of polling.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+
+    while True:
+        finished = result_notifier.watch()
+        job = await service.get_job(job_id)
+        remaining = deadline - loop.time()
+        if job.status != "validating" or remaining <= 0 or not await result_notifier.wait(finished, remaining):
+            return job
+
+MAX_JOB_PAGE = 500
+
+@router.get("/jobs", response_model=JobPage)
+async def list_jobs(
+    filters: JobFilter = Depends(),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_JOB_PAGE),
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Lists jobs newest first, filtered by status, job_type, created_at range and
+    source path prefix. Pass `next_cursor` from a page as `cursor` for the next.
+    """
+    return await service.list_jobs(filters, cursor, limit)
+
+@router.get("/jobs/export")
+async def export_jobs(filters: JobFilter = Depends(), service: AsyncJobService = Depends(get_job_service)):
+    """
+    Streams every job matching the filters as NDJSON, one job per line,
+    newest first
+    """
+    return StreamingResponse(service.export_jobs(filters), media_type="application/x-ndjson")
+
+MAX_ARCHIVE_PAGE = 500
+
+@router.get("/archive/jobs", response_model=List[ArchivedJobResponse])
+async def list_archived_jobs(
+    source_path: Optional[str] = None,
+    status: Optional[Literal["done", "failed", "cancelled"]] = None,
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_ARCHIVE_PAGE),
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Pages through archived jobs in id order. Pass the last id of a page as
+    `after_id` to get the next one.
+    """
+    return await service.archived_jobs(source_path, status, after_id, limit)
+
+@router.post("/job/{job_id}/heartbeat", response_model=JobResponse, dependencies=[WorkerAdmission])
+async def heartbeat_job(
+    job_id: int,
+    payload: JobHeartbeatRequest = Body(...),
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Extends the lease a worker holds on a processing job
+    """
+    return await service.heartbeat(job_id, payload.worker_id)
+
+@router.post("/job/{job_id}/priority", response_model=JobResponse)
+async def prioritise_job(
+    job_id: int,
+    payload: JobPriorityRequest = Body(...),
+    service: AsyncJobService = Depends(get_job_service),
+):
+    """
+    Moves a pending job up (higher priority) or down the queue
+    """
+    return await service.set_priority(job_id, payload.priority)
+
+@router.patch("/job/{job_id}", response_model=JobResponse, status_code=202, dependencies=[WorkerAdmission])
+async def validate_job(
     job_id: int,
     payload: JobValidationRequest = Body(...),
-    db: Session = Depends(get_db_session),
+    service: AsyncJobService = Depends(get_job_service),
 ):
-    return JobService(db).validate_job(job_id, payload.output_path)
-    # job = db.query(Job).filter(Job.id == job_id).first()
-    # if not job:
-    #     raise HTTPException(status_code=404, detail="Job not found")
-    # 
-    # if update.status is not None:
-    #     job.status = update.status
-# 
-    # if update.path is not None:
-    #     job.path = update.path
-    # 
-    # db.commit()
-    # db.refresh(job)
-# 
-    # return JobResponse(
-    #     id=job.id,
-    #     path=job.path,
-    #     status=job.status
-    # )
+    """
+    Records a worker's output and queues it for validation. Returns 202 with the
+    job in validating; GET /job/{id}?wait=... returns it once done or failed.
+    """
+    job = await service.submit_output(job_id, payload.output_path, worker_id=payload.worker_id)
+    validation_notifier.notify()
+    return job
+
+@router.get("/metrics")
+async def metrics(service: AsyncJobService = Depends(get_job_service)):
+    """
+    Prometheus metrics: request latency per route, job transitions, queue
+    depth per status and DB statement latency. Queue depth is counted from
+    the database on every scrape, so each API process reports the same value.
+    """
+    body, content_type = render(await service.status_counts())
+    return Response(content=body, media_type=content_type)
 
 # Add database deletion api call here
+
+def create_app(settings: Settings = settings) -> FastAPI:
+    """
+    The API for `settings`. Nothing touches the database until it starts: the
+    lifespan builds the engine, runs the migrations once and warms the caches.
+    Everything else the routes share is built here from `settings` and kept
+    on app.state.
+    """
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.context = context = ServiceContext.from_settings(settings)
+    app.state.admission = AdmissionControl(settings)
+    app.state.webhook_replies = ReplyCache(settings.webhook_reply_cache_size, settings.webhook_reply_ttl_seconds)
+    app.state.ingest_buffer = IngestBuffer(settings.ingest_batch_window_ms / 1000, settings.ingest_max_batch, context)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    return app
+
+app = create_app()
@@ -1,20 +1,38 @@
+import asyncio
+import base64
+import binascii
 import datetime
-from sqlalchemy.orm import Session
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from sqlalchemy import Float, bindparam, case, delete, func, insert, literal, or_, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import Collection, Dict, List, Optional, Tuple
 from enum import Enum
 from os import path
 
-from src.db import Job
+from src.config import Settings, settings
+from src.db import ArchivedJob, Job, QueueFlow, Worker, utcnow
+from src.metrics import GAUGED_STATUSES, record_transition, record_transitions
+from src.queue_index import PENDING_ENTRY_COLUMNS, PendingEntry, pending_index
+from src.scheduler import Scheduler
+from src.notify import NotifyTarget, outbox_rows, targets_from_settings
+from src.rules import RuleEngine, load_rule_engine
+from src.validation import JobValidator, ValidationResult
+from src.workers import SMALL, WorkerCapabilities, big_nodes_query, capability_criteria, claim_order, is_big_node
 
 JOB_STATE_MACHINE = {
     "staged": ["pending"],
-    "pending": ["processing"],
-    "processing": ["validating", "failed"],
+    "pending": ["processing", "cancelled"],
+    "processing": ["validating", "failed", "pending", "cancelled"],
     "validating": ["done", "failed"],
     "done": [],
     "failed": [],
+    "cancelled": [],   # superseded by a newer import of the same media
 }
 
 class JobStatus(str, Enum):
@@ -24,6 +42,7 @@ class JobStatus(str, Enum):
     validating = "validating"
     done = "done"
     failed = "failed"
+    cancelled = "cancelled"
 
 class JobResponse(BaseModel):
     id: int
@@ -34,113 +53,865 @@ class JobResponse(BaseModel):
     created_at: Optional[datetime.datetime] = None
     updated_at: Optional[datetime.datetime] = None
 
+    worker_id: Optional[str] = None
+    lease_expires_at: Optional[datetime.datetime] = None
+    attempts: int = 0
+
     error_message: Optional[str] = None
+    profile: Optional[str] = None
+    priority: int = 0
+    encoder: Optional[str] = None
+    size_class: str = SMALL
+    output_checksum: Optional[str] = None
+    idempotency_key: Optional[str] = None
     worker_notes: Optional[str] = None
 
     model_config = {
         "from_attributes": True
     }
 
+class ArchivedJobResponse(JobResponse):
+    archived_at: datetime.datetime
+
+class JobPage(BaseModel):
+    jobs: List[JobResponse]
+    # Pass back as ?cursor= for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+class JobFilter(BaseModel):
+    """Filters for GET /jobs and its NDJSON export."""
+    status: Optional[JobStatus] = None
+    job_type: Optional[str] = None
+    created_after: Optional[datetime.datetime] = None
+    created_before: Optional[datetime.datetime] = None
+    path_prefix: Optional[str] = None
+
 class JobValidationRequest(BaseModel):
     output_path: str
-    
-class JobValidator:
-    def validate(self, job: Job) -> bool:
-        # Hook where real validation will eventually go
-        return True
-
-class JobService:
-    def __init__(self, db: Session):
+    worker_id: Optional[str] = None
+
+class JobHeartbeatRequest(BaseModel):
+    worker_id: str
+
+class JobPriorityRequest(BaseModel):
+    priority: int
+
+class JobSpec(BaseModel):
+    """Everything needed to queue a job for one imported file."""
+    source_path: str
+    job_type: str = "episode"
+    profile: Optional[str] = None
+    # "done" for files that already meet their profile
+    status: str = "pending"
+    # Scheduling inputs, see src/scheduler.py
+    instance_name: Optional[str] = None
+    size_bytes: Optional[int] = None
+    priority: int = 0
+    # Capability matching inputs, see src/workers.py
+    encoder: Optional[str] = None
+    size_class: str = SMALL
+    # Sonarr series / Radarr movie to refresh once transcoded, see src/notify.py
+    media_id: Optional[int] = None
+    # The movie or episodes the file is for; a newer file supersedes older jobs
+    media_key: Optional[str] = None
+    # downloadId + file id, so a retried webhook is recognised; see src/ingest.py
+    idempotency_key: Optional[str] = None
+
+def pending_queue_query(limit: int = 1, *criteria):
+    """
+    Ids of the next pending jobs matching `criteria`, in claim order. Served by
+    ix_jobs_status_schedule_key, or ix_jobs_status_size_class_schedule_key when
+    restricted to a size class.
+    """
+    return (
+        select(Job.id)
+        .where(Job.status == "pending", *criteria)
+        .order_by(Job.schedule_key.asc(), Job.id.asc())
+        .limit(limit)
+    )
+
+def source_path_query(source_path: str):
+    """Jobs for a source file. Served by ux_jobs_source_path."""
+    return select(Job).where(Job.source_path == source_path)
+
+# Statements and checks shared by JobService and AsyncJobService, so the sync
+# and async paths cannot drift apart.
+
+def new_job_values(spec: JobSpec) -> dict:
+    """Column values for a freshly queued job."""
+    if spec.status == "done":
+        output_path = spec.source_path  # Nothing to transcode, the source is the output
+    else:
+        output_path = path.join("apple", spec.source_path) # Dummy output path
+    return dict(
+        source_path=spec.source_path,
+        output_path=output_path,
+        job_type=spec.job_type,
+        profile=spec.profile,
+        status=spec.status,
+        instance_name=spec.instance_name,
+        size_bytes=spec.size_bytes,
+        priority=spec.priority,
+        encoder=spec.encoder,
+        size_class=spec.size_class,
+        media_id=spec.media_id,
+        media_key=spec.media_key,
+        idempotency_key=spec.idempotency_key,
+    )
+
+def flow_demand(jobs: List[Job], scheduler: Scheduler) -> dict:
+    """{flow: (number of jobs, slot spacing)} for the flows `jobs` belong to."""
+    demand = {}
+    for job in jobs:
+        flow = scheduler.flow(job.job_type, job.instance_name)
+        count, spacing = demand.get(flow) or (0, scheduler.spacing(job.job_type, job.instance_name))
+        demand[flow] = (count + 1, spacing)
+    return demand
+
+@lru_cache(maxsize=None)
+def reserve_slots_statement(dialect_name: str):
+    """
+    Atomically take `span` seconds of a flow's slots, starting no earlier than
+    `now`, returning the flow's new next_slot (the end of the reservation).
+    Built once per dialect and executed with flow/now/span parameters, since it
+    runs on every webhook.
+    """
+    now = bindparam("now", type_=Float)
+    span = bindparam("span", type_=Float)
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    flows = QueueFlow.__table__
+    start = case((flows.c.next_slot > now, flows.c.next_slot), else_=now)
+    return (
+        insert(flows)
+        .values(flow=bindparam("flow"), next_slot=now + span)
+        .on_conflict_do_update(index_elements=["flow"], set_={"next_slot": start + span})
+        .returning(flows.c.next_slot)
+    )
+
+def reserve_slots_params(flow: str, count: int, spacing: float, now: datetime.datetime) -> dict:
+    return {"flow": flow, "now": now.timestamp(), "span": count * spacing}
+
+def queued_rows(specs: List[JobSpec], now: datetime.datetime) -> List[dict]:
+    """Insert rows for `specs`; pending ones are given their slots once inserted, see assign_slots."""
+    return [dict(new_job_values(spec), created_at=now, updated_at=now) for spec in specs]
+
+def slotted_jobs(created: dict) -> List[Job]:
+    """The inserted jobs that queue for a fair-share slot, in insertion (and so `specs`) order."""
+    return sorted((job for job in created.values() if job.status == "pending"), key=lambda job: job.id)
+
+def assign_slots(jobs: List[Job], flow_starts: dict, scheduler: Scheduler) -> None:
+    """Hand out each flow's reserved slots to `jobs` in order, keying them for the queue."""
+    spacings = {}
+    for job in jobs:
+        flow = scheduler.flow(job.job_type, job.instance_name)
+        if flow not in spacings:
+            spacings[flow] = scheduler.spacing(job.job_type, job.instance_name)
+        job.fair_slot = flow_starts[flow]
+        job.schedule_key = scheduler.schedule_key(job.fair_slot, job.priority, job.size_bytes)
+        flow_starts[flow] += spacings[flow]
+
+def apply_priority(job: Job, priority: int, scheduler: Scheduler) -> None:
+    """Re-key a pending job for a new priority, keeping its fair-share slot."""
+    if job.status != "pending":
+        raise HTTPException(status_code=400, detail=f"Cannot reprioritise a {job.status} job")
+
+    job.priority = priority
+    fair_slot = job.fair_slot if job.fair_slot is not None else job.schedule_key
+    job.schedule_key = scheduler.schedule_key(fair_slot, priority, job.size_bytes)
+    job.updated_at = utcnow()
+
+@lru_cache(maxsize=None)
+def insert_jobs_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT DO NOTHING on ux_jobs_source_path, returning the inserted jobs."""
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    return (
+        insert(Job)
+        .on_conflict_do_nothing(index_elements=["source_path"])
+        .returning(Job)
+    )
+
+def queued_entries(created: dict) -> List[PendingEntry]:
+    """Index entries for the inserted jobs that went straight to pending."""
+    return [PendingEntry.of(job) for job in created.values() if job.status == "pending"]
+
+SUPERSEDED_STATUSES = ("pending", "processing")
+
+def supersede_statements(media_keys: Collection[str], new_ids: List[int], now: datetime.datetime) -> List[tuple]:
+    """
+    (status, UPDATE) pairs cancelling the pending and processing jobs for
+    `media_keys`, other than the new jobs `new_ids`: Radarr/Sonarr are
+    replacing that file, so finishing its transcode would be wasted. Processing
+    jobs keep their worker, whose next heartbeat is told the job was cancelled.
+    """
+    keys = {key for key in media_keys if key}
+    if not keys:
+        return []
+    return [
+        (status, update(Job)
+            .where(Job.media_key.in_(keys), Job.status == status, Job.id.not_in(new_ids))
+            .values(
+                status="cancelled",
+                lease_expires_at=None,
+                error_message="Superseded by a newer import of the same media",
+                updated_at=now,
+            )
+            .returning(Job.id)
+            .execution_options(synchronize_session=False))
+        for status in SUPERSEDED_STATUSES
+    ]
+
+def record_cancellations(cancelled: dict) -> None:
+    """Metrics and index upkeep for the {status: ids} supersede_statements cancelled, once committed."""
+    record_transitions((status, "cancelled", len(ids)) for status, ids in cancelled.items())
+    pending_index.discard(cancelled.get("pending", ()))
+
+def queued_transitions(created: dict) -> List[Tuple[str, str, int]]:
+    """Status changes for the jobs add_jobs just inserted, for src/metrics.py."""
+    statuses = Counter(job.status for job in created.values())
+    return [("new", status, count) for status, count in statuses.items()]
+
+def status_counts_query():
+    """Jobs per live status, for the queue depth on /metrics. Served by ix_jobs_status_schedule_key."""
+    return (
+        select(Job.status, func.count())
+        .where(Job.status.in_(GAUGED_STATUSES))
+        .group_by(Job.status)
+    )
+
+def archived_query(specs: List[JobSpec]):
+    """Archived jobs for the specs' source files. Served by ux_jobs_archive_source_path."""
+    return select(ArchivedJob).where(ArchivedJob.source_path.in_({spec.source_path for spec in specs}))
+
+def duplicates_query(specs: List[JobSpec], created: dict):
+    """The existing jobs for specs that were not inserted, or None when all were."""
+    missing = {spec.source_path for spec in specs} - created.keys()
+    if not missing:
+        return None
+    return select(Job).where(Job.source_path.in_(missing))
+
+def batch_results(specs: List[JobSpec], created: dict, existing: dict) -> List[Tuple[Job, bool]]:
+    """Pair each spec with its job; only the first spec for an inserted path counts as created."""
+    created_paths = set(created)
+    results = []
+    for spec in specs:
+        is_new = spec.source_path in created_paths
+        created_paths.discard(spec.source_path)
+        results.append((created.get(spec.source_path) or existing[spec.source_path], is_new))
+    return results
+
+TERMINAL_STATUSES = ("done", "failed", "cancelled")
+ARCHIVED_COLUMNS = [column.name for column in Job.__table__.columns]
+
+def archive_candidates_query(cutoff: datetime.datetime, limit: int):
+    """
+    Ids of up to `limit` finished (done, failed or cancelled) jobs last
+    updated before `cutoff`. Once archival has caught up the jobs table only
+    holds recent work, so this scan stays short without an index of its own.
+
+    The newest job always stays behind: SQLite hands out max(id) + 1, so
+    removing it would let the next job reuse an id the archive already holds.
+    """
+    return (
+        select(Job.id)
+        .where(
+            Job.status.in_(TERMINAL_STATUSES),
+            Job.updated_at < cutoff,
+            Job.id < select(func.max(Job.id)).scalar_subquery(),
+        )
+        .order_by(Job.id.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+def archive_statements(job_ids: List[int], now: datetime.datetime):
+    """Copy the jobs into jobs_archive, then delete them from jobs; run both in one transaction."""
+    copy = insert(ArchivedJob).from_select(
+        [*ARCHIVED_COLUMNS, "archived_at"],
+        select(*(Job.__table__.c[name] for name in ARCHIVED_COLUMNS), literal(now, ArchivedJob.archived_at.type)).where(Job.id.in_(job_ids)),
+    )
+    remove = delete(Job).where(Job.id.in_(job_ids)).execution_options(synchronize_session=False)
+    return copy, remove
+
+def archived_jobs_query(
+    source_path: Optional[str] = None,
+    status: Optional[str] = None,
+    after_id: int = 0,
+    limit: int = 100,
+):
+    """A page of archived jobs in id order, resuming after `after_id`."""
+    query = select(ArchivedJob).where(ArchivedJob.id > after_id)
+    if source_path is not None:
+        query = query.where(ArchivedJob.source_path == source_path)
+    if status is not None:
+        query = query.where(ArchivedJob.status == status)
+    return query.order_by(ArchivedJob.id.asc()).limit(limit)
+
+# Job listing pages newest first by (created_at, id). The cursor is the key of
+# the last job on a page, so each page is an index seek on ix_jobs_created_at_id
+# however deep it is, where OFFSET would skip over every earlier row.
+
+def encode_cursor(job: Job) -> str:
+    return base64.urlsafe_b64encode(f"{job.created_at.isoformat()}|{job.id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    try:
+        created_at, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), int(job_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def path_prefix_criteria(column, prefix: str) -> list:
+    """
+    `column` starts with `prefix`, compared case-sensitively and without LIKE
+    wildcards (SQLite's LIKE ignores case). The range lets ux_jobs_source_path
+    serve the filter; the substr check keeps it exact under any collation.
+    """
+    return [
+        column >= prefix,
+        column < prefix + chr(0x10FFFF),
+        func.substr(column, 1, len(prefix)) == prefix,
+    ]
+
+def jobs_query(filters: JobFilter, cursor: Optional[str] = None):
+    """Jobs matching `filters`, newest first, after `cursor` when given."""
+    query = select(Job)
+    if filters.status is not None:
+        query = query.where(Job.status == filters.status.value)
+    if filters.job_type is not None:
+        query = query.where(Job.job_type == filters.job_type)
+    if filters.created_after is not None:
+        query = query.where(Job.created_at >= filters.created_after)
+    if filters.created_before is not None:
+        query = query.where(Job.created_at < filters.created_before)
+    if filters.path_prefix:
+        query = query.where(*path_prefix_criteria(Job.source_path, filters.path_prefix))
+    if cursor is not None:
+        query = query.where(tuple_(Job.created_at, Job.id) < decode_cursor(cursor))
+    return query.order_by(Job.created_at.desc(), Job.id.desc())
+
+def lease_expiry(
+    now: datetime.datetime,
+    worker_id: Optional[str],
+    lease: Optional[datetime.timedelta],
+    settings: Settings = settings,
+):
+    """
+    When a claim by `worker_id` expires. Anonymous claims get no lease, since
+    nothing could ever heartbeat them.
+    """
+    if worker_id is None:
+        return None
+    return now + (lease or datetime.timedelta(seconds=settings.lease_duration_seconds))
+
+def claim_plan(worker: Optional[Worker], order: list) -> List[list]:
+    """
+    Queue criteria to claim from, in order. Unregistered workers take any job;
+    registered ones only jobs they are capable of, following their claim_order.
+    """
+    if worker is None:
+        return [[]]
+    plan = []
+    for size_class, max_key in order:
+        criteria = [Job.size_class == size_class, *capability_criteria(worker)]
+        if max_key is not None:
+            criteria.append(Job.schedule_key <= max_key)
+        plan.append(criteria)
+    return plan
+
+def claim_statement(count: int, worker_id: Optional[str], lease_expires_at, now: datetime.datetime, criteria=()):
+    """
+    A single conditional UPDATE moving up to `count` of the next pending jobs
+    matching `criteria` to processing, so concurrent callers can never be handed
+    the same job. On Postgres the candidate rows are locked with SKIP LOCKED so
+    competing claims pick disjoint rows instead of waiting.
+    """
+    candidates = (
+        pending_queue_query(count, *criteria)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(Job)
+        .where(Job.id.in_(candidates), Job.status == "pending")
+        .values(
+            status="processing",
+            worker_id=worker_id,
+            lease_expires_at=lease_expires_at,
+            updated_at=now,
+        )
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    )
+
+@lru_cache(maxsize=None)
+def claim_by_id_statement():
+    """
+    Claim jobs picked from the pending index by id, if they are still pending;
+    only the ids actually claimed are returned. Built once and executed with
+    claim_by_id_params, since it runs on every /job/next.
+    """
+    return (
+        update(Job)
+        .where(Job.id.in_(bindparam("job_ids", expanding=True)), Job.status == "pending")
+        .values(
+            status="processing",
+            worker_id=bindparam("worker_id"),
+            lease_expires_at=bindparam("lease_expires_at"),
+            updated_at=bindparam("now"),
+        )
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    )
+
+def claim_by_id_params(job_ids: List[int], worker_id: Optional[str], lease_expires_at, now: datetime.datetime) -> dict:
+    return {"job_ids": job_ids, "worker_id": worker_id, "lease_expires_at": lease_expires_at, "now": now}
+
+def claimed_jobs_query(job_ids):
+    return (
+        select(Job)
+        .where(Job.id.in_(job_ids))
+        .order_by(Job.schedule_key.asc(), Job.id.asc())
+        .execution_options(populate_existing=True)
+    )
+
+def validation_claim_statement(count: int, lease_expires_at, now: datetime.datetime):
+    """
+    Lease up to `count` validating jobs nobody is validating, or whose validator
+    died, to the calling validator. Same conditional UPDATE as claim_statement.
+    """
+    unclaimed = [
+        Job.status == "validating",
+        or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now),
+    ]
+    candidates = (
+        select(Job.id)
+        .where(*unclaimed)
+        .order_by(Job.schedule_key.asc(), Job.id.asc())
+        .limit(count)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(Job)
+        .where(Job.id.in_(candidates), *unclaimed)
+        .values(lease_expires_at=lease_expires_at)
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    )
+
+def heartbeat_statement(job_id: int, worker_id: str, lease_expires_at, now: datetime.datetime):
+    return (
+        update(Job)
+        .where(
+            Job.id == job_id,
+            Job.status == "processing",
+            Job.worker_id == worker_id,
+        )
+        .values(lease_expires_at=lease_expires_at, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+def reclaim_statements(now: datetime.datetime, max_attempts: int):
+    """
+    Two UPDATEs for processing jobs whose lease has expired: fail those that
+    have used up `max_attempts`, then return the rest to pending. Every expiry
+    counts as an attempt.
+    """
+    expired = [
+        Job.status == "processing",
+        Job.lease_expires_at.is_not(None),
+        Job.lease_expires_at < now,
+    ]
+    fail = (
+        update(Job)
+        .where(*expired, Job.attempts + 1 >= max_attempts)
+        .values(
+            status="failed",
+            attempts=Job.attempts + 1,
+            lease_expires_at=None,
+            error_message="Lease expired too many times",
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    requeue = (
+        update(Job)
+        .where(*expired)
+        .values(
+            status="pending",
+            attempts=Job.attempts + 1,
+            worker_id=None,
+            lease_expires_at=None,
+            updated_at=now,
+        )
+        .returning(*PENDING_ENTRY_COLUMNS)  # for the pending index
+        .execution_options(synchronize_session=False)
+    )
+    return fail, requeue
+
+def not_leased_error(job_id: int, worker_id: Optional[str]) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Job {job_id} is not leased to worker {worker_id}",
+    )
+
+def heartbeat_error(job: Job, worker_id: Optional[str]) -> HTTPException:
+    """Why a heartbeat failed: 410 tells the worker to abort a cancelled job."""
+    if job.status == "cancelled":
+        return HTTPException(status_code=410, detail=f"Job {job.id} was cancelled: {job.error_message}")
+    return not_leased_error(job.id, worker_id)
+
+def check_lease_owner(job: Job, worker_id: Optional[str]) -> None:
+    """A worker whose lease was reclaimed must not finish the job for its new owner."""
+    if job.worker_id != worker_id:
+        raise not_leased_error(job.id, worker_id)
+
+def index_transition(job: Job, old_status: str, new_status: str) -> None:
+    """Keep the pending index in step with a committed status change."""
+    if new_status == "pending":
+        pending_index.put([PendingEntry.of(job)])
+    elif old_status == "pending":
+        pending_index.discard([job.id])
+
+def apply_transition(job: Job, new_status: str) -> None:
+    """Change a job's status in memory if JOB_STATE_MACHINE allows it."""
+    allowed = JOB_STATE_MACHINE.get(job.status, [])
+    if new_status not in allowed:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid transition {job.status} → {new_status}",
+        )
+
+    job.status = new_status
+    job.updated_at = utcnow()
+    if new_status != "processing":
+        job.lease_expires_at = None
+
+def apply_validation(db, job: Job, result: ValidationResult, targets: Dict[str, NotifyTarget]) -> str:
+    """
+    Record a validation result on the job and return the status it moves to.
+    A valid output also queues its Jellyfin/*arr notifications in the same
+    transaction.
+    """
+    job.output_checksum = result.checksum
+    job.error_message = None if result.ok else "; ".join(result.errors)
+    if not result.ok:
+        return "failed"
+    db.add_all(outbox_rows(job, targets))
+    return "done"
+
+@dataclass
+class ServiceContext:
+    """
+    The long-lived pieces job handling needs, all built from one Settings.
+    create_app builds one per app; scripts and tests share default_context().
+    """
+
+    settings: Settings
+    scheduler: Scheduler
+    notify_targets: Dict[str, NotifyTarget]
+    # Bounded, so a burst of multi-GB outputs cannot saturate the disk or tie up threads
+    validation_pool: Executor
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ServiceContext":
+        return cls(
+            settings=settings,
+            scheduler=Scheduler.from_settings(settings),
+            notify_targets=targets_from_settings(settings),
+            validation_pool=ThreadPoolExecutor(max_workers=settings.validation_workers, thread_name_prefix="validate"),
+        )
+
+    @cached_property
+    def rules(self) -> RuleEngine:
+        """The transcode rules, read from settings.transcode_profiles_path on first use."""
+        return load_rule_engine(self.settings.transcode_profiles_path)
+
+@lru_cache(maxsize=None)
+def default_context() -> ServiceContext:
+    return ServiceContext.from_settings(settings)
+
+class AsyncJobService:
+    """
+    Job queue operations on the API's AsyncSession. Every query is awaited on
+    the async driver (aiosqlite/asyncpg); the statements themselves are built
+    by the helpers above, so scripts on a sync engine can reuse them.
+    """
+
+    def __init__(self, db: AsyncSession, context: Optional[ServiceContext] = None):
         self.db = db
+        self.context = context or default_context()
+        self.settings = self.context.settings
 
-    def _get_job_by_id(self, job_id: int):
+    async def _get_job_by_id(self, job_id: int):
         """Retrieve a job by its ID."""
-        job = self.db.query(Job).filter(Job.id == job_id).first()
+        job = await self.db.get(Job, job_id, populate_existing=True)
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         return job
-    
-    def save_job(self, job: Job) -> Job:
-        """Persist a Job to the database."""
-        self.db.add(job)
-        self.db.commit()
-        self.db.refresh(job)
-        return job
-    
-    def create_job(self, source_path: str, job_type: str = "episode") -> Job:
-        """Create a Job domain object (does not persist)."""
-        return Job(
-            source_path=source_path,
-            output_path=path.join("apple", source_path), # Dummy output path
-            job_type=job_type,
-            status="pending",
-        )
 
-    def add_job(self, source_path: str) -> Job:
+    async def add_job(self, source_path: str, job_type: str = "episode") -> Job:
         """Add a new job to the database."""
-        # Check for existing job with same source path
-        existing = self.db.query(Job).filter(Job.source_path == source_path).first()
-        if existing:
+        [(job, created)] = await self.add_jobs([JobSpec(source_path=source_path, job_type=job_type)])
+        if not created:
+            # ux_jobs_source_path rejects a second job for the same source file
             raise HTTPException(status_code=400, detail="Job already exists")
-        
-        # Create new job object with source path and initial pending status
-        new_job = self.create_job(source_path=source_path)
-        return self.save_job(new_job)
-
-    def get_next_pending_job(self):
-        """Return the oldest pending job and mark it as processing."""
-        job = (
-            self.db.query(Job)
-            .filter(Job.status == "pending")
-            .order_by(Job.created_at.asc())
-            .first()
-        )
-        if not job:
-            raise HTTPException(status_code=404, detail="No pending jobs")
+        return job
 
-        return self._transition(job, "processing")
+    async def add_jobs(self, specs: List[JobSpec]) -> List[Tuple[Job, bool]]:
+        """
+        Add many jobs in a single transaction.
 
-    def validate_job(self, job_id: int, output_path: str):
-        """Mark job as processing → validating."""
-        job = self._get_job_by_id(job_id)
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
-        
-        self._transition(job, "validating")
-
-        valid = JobValidator().validate(job)
-        if not valid:
-            return self._transition(job, "failed")
-        else:
-            return self._transition(job, "done")
-        
-    def complete_job(self, job_id: int):
-        """Mark job as validating → done if successful."""
-        job = self.db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
+        Rows whose source path already has a job are skipped by the database
+        (INSERT ... ON CONFLICT DO NOTHING), so one commit covers the whole batch.
+        Returns a (job, created) pair per spec, in input order; `created` is False
+        for duplicates, including repeats within the batch and files whose job
+        has been archived. New jobs supersede the live jobs for the same media
+        in the same transaction; see supersede_statements. Each new pending job
+        is then given its place in the queue by the scheduler, in the order of
+        `specs`; duplicates and jobs recorded as done take no fair-share slot.
+        """
+        if not specs:
+            return []
 
-        return self._transition(job, "validating")
+        # Archived files are duplicates too; they never reach the insert
+        existing = {job.source_path: job for job in (await self.db.execute(archived_query(specs))).scalars()}
+        fresh = [spec for spec in specs if spec.source_path not in existing]
 
-    def fail_job(self, job_id: int):
-        """Mark job as failed from any state."""
-        job = self.db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
+        dialect_name = self.db.bind.dialect.name
+        now = utcnow()
+        created = {}
+        if fresh:
+            created = {
+                job.source_path: job
+                for job in (await self.db.execute(
+                    insert_jobs_statement(dialect_name), queued_rows(fresh, now)
+                )).scalars()
+            }
+        # Slots are reserved for the rows actually inserted, in the same transaction
+        slotted = slotted_jobs(created)
+        flow_starts = {}
+        for flow, (count, spacing) in flow_demand(slotted, self.context.scheduler).items():
+            end = (await self.db.execute(
+                reserve_slots_statement(dialect_name), reserve_slots_params(flow, count, spacing, now)
+            )).scalar_one()
+            flow_starts[flow] = end - count * spacing
+        assign_slots(slotted, flow_starts, self.context.scheduler)
+        new_media = {job.media_key for job in created.values()}
+        cancelled = {
+            status: (await self.db.execute(statement)).scalars().all()
+            for status, statement in supersede_statements(new_media, [job.id for job in created.values()], now)
+        }
+        await self.db.commit()
+        record_transitions(queued_transitions(created))
+        pending_index.add(queued_entries(created))
+        record_cancellations(cancelled)
 
-        return self._transition(job, "failed")
+        duplicates = duplicates_query(fresh, created)
+        if duplicates is not None:
+            existing.update((job.source_path, job) for job in (await self.db.execute(duplicates)).scalars())
+        return batch_results(specs, created, existing)
 
-    def _transition(self, job: Job, new_status: str):
-        """Internal helper to safely change job status."""
-        allowed = JOB_STATE_MACHINE.get(job.status, [])
-        if new_status not in allowed:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid transition {job.status} → {new_status}",
+    async def supersede(self, media_keys: Collection[str]) -> int:
+        """
+        Cancel the live jobs for `media_keys`, for imports that queue no job of
+        their own (transcode_skip_action "ignore"); see supersede_statements.
+        Returns the number of jobs cancelled.
+        """
+        statements = supersede_statements(media_keys, [], utcnow())
+        if not statements:
+            return 0
+        cancelled = {status: (await self.db.execute(statement)).scalars().all() for status, statement in statements}
+        await self.db.commit()
+        record_cancellations(cancelled)
+        return sum(len(ids) for ids in cancelled.values())
+
+    async def claim_pending_jobs(
+        self,
+        count: int = 1,
+        worker_id: Optional[str] = None,
+        lease: Optional[datetime.timedelta] = None,
+    ) -> List[Job]:
+        """Atomically move up to `count` of the next pending jobs to processing.
+
+        Each claimed job is leased to `worker_id` until the lease expires
+        (settings.lease_duration_seconds by default); see claim_statement. A
+        registered worker only gets jobs it is capable of; see claim_plan.
+        Once the pending index is warmed, jobs are picked from it and claimed
+        by id; see src/queue_index.py.
+        """
+        now = utcnow()
+        lease_expires_at = lease_expiry(now, worker_id, lease, self.settings)
+        worker = await self.db.get(Worker, worker_id) if worker_id else None
+        order = None
+        if worker is not None:
+            # Only workers that are not big nodes need to know whether one exists
+            big_nodes = (
+                is_big_node(worker, self.settings)
+                or (await self.db.execute(big_nodes_query(self.settings))).scalar()
             )
+            order = claim_order(worker, now.timestamp(), big_nodes, self.settings)
+        claimed_ids, tried = [], []
+        # The pending index names the jobs to claim without searching the table
+        while pending_index.ready and len(claimed_ids) < count:
+            candidates = pending_index.candidates(count - len(claimed_ids), worker, skip=set(tried), order=order)
+            if not candidates:
+                break
+            tried += candidates
+            claimed_ids += (await self.db.execute(
+                claim_by_id_statement(), claim_by_id_params(candidates, worker_id, lease_expires_at, now)
+            )).scalars().all()
+        # Jobs the index has not seen yet, e.g. queued by another process
+        for criteria in claim_plan(worker, order) if len(claimed_ids) < count else ():
+            claimed_ids += (await self.db.execute(
+                claim_statement(count - len(claimed_ids), worker_id, lease_expires_at, now, criteria)
+            )).scalars().all()
+            if len(claimed_ids) >= count:
+                break
+        await self.db.commit()
+        record_transition("pending", "processing", len(claimed_ids))
+        # Claimed now, or no longer pending because another process claimed them
+        pending_index.discard([*tried, *claimed_ids])
+
+        if not claimed_ids:
+            return []
+        return (await self.db.execute(claimed_jobs_query(claimed_ids))).scalars().all()
+
+    async def heartbeat(self, job_id: int, worker_id: str, lease: Optional[datetime.timedelta] = None):
+        """Extend the lease on a processing job held by `worker_id`."""
+        now = utcnow()
+        extended = (await self.db.execute(
+            heartbeat_statement(job_id, worker_id, lease_expiry(now, worker_id, lease, self.settings), now)
+        )).rowcount
+        await self.db.commit()
+
+        job = await self._get_job_by_id(job_id)
+        if not extended:
+            raise heartbeat_error(job, worker_id)
+        return job
+
+    async def register_worker(self, worker_id: str, capabilities: WorkerCapabilities) -> Worker:
+        """Record (or update) what a worker can run."""
+        worker = await self.db.get(Worker, worker_id) or Worker(id=worker_id)
+        for field, value in capabilities.model_dump().items():
+            setattr(worker, field, value)
+        self.db.add(worker)
+        await self.db.commit()
+        await self.db.refresh(worker)
+        return worker
+
+    async def set_priority(self, job_id: int, priority: int):
+        """Move a pending job up or down the queue."""
+        job = await self._get_job_by_id(job_id)
+        apply_priority(job, priority, self.context.scheduler)
+        await self.db.commit()
+        await self.db.refresh(job)
+        pending_index.put([PendingEntry.of(job)])
+        return job
+
+    async def reclaim_expired_jobs(self, max_attempts: Optional[int] = None) -> int:
+        """Return processing jobs with an expired lease to pending, or fail them.
+
+        A job that has used up `max_attempts` (settings.max_job_attempts by
+        default) moves to failed instead of being retried. Returns the number of
+        jobs reclaimed.
+        """
+        fail, requeue = reclaim_statements(utcnow(), max_attempts or self.settings.max_job_attempts)
+        failed, requeued = (await self.db.execute(fail)).rowcount, (await self.db.execute(requeue)).all()
+        await self.db.commit()
+        record_transitions([("processing", "failed", failed), ("processing", "pending", len(requeued))])
+        pending_index.put(requeued)
+        return failed + len(requeued)
+
+    async def get_job(self, job_id: int):
+        """A live job, or its archived copy once it has been archived."""
+        job = await self.db.get(Job, job_id, populate_existing=True)
+        if job is None:
+            job = await self.db.get(ArchivedJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return job
+
+    async def list_jobs(self, filters: JobFilter, cursor: Optional[str] = None, limit: int = 100) -> JobPage:
+        """One page of jobs; fetches one extra row to tell whether another page follows."""
+        jobs = (await self.db.execute(jobs_query(filters, cursor).limit(limit + 1))).scalars().all()
+        if len(jobs) <= limit:
+            return JobPage(jobs=jobs)
+        return JobPage(jobs=jobs[:limit], next_cursor=encode_cursor(jobs[limit - 1]))
+
+    async def export_jobs(self, filters: JobFilter, chunk_size: int = 500):
+        """
+        Every matching job as one NDJSON line, read through a server-side
+        cursor `chunk_size` rows at a time, so an export of the whole table
+        never holds more than a chunk in memory.
+        """
+        result = await self.db.stream(jobs_query(filters).execution_options(yield_per=chunk_size))
+        async for job in result.scalars():
+            yield JobResponse.model_validate(job).model_dump_json() + "\n"
+
+    async def archive_batch(self, cutoff: datetime.datetime, limit: int) -> int:
+        """Move up to `limit` done/failed/cancelled jobs older than `cutoff` to jobs_archive.
+
+        Copy and delete share one short transaction, so a job is never in both
+        tables or in neither. Returns the number of jobs moved.
+        """
+        job_ids = (await self.db.execute(archive_candidates_query(cutoff, limit))).scalars().all()
+        if not job_ids:
+            return 0
+        for statement in archive_statements(job_ids, utcnow()):
+            await self.db.execute(statement)
+        await self.db.commit()
+        return len(job_ids)
+
+    async def archived_jobs(
+        self,
+        source_path: Optional[str] = None,
+        status: Optional[str] = None,
+        after_id: int = 0,
+        limit: int = 100,
+    ) -> List[ArchivedJob]:
+        return (await self.db.execute(archived_jobs_query(source_path, status, after_id, limit))).scalars().all()
+
+    async def status_counts(self) -> dict:
+        return dict((await self.db.execute(status_counts_query())).all())
 
-        job.status = new_status
-        job.updated_at = datetime.datetime.now(datetime.timezone.utc)
-        self.db.commit()
-        self.db.refresh(job)
-        return job
\ No newline at end of file
+    async def submit_output(self, job_id: int, output_path: str, worker_id: Optional[str] = None):
+        """Mark job as processing → validating; the validation stage takes it from there."""
+        job = await self._get_job_by_id(job_id)
+        check_lease_owner(job, worker_id)
+        # The worker decides where its output goes
+        job.output_path = output_path
+        return await self._transition(job, "validating")
+
+    async def claim_validations(self, count: int = 1, lease: Optional[datetime.timedelta] = None) -> List[Job]:
+        """Lease up to `count` validating jobs to this validator."""
+        now = utcnow()
+        lease = lease or datetime.timedelta(seconds=self.settings.validation_lease_seconds)
+        claimed_ids = (await self.db.execute(validation_claim_statement(count, now + lease, now))).scalars().all()
+        await self.db.commit()
+
+        if not claimed_ids:
+            return []
+        return (await self.db.execute(claimed_jobs_query(claimed_ids))).scalars().all()
+
+    async def finish_validation(self, job: Job):
+        """Validate a claimed job's output and mark it validating → done/failed."""
+        # Hashing a multi-GB output must not stall the event loop
+        result = await asyncio.get_running_loop().run_in_executor(
+            self.context.validation_pool, JobValidator(self.settings).validate, job.source_path, job.output_path
+        )
+        job = await self._get_job_by_id(job.id)
+        if job.status != "validating":
+            # Our lease ran out and another validator already finished it
+            return job
+        return await self._transition(job, apply_validation(self.db, job, result, self.context.notify_targets))
+
+    async def _transition(self, job: Job, new_status: str):
+        """Internal helper to safely change job status."""
+        old_status = job.status
+        apply_transition(job, new_status)
+        await self.db.commit()
+        record_transition(old_status, new_status)
+        await self.db.refresh(job)
+        index_transition(job, old_status, new_status)
+        return job
@@ -1,3 +0,0 @@
-from .db import *
-from .factories import *
-from .JobService import *
\ No newline at end of file
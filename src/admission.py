@@ -0,0 +1,105 @@
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+
+from src.config import Settings, settings
+from src.metrics import RecentLatency, db_latency, record_admitted, record_shed
+from src.queue_index import pending_index
+
+class ConcurrencyLimit:
+    """
+    At most `limit` requests of one class in flight. Only touched from the
+    event loop (async dependencies), so a plain counter is enough.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+def pending_depth() -> Optional[int]:
+    """Pending jobs as the in-process index sees them; None until it is warmed."""
+    return len(pending_index) if pending_index.ready else None
+
+class AdmissionControl:
+    """
+    Decides whether a request may start. Webhooks are shed while the pending
+    queue is too deep (429) or the DB is saturated (503): the *arr apps retry
+    them later, and the work they would queue could not start soon anyway.
+    Worker endpoints are only bounded by their own concurrency limit, so a
+    burst of imports can never use up the slots workers claim and report with.
+    """
+
+    def __init__(
+        self,
+        settings: Settings = settings,
+        queue_depth: Callable[[], Optional[int]] = pending_depth,
+        latency: RecentLatency = db_latency,
+    ):
+        self.settings = settings
+        self.queue_depth = queue_depth
+        self.latency = latency
+        self.webhooks = ConcurrencyLimit(settings.admission_webhook_concurrency)
+        self.workers = ConcurrencyLimit(settings.admission_worker_concurrency)
+
+    def webhook_refusal(self) -> Optional[HTTPException]:
+        """Why a webhook may not start now, or None to admit it (taking a webhook slot)."""
+        max_pending = self.settings.admission_max_pending
+        depth = self.queue_depth() if max_pending else None
+        if depth is not None and depth >= max_pending:
+            return self._shed("webhook", "queue_depth", 429, f"{depth} jobs are already pending")
+
+        max_latency = self.settings.admission_max_db_latency_ms / 1000
+        if max_latency and self.latency.current() > max_latency:
+            return self._shed("webhook", "db_latency", 503, "The database is saturated")
+
+        if not self.webhooks.try_acquire():
+            return self._shed("webhook", "concurrency", 503, "Too many webhooks in flight")
+        record_admitted("webhook")
+        return None
+
+    def worker_refusal(self) -> Optional[HTTPException]:
+        """Why a worker request may not start now, or None to admit it (taking a worker slot)."""
+        if not self.workers.try_acquire():
+            return self._shed("worker", "concurrency", 503, "Too many worker requests in flight")
+        record_admitted("worker")
+        return None
+
+    def _shed(self, endpoint_class: str, reason: str, status_code: int, detail: str) -> HTTPException:
+        record_shed(endpoint_class, reason)
+        retry_after = (
+            self.settings.admission_retry_after_seconds
+            if endpoint_class == "webhook"
+            else self.settings.admission_worker_retry_after_seconds
+        )
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+# FastAPI dependencies; the slot is held until the response has been produced
+
+async def admit_webhook(request: Request):
+    admission: AdmissionControl = request.app.state.admission
+    refusal = admission.webhook_refusal()
+    if refusal is not None:
+        raise refusal
+    try:
+        yield
+    finally:
+        admission.webhooks.release()
+
+async def admit_worker(request: Request):
+    admission: AdmissionControl = request.app.state.admission
+    refusal = admission.worker_refusal()
+    if refusal is not None:
+        raise refusal
+    try:
+        yield
+    finally:
+        admission.workers.release()
@@ -0,0 +1,45 @@
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+from src.config import Settings, settings
+from src.db import utcnow
+from src.JobService import AsyncJobService
+
+logger = logging.getLogger(__name__)
+
+async def archive_expired(
+    session_factory,
+    settings: Settings = settings,
+    now: Optional[datetime.datetime] = None,
+) -> int:
+    """
+    Move every done/failed/cancelled job older than archive_after_days to
+    jobs_archive, archive_batch_size jobs per transaction. Each batch commits on
+    its own and is followed by a short pause, so the write lock is only ever
+    held briefly and webhooks and claims interleave with a large backlog.
+    Returns the number of jobs moved.
+    """
+    cutoff = (now or utcnow()) - datetime.timedelta(days=settings.archive_after_days)
+    moved = 0
+    while True:
+        async with session_factory() as session:
+            batch = await AsyncJobService(session).archive_batch(cutoff, settings.archive_batch_size)
+        moved += batch
+        if batch < settings.archive_batch_size:
+            return moved
+        await asyncio.sleep(settings.archive_pause_seconds)
+
+async def run_archiver(session_factory, interval: Optional[float] = None, settings: Settings = settings):
+    """Periodically archive finished jobs past their retention age."""
+    interval = interval or settings.archive_interval_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            moved = await archive_expired(session_factory, settings)
+        except Exception:
+            logger.exception("Archive pass failed")
+            continue
+        if moved:
+            logger.info("Archived %d finished jobs", moved)
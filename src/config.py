@@ -0,0 +1,153 @@
+import os
+from dataclasses import dataclass, fields
+
+@dataclass
+class Settings:
+    """
+    Runtime configuration. Every field can be overridden by the upper-cased
+    environment variable of the same name, e.g. DATABASE_URL.
+    """
+
+    database_url: str = "sqlite:///./jobs.db"
+
+    # SQLite connection tuning, applied to every new connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kib: int = 64 * 1024
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+
+    # Connection pool for file-backed SQLite and server databases
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+
+    # Worker leases: how long a claim lives without a heartbeat, how many
+    # claims a job gets, and how often expired leases are reclaimed
+    lease_duration_seconds: float = 120.0
+    max_job_attempts: int = 3
+    reaper_interval_seconds: float = 10.0
+
+    # Webhook group commit: how long the first webhook waits for others to join
+    ingest_batch_window_ms: float = 5.0
+    ingest_max_batch: int = 500
+    # Webhook retries: how many delivered imports (downloadId + file id) are
+    # remembered in process, and for how long, to answer repeats without the DB
+    webhook_reply_cache_size: int = 10000
+    webhook_reply_ttl_seconds: float = 3600.0
+
+    # Transcode rules: a JSON list of target profiles (built-in defaults when
+    # empty), and what to do with a file that already meets its profile:
+    # "done" records it as a finished job, "ignore" queues nothing
+    transcode_profiles_path: str = ""
+    transcode_skip_action: str = "done"
+
+    # Queue order (see src/scheduler.py): spacing between consecutive jobs of
+    # one job_type/instance flow, how far each priority level moves a job ahead,
+    # the transcode throughput used to estimate job length for shortest-job-first
+    # (0 disables it), and per job_type / instanceName weights as "name=weight,..."
+    fair_share_slot_seconds: float = 60.0
+    priority_step_seconds: float = 600.0
+    sjf_bytes_per_second: float = 0.0
+    job_type_weights: str = ""
+    instance_weights: str = ""
+
+    # Capability matching (see src/workers.py): sources this big, or taller
+    # than 1080p, are large jobs. Registered workers with at least these cores
+    # and this much RAM take large jobs first. Other workers take them once
+    # small work runs out if no such worker is registered, and in any case once
+    # one has waited this long past its slot
+    large_job_bytes: int = 20 * 1024 ** 3
+    large_job_min_cores: int = 16
+    large_job_min_ram_mb: int = 16 * 1024
+    large_job_fallback_seconds: float = 4 * 3600.0
+
+    # Output validation (see src/validation.py): accepted output size as a
+    # fraction of the source, accepted duration drift as a fraction of the
+    # source duration (checked when ffprobe is available), the read size used
+    # for checksums, and how many outputs are validated at once
+    validation_min_size_ratio: float = 0.05
+    validation_max_size_ratio: float = 1.5
+    validation_duration_tolerance: float = 0.02
+    validation_chunk_bytes: int = 1024 * 1024
+    validation_workers: int = 2
+    ffprobe_path: str = "ffprobe"
+
+    # Validation stage (see src/validation_stage.py): how long a validator may
+    # hold a validating job before another one takes it over, and how often
+    # idle validators look for jobs queued by other API processes
+    validation_lease_seconds: float = 600.0
+    validation_poll_seconds: float = 5.0
+
+    # Notifications after successful transcodes (see src/notify.py). A target
+    # is enabled by setting its URL. Completions are coalesced per library
+    # folder (Jellyfin), series (Sonarr) or movie (Radarr): one call goes out
+    # once a key has been quiet for its target's debounce window, or has waited
+    # notify_max_delay_seconds. Failed calls are retried with exponential
+    # backoff and given up after notify_max_attempts.
+    jellyfin_url: str = ""
+    jellyfin_api_key: str = ""
+    jellyfin_debounce_seconds: float = 60.0
+    sonarr_url: str = ""
+    sonarr_api_key: str = ""
+    sonarr_debounce_seconds: float = 15.0
+    radarr_url: str = ""
+    radarr_api_key: str = ""
+    radarr_debounce_seconds: float = 15.0
+    notify_max_delay_seconds: float = 600.0
+    notify_retry_base_seconds: float = 5.0
+    notify_retry_max_seconds: float = 900.0
+    notify_max_attempts: int = 10
+    notify_poll_seconds: float = 2.0
+    notify_timeout_seconds: float = 10.0
+    notify_max_connections: int = 10
+
+    # Retention (see src/archive.py): done/failed/cancelled jobs untouched for
+    # archive_after_days move to jobs_archive, archive_batch_size per
+    # transaction with a pause between batches so writers are never held up
+    archive_after_days: float = 30.0
+    archive_batch_size: int = 1000
+    archive_pause_seconds: float = 0.05
+    archive_interval_seconds: float = 3600.0
+
+    # In-process pending queue index (see src/queue_index.py): how often it is
+    # rebuilt from the DB to pick up jobs queued or claimed by other processes
+    queue_index_reconcile_seconds: float = 30.0
+
+    # Multi-process serving (uvicorn --workers N; see src/wakeups.py): wakeups
+    # are relayed between the processes through Unix sockets in wakeup_dir,
+    # by default a directory in the system temp dir derived from database_url
+    cross_process_wakeups: bool = True
+    wakeup_dir: str = ""
+
+    # Admission control (see src/admission.py). Webhooks are refused with a 429
+    # while more than admission_max_pending jobs are pending, and with a 503
+    # while recent DB statement latency is above admission_max_db_latency_ms
+    # (0 disables either check). Webhook and worker endpoints each get their
+    # own concurrency limit, so an import burst cannot crowd out workers.
+    # Retry-After tells the *arr apps and workers when to try again.
+    admission_max_pending: int = 50000
+    admission_max_db_latency_ms: float = 250.0
+    admission_db_latency_half_life_seconds: float = 5.0
+    admission_webhook_concurrency: int = 32
+    admission_worker_concurrency: int = 512
+    admission_retry_after_seconds: int = 30
+    admission_worker_retry_after_seconds: int = 1
+
+    @classmethod
+    def from_env(cls, environ=None) -> "Settings":
+        """Build settings from defaults overridden by environment variables."""
+        environ = os.environ if environ is None else environ
+        overrides = {}
+        for field in fields(cls):
+            raw = environ.get(field.name.upper())
+            if raw is None:
+                continue
+            if field.type is bool:
+                overrides[field.name] = raw.lower() in ("1", "true", "yes", "on")
+            elif field.type in (int, float):
+                overrides[field.name] = field.type(raw)
+            else:
+                overrides[field.name] = raw
+        return cls(**overrides)
+
+settings = Settings.from_env()
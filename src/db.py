@@ -1,24 +1,331 @@
-from sqlalchemy import Column, Integer, String, DateTime, create_engine, JSON
+from sqlalchemy import BigInteger, Column, Float, Index, Integer, String, DateTime, create_engine, event, inspect, text, JSON
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
+from functools import lru_cache
+from typing import Optional
 import datetime
+import fcntl
+import os
 
-DATABASE_URL = "sqlite:///./jobs.db"  # SQLite file
+from src.config import Settings, settings
+from src.metrics import instrument_queries
+
+DATABASE_URL = settings.database_url  # SQLite file unless DATABASE_URL is set
 
 Base = declarative_base()
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
-class Job(Base):
-    __tablename__ = "jobs"
+SYNC_DRIVERS = {
+    "postgresql": "postgresql+psycopg",
+}
+
+def create_db_engine(url: Optional[str] = None, settings: Settings = settings) -> Engine:
+    """
+    Build an engine for `url` (defaults to settings.database_url).
+
+    SQLite connections are tuned on connect (WAL, synchronous, busy_timeout,
+    cache and mmap sizes from settings). In-memory SQLite shares one connection
+    through a StaticPool; file-backed SQLite and server databases get a sized
+    QueuePool. Every statement is timed into the DB metrics (src/metrics.py).
+    A bare postgresql:// URL is served by psycopg (v3).
+    """
+    url = make_url(url or settings.database_url)
+    if url.drivername in SYNC_DRIVERS:
+        url = url.set(drivername=SYNC_DRIVERS[url.drivername])
+
+    if url.get_backend_name() != "sqlite":
+        engine = create_engine(
+            url,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_pre_ping=True,
+        )
+        instrument_queries(engine)
+        return engine
+
+    connect_args = {"check_same_thread": False}
+    if url.database in (None, "", ":memory:"):
+        engine = create_engine(url, connect_args=connect_args, poolclass=StaticPool)
+    else:
+        connect_args["timeout"] = settings.sqlite_busy_timeout_ms / 1000
+        engine = create_engine(
+            url,
+            connect_args=connect_args,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+        )
+    tune_sqlite(engine, settings)
+    instrument_queries(engine)
+    return engine
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def create_async_db_engine(url: Optional[str] = None, settings: Settings = settings, **kwargs) -> AsyncEngine:
+    """
+    Async counterpart of create_db_engine: same URL, pools and SQLite pragmas,
+    with the driver swapped for aiosqlite/asyncpg. Extra kwargs go to
+    create_async_engine (e.g. poolclass).
+    """
+    url = make_url(url or settings.database_url)
+    backend = url.get_backend_name()
+    if backend in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[backend])
+
+    if backend != "sqlite":
+        kwargs.setdefault("pool_size", settings.db_pool_size)
+        kwargs.setdefault("max_overflow", settings.db_max_overflow)
+        engine = create_async_engine(url, pool_pre_ping=True, **kwargs)
+        instrument_queries(engine.sync_engine)
+        return engine
+
+    connect_args = {"check_same_thread": False}
+    if url.database in (None, "", ":memory:"):
+        kwargs.setdefault("poolclass", StaticPool)
+    else:
+        connect_args["timeout"] = settings.sqlite_busy_timeout_ms / 1000
+        if "poolclass" not in kwargs:
+            kwargs.setdefault("pool_size", settings.db_pool_size)
+            kwargs.setdefault("max_overflow", settings.db_max_overflow)
+    engine = create_async_engine(url, connect_args=connect_args, **kwargs)
+    tune_sqlite(engine.sync_engine, settings)
+    instrument_queries(engine.sync_engine)
+    return engine
+
+def tune_sqlite(engine: Engine, settings: Settings = settings) -> None:
+    """Apply the SQLite pragmas from settings to every new connection of `engine`."""
+    pragmas = [
+        f"PRAGMA journal_mode={settings.sqlite_journal_mode}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA cache_size=-{settings.sqlite_cache_size_kib}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+# The default engines and session factories for settings.database_url are
+# built on first use, so importing this module never touches the database.
+# The API builds its own in create_app's lifespan; these serve scripts.
+
+@lru_cache(maxsize=None)
+def default_engine() -> Engine:
+    return create_db_engine()
+
+@lru_cache(maxsize=None)
+def default_async_engine() -> AsyncEngine:
+    return create_async_db_engine()
+
+_LAZY = {
+    "engine": default_engine,
+    "SessionLocal": lambda: sessionmaker(bind=default_engine(), autoflush=False, autocommit=False),
+    "async_engine": default_async_engine,
+    "AsyncSessionLocal": lambda: async_sessionmaker(bind=default_async_engine(), autoflush=False, expire_on_commit=False),
+}
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = _LAZY[name]()
+    return value
+
+def utcnow() -> datetime.datetime:
+    # Timestamps are aware UTC throughout; the DateTime columns are
+    # timezone=True so PostgreSQL stores them as timestamptz
+    return datetime.datetime.now(datetime.timezone.utc)
+
+class JobColumns:
+    """Columns shared by live jobs and their archived copies."""
 
     id = Column(Integer, primary_key=True, index=True)
     job_type = Column(String, nullable=False)           # e.g. "movie" or "episode"
     source_path = Column(String, nullable=False)        # original file path
     output_path = Column(String, nullable=True)         # final transcoded file
     status = Column(String, default="pending")          # current workflow state
-    created_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc))
-    updated_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc), onupdate=datetime.datetime.now(datetime.timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+    worker_id = Column(String, nullable=True)           # worker holding the lease
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # reclaimed by the reaper once passed
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    error_message = Column(String, nullable=True)
+    profile = Column(String, nullable=True)             # target profile picked by the rules engine
+    instance_name = Column(String, nullable=True)       # *arr instance that sent the webhook
+    size_bytes = Column(BigInteger, nullable=True)      # source file size, for shortest-job-first
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+    fair_slot = Column(Float, nullable=True)            # fair-share slot the job was given when queued
+    schedule_key = Column(Float, nullable=False, default=0, server_default="0")  # claim order, see src/scheduler.py
+    encoder = Column(String, nullable=True)             # codec a worker must be able to encode
+    size_class = Column(String, nullable=False, default="small", server_default="small")  # see src/workers.py
+    output_checksum = Column(String, nullable=True)     # sha256 of the validated output
+    media_id = Column(Integer, nullable=True)           # Sonarr series / Radarr movie id, for refreshes
+    media_key = Column(String, nullable=True)           # the movie/episodes a file is for; see src/ingest.py
+    idempotency_key = Column(String, nullable=True)     # downloadId + file id of the webhook that queued it
     # metadata = Column(JSON, nullable=True)              # optional extra info
 
-# Create the table
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+class Job(JobColumns, Base):
+    __tablename__ = "jobs"
+
+    __table_args__ = (
+        # Queue order for /job/next: WHERE status = ? ORDER BY schedule_key
+        Index("ix_jobs_status_schedule_key", "status", "schedule_key"),
+        # Capability-matched claims: WHERE status = ? AND size_class = ? ORDER BY schedule_key
+        Index("ix_jobs_status_size_class_schedule_key", "status", "size_class", "schedule_key"),
+        # Job listing: ORDER BY created_at DESC, id DESC with a (created_at, id) cursor
+        Index("ix_jobs_created_at_id", "created_at", "id"),
+        # Webhook dedupe, enforced by the DB rather than a check-then-insert
+        Index("ux_jobs_source_path", "source_path", unique=True),
+        # Supersession: WHERE media_key IN (...) AND status = ?
+        Index("ix_jobs_media_key_status", "media_key", "status"),
+    )
+
+class ArchivedJob(JobColumns, Base):
+    """
+    Done, failed and cancelled jobs moved out of jobs once they are old enough
+    (see src/archive.py), keeping their ids, so the hot table only holds live
+    work.
+    """
+    __tablename__ = "jobs_archive"
+
+    archived_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+    __table_args__ = (
+        # Webhook dedupe reaches into the archive through this index
+        Index("ux_jobs_archive_source_path", "source_path", unique=True),
+        # History reads: WHERE status = ? ORDER BY id
+        Index("ix_jobs_archive_status_id", "status", "id"),
+    )
+
+class Worker(Base):
+    """Capabilities a worker registered, used to match it with jobs."""
+    __tablename__ = "workers"
+
+    id = Column(String, primary_key=True)               # the worker_id it claims jobs with
+    cores = Column(Integer, nullable=False)
+    ram_mb = Column(Integer, nullable=False)
+    encoders = Column(JSON, nullable=False, default=list)
+    max_file_size_bytes = Column(BigInteger, nullable=True)
+    registered_at = Column(DateTime(timezone=True), default=utcnow)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+class QueueFlow(Base):
+    """Next fair-share slot of each job_type/instance flow."""
+    __tablename__ = "queue_flows"
+
+    flow = Column(String, primary_key=True)
+    next_slot = Column(Float, nullable=False)
+
+class Notification(Base):
+    """
+    Outbox of calls owed to Jellyfin/Sonarr/Radarr after a successful transcode,
+    written in the transaction that marks the job done (see src/notify.py).
+    """
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    target = Column(String, nullable=False)             # jellyfin, sonarr or radarr
+    key = Column(String, nullable=False)                # what to refresh: library folder, series or movie id
+    job_id = Column(Integer, nullable=True)
+    status = Column(String, nullable=False, default="pending", server_default="pending")  # pending or dead
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)  # retry backoff, or a sender's claim
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Due scan: WHERE status = 'pending' AND next_attempt_at <= ? GROUP BY target, key
+        Index("ix_notifications_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+def migrate(bind) -> None:
+    """
+    Bring an existing database up to the current schema: create missing tables,
+    add columns and indexes introduced since the DB was created.
+    """
+    Base.metadata.create_all(bind=bind)
+
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += " DEFAULT " + ("'" + default.replace("'", "''") + "'" if isinstance(default, str) else default.text)
+                conn.execute(text(ddl))
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.unique:
+                    _check_no_duplicates(conn, table, index)
+                index.create(conn)
+
+class MigrationError(RuntimeError):
+    """The existing data cannot be upgraded without a manual decision."""
+
+def _check_no_duplicates(conn, table, index) -> None:
+    """Refuse to build a unique index over rows that would violate it."""
+    key = ", ".join(col.name for col in index.columns)
+    duplicates = conn.execute(text(
+        f"SELECT {key}, COUNT(*) FROM {table.name} GROUP BY {key} HAVING COUNT(*) > 1"
+    )).all()
+    if duplicates:
+        listed = "\n".join(f"  {tuple(row[:-1])}: {row[-1]} rows" for row in duplicates)
+        raise MigrationError(
+            f"Cannot create unique index {index.name} on {table.name}({key}); "
+            f"remove the duplicate rows below and restart:\n{listed}"
+        )
+
+# Arbitrary constant naming the migration lock on PostgreSQL
+MIGRATION_LOCK_KEY = 0x7472616E73
+
+def prepare_database(bind: Optional[Engine] = None) -> None:
+    """
+    Create or upgrade the tables, once however many API processes start
+    together: the first to take the lock migrates, the others wait for it and
+    find nothing left to do. File-backed SQLite locks a file next to the DB,
+    PostgreSQL takes an advisory lock.
+    """
+    bind = bind or default_engine()
+    url = bind.url
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        with open(f"{url.database}.migrate-lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                migrate(bind)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    elif url.get_backend_name() == "postgresql":
+        with bind.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                migrate(bind)
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    else:
+        migrate(bind)
+
+def _discard_inherited_pools() -> None:
+    # A forked child (gunicorn --preload and the like) must open its own
+    # connections, tuned by its own connect hook, not reuse the parent's
+    if default_engine.cache_info().currsize:
+        default_engine().dispose(close=False)
+    if default_async_engine.cache_info().currsize:
+        default_async_engine().sync_engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_discard_inherited_pools)
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+from typing import Dict
+
+class JobNotifier:
+    """
+    Wakes long-polling workers parked on GET /job/next when work is queued.
+
+    `notify` is called from async routes and background stages, whose event
+    loop need not be the waiters'; each waiter is woken on its own loop through
+    call_soon_threadsafe, so calling from another thread is safe too. Every
+    notification wakes all parked waiters and each one re-runs its atomic claim, so a wakeup can never
+    be lost to a waiter that has already found a job.
+
+    With several API processes, a WakeupBus (src/wakeups.py) attached as
+    `relay` forwards each notification to the same notifier in the others.
+    """
+
+    def __init__(self, channel: bytes = b""):
+        self._lock = threading.Lock()
+        self._events: Dict[asyncio.AbstractEventLoop, asyncio.Event] = {}
+        self.channel = channel
+        self.relay = None
+
+    def watch(self) -> asyncio.Event:
+        """Return the event the next notification will set. Call before checking the queue."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            event = self._events.get(loop)
+            if event is None:
+                event = self._events[loop] = asyncio.Event()
+            return event
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> bool:
+        """Wait until `event` is set or `timeout` elapses. Returns True if woken."""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def notify(self) -> None:
+        """Wake every parked waiter, in this process and, with a relay, the others."""
+        self.wake()
+        relay = self.relay
+        if relay is not None:
+            relay.publish(self.channel)
+
+    def wake(self) -> None:
+        """Wake the waiters parked in this process only."""
+        with self._lock:
+            events, self._events = self._events, {}
+
+        for loop, event in events.items():
+            if loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Loop shut down between the check and the call
+                pass
+
+job_notifier = JobNotifier(b"j")          # a job was queued: wakes GET /job/next
+validation_notifier = JobNotifier(b"v")   # an output was submitted: wakes the validation stage
+result_notifier = JobNotifier(b"r")       # a validation finished: wakes GET /job/{id}?wait
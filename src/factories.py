@@ -1,3 +1,5 @@
+import os
+
 import factory
 from faker import Faker
 from src.db import Job  # import your SQLAlchemy model
@@ -40,11 +42,12 @@ class JobFactory(factory.alchemy.SQLAlchemyModelFactory):
 
     id = factory.Sequence(lambda n: n + 1)
     job_type = "episode"
-    source_path = factory.LazyFunction(lambda: fake.file_name(extension="mkv"))
+    source_path = factory.Sequence(lambda n: f"/media/{n}/{fake.file_name(extension='mkv')}")  # unique per job
     output_path = factory.LazyFunction(lambda: fake.file_name(extension="mkv"))
     status = "pending"
     created_at = factory.LazyFunction(lambda: fake.date_time_this_year(tzinfo=datetime.timezone.utc))
     updated_at = factory.LazyFunction(lambda: fake.date_time_this_year(tzinfo=datetime.timezone.utc))
+    schedule_key = factory.LazyAttribute(lambda job: job.created_at.timestamp())  # plain FIFO
 
 class JobValidationRequestFactory(factory.Factory):
     class Meta:
@@ -52,6 +55,14 @@ class JobValidationRequestFactory(factory.Factory):
 
     output_path = factory.LazyFunction(lambda: fake.file_name(extension="mkv"))
 
+def write_matroska(path, payload_bytes: int = 4096) -> str:
+    """A minimal Matroska file: an empty EBML header and a sized Segment of random bytes."""
+    payload = os.urandom(payload_bytes)
+    segment_size = ((1 << 56) | len(payload)).to_bytes(8, "big")  # 8-byte EBML size
+    with open(path, "wb") as f:
+        f.write(b"\x1a\x45\xdf\xa3\x80" + b"\x18\x53\x80\x67" + segment_size + payload)
+    return str(path)
+
 # Radarr webhook payload factories
 
 # ---------- Nested Factories ----------
@@ -217,7 +228,7 @@ class SonarrMediaInfoFactory(factory.Factory):
     height = factory.LazyFunction(lambda: fake.random_element([720, 1080, 2160]))
     width = factory.LazyFunction(lambda: fake.random_element([1280, 1920, 3840]))
     subtitles = factory.LazyFunction(lambda: [])
-    videoCodec = factory.LazyFunction(lambda: fake.random_element(["h264", "h265"]))
+    videoCodec = "h264"  # Always needs a transcode under the default profiles
     videoDynamicRange = factory.LazyFunction(lambda: fake.random_element(["", "HDR"]))
     videoDynamicRangeType = factory.LazyFunction(lambda: fake.random_element(["", "PQ"]))
 
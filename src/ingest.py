@@ -0,0 +1,173 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.JobService import AsyncJobService, JobResponse, JobSpec, ServiceContext, default_context
+from src.workers import job_size_class
+from src.schemas.webhook import AnyRadarrPayload, AnySonarrPayload, is_radarr
+
+def media_key(payload: Union[AnyRadarrPayload, AnySonarrPayload]) -> str:
+    """
+    What an imported file is for: a movie, or a series' episodes. Scoped to the
+    *arr instance, since a 4K and a 1080p instance keep separate copies.
+    """
+    if is_radarr(payload):
+        return f"{payload.instanceName}/movie/{payload.movie.id}"
+    episodes = ",".join(str(episode_id) for episode_id in sorted(episode.id for episode in payload.episodes))
+    return f"{payload.instanceName}/series/{payload.series.id}/episodes/{episodes}"
+
+def idempotency_key(payload: Union[AnyRadarrPayload, AnySonarrPayload]) -> Optional[str]:
+    """
+    downloadId + file id: the same for every delivery of one import, so a
+    retried webhook maps to the job its first delivery queued. None for manual
+    imports, which carry no downloadId.
+    """
+    if not payload.downloadId:
+        return None
+    if is_radarr(payload):
+        return f"{payload.downloadId}/{payload.movieFile.id}"
+    return f"{payload.downloadId}/{payload.episodeFile.id}"
+
+def job_spec_from_payload(
+    payload: Union[AnyRadarrPayload, AnySonarrPayload],
+    priority: int = 0,
+    context: Optional[ServiceContext] = None,
+) -> Optional[JobSpec]:
+    """
+    Map an *arr import webhook onto the job it should queue. Files that already
+    meet their transcode profile are recorded as done, or get no job at all
+    (None) when settings.transcode_skip_action is "ignore".
+    """
+    context = context or default_context()
+    rules, settings = context.rules, context.settings
+    if is_radarr(payload):
+        media_file, job_type, media_id = payload.movieFile, "movie", payload.movie.id
+    else:
+        media_file, job_type, media_id = payload.episodeFile, "episode", payload.series.id
+
+    decision = rules.decide(job_type, media_file.mediaInfo)
+    if not decision.transcode and settings.transcode_skip_action == "ignore":
+        return None
+    return JobSpec(
+        source_path=media_file.path,
+        job_type=job_type,
+        profile=decision.profile,
+        status="pending" if decision.transcode else "done",
+        instance_name=payload.instanceName,
+        size_bytes=media_file.size,
+        priority=priority,
+        encoder=rules.encoder_for(decision.profile),
+        size_class=job_size_class(media_file.size, media_file.mediaInfo.height, settings),
+        media_id=media_id,
+        media_key=media_key(payload),
+        idempotency_key=idempotency_key(payload),
+    )
+
+async def write_group(
+    bind: AsyncEngine, specs: List[JobSpec], context: Optional[ServiceContext] = None,
+) -> List[Tuple[JobResponse, bool]]:
+    """Insert a group in a session of its own, independent of any request."""
+    async with AsyncSession(bind=bind, autoflush=False, expire_on_commit=False) as session:
+        return [
+            (JobResponse.model_validate(job), created)
+            for job, created in await AsyncJobService(session, context).add_jobs(specs)
+        ]
+
+class IngestBuffer:
+    """
+    Group commit for single webhooks.
+
+    The first webhook of a burst schedules a flush task that waits `window`
+    seconds for others to join, then writes the whole group through
+    AsyncJobService.add_jobs and hands every caller its own (job, created) result.
+    Under a burst this turns one commit per webhook into one commit per group;
+    an isolated webhook only pays the window. The flush runs in its own task and
+    session, so a caller that disconnects cannot strand the rest of its group.
+    """
+
+    def __init__(self, window: float, max_batch: int, context: Optional[ServiceContext] = None):
+        self.window = window
+        self.max_batch = max_batch
+        self.context = context
+        self._pending: Dict[asyncio.AbstractEventLoop, list] = {}
+        self._flushes = set()
+
+    async def submit(self, db: AsyncSession, spec: JobSpec) -> Tuple[JobResponse, bool]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(loop, [])
+        pending.append((spec, future))
+
+        if len(pending) == 1:
+            # First in: start the group commit for everything that joins meanwhile
+            flush = loop.create_task(self._flush_after_window(loop, db.bind))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+        return await future
+
+    async def _flush_after_window(self, loop: asyncio.AbstractEventLoop, bind: AsyncEngine) -> None:
+        batch = []
+        try:
+            try:
+                await asyncio.sleep(self.window)
+            finally:
+                # Detach the group even if cancelled, so the next webhook starts a new one
+                batch = self._pending.pop(loop)
+
+            for start in range(0, len(batch), self.max_batch):
+                chunk = batch[start:start + self.max_batch]
+                try:
+                    results = await write_group(bind, [spec for spec, _ in chunk], self.context)
+                except Exception as exc:
+                    for _, future in chunk:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+                for (_, future), result in zip(chunk, results):
+                    # A caller that went away has already cancelled its future
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # Never leave a caller waiting on a group that stopped part way
+            for _, future in batch:
+                future.cancel()
+
+class ReplyCache:
+    """
+    The responses to recent imports by idempotency key, so Radarr/Sonarr
+    retrying a webhook that timed out get the original job back without a DB
+    round trip. Bounded LRU with a TTL; a miss falls back to the
+    idempotency_key stored on the job.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._replies: OrderedDict = OrderedDict()
+
+    def get(self, key: str) -> Optional[JobResponse]:
+        entry = self._replies.get(key)
+        if entry is None:
+            return None
+        expires_at, reply = entry
+        if expires_at < time.monotonic():
+            del self._replies[key]
+            return None
+        self._replies.move_to_end(key)
+        return reply
+
+    def put(self, key: str, reply: JobResponse) -> None:
+        self._replies[key] = (time.monotonic() + self.ttl, reply)
+        self._replies.move_to_end(key)
+        while len(self._replies) > self.max_entries:
+            self._replies.popitem(last=False)
+
+    def clear(self) -> None:
+        self._replies.clear()
+
+    def __len__(self) -> int:
+        return len(self._replies)
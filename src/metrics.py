@@ -0,0 +1,201 @@
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.config import settings
+
+# Under `uvicorn --workers N` set PROMETHEUS_MULTIPROC_DIR (an empty directory,
+# cleared on every restart) before starting: each process then writes its
+# samples there and a scrape of any one of them sums the lot
+
+registry = CollectorRegistry()
+
+REQUEST_LATENCY = Histogram(
+    "transcoder_http_request_duration_seconds",
+    "API request latency by route template",
+    ["method", "route", "status"],
+    registry=registry,
+)
+JOB_TRANSITIONS = Counter(
+    "transcoder_job_transitions_total",
+    "Job status changes; from_status is 'new' for freshly queued jobs",
+    ["from_status", "to_status"],
+    registry=registry,
+)
+DB_QUERY_LATENCY = Histogram(
+    "transcoder_db_query_duration_seconds",
+    "Time spent in the database driver per statement",
+    ["operation"],
+    registry=registry,
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+REQUESTS_ADMITTED = Counter(
+    "transcoder_requests_admitted_total",
+    "Requests let through by admission control, by endpoint class",
+    ["endpoint_class"],
+    registry=registry,
+)
+REQUESTS_SHED = Counter(
+    "transcoder_requests_shed_total",
+    "Requests refused by admission control, by endpoint class and reason",
+    ["endpoint_class", "reason"],
+    registry=registry,
+)
+
+GAUGED_STATUSES = ("pending", "processing", "validating")
+
+# Labelled children are looked up once; .labels() costs more than the observation itself
+
+@lru_cache(maxsize=None)
+def _transition_counter(from_status: str, to_status: str):
+    return JOB_TRANSITIONS.labels(from_status, to_status)
+
+@lru_cache(maxsize=1024)
+def _request_histogram(method: str, route: str, status: int):
+    return REQUEST_LATENCY.labels(method, route, str(status))
+
+@lru_cache(maxsize=None)
+def _admitted_counter(endpoint_class: str):
+    return REQUESTS_ADMITTED.labels(endpoint_class)
+
+@lru_cache(maxsize=None)
+def _shed_counter(endpoint_class: str, reason: str):
+    return REQUESTS_SHED.labels(endpoint_class, reason)
+
+def record_admitted(endpoint_class: str) -> None:
+    _admitted_counter(endpoint_class).inc()
+
+def record_shed(endpoint_class: str, reason: str) -> None:
+    _shed_counter(endpoint_class, reason).inc()
+
+class QueueDepth:
+    """
+    transcoder_jobs, from counts the scrape reads from the database. Whichever
+    process serves the scrape, it reports the same queue.
+    """
+
+    def __init__(self, counts: Dict[str, int]):
+        self.counts = counts
+
+    def collect(self):
+        family = GaugeMetricFamily("transcoder_jobs", "Jobs per live status", labels=["status"])
+        for status in GAUGED_STATUSES:
+            family.add_metric([status], self.counts.get(status, 0))
+        yield family
+
+def record_transitions(moves: Iterable[Tuple[str, str, int]]) -> None:
+    """Count committed status changes, as (from_status, to_status, number of jobs)."""
+    for from_status, to_status, count in moves:
+        if count:
+            _transition_counter(from_status, to_status).inc(count)
+
+def record_transition(from_status: str, to_status: str, count: int = 1) -> None:
+    record_transitions(((from_status, to_status, count),))
+
+def render(queue_counts: Dict[str, int]) -> Tuple[bytes, str]:
+    """The exposition body and its content type, with `queue_counts` as the queue depth."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        processes = CollectorRegistry()
+        MultiProcessCollector(processes)
+    else:
+        processes = registry
+    return generate_latest(processes) + generate_latest(QueueDepth(queue_counts)), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """
+    Times every request into REQUEST_LATENCY, labelled with the matched route
+    template (/job/{job_id}, not /job/42) so label cardinality stays bounded.
+    Plain ASGI rather than BaseHTTPMiddleware, which would add a task per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            _request_histogram(
+                scope["method"], route.path if route is not None else "unmatched", status
+            ).observe(time.perf_counter() - started)
+
+# Query timing from SQLAlchemy's statement-level execute events. The cursor-level
+# events would time the driver call alone, but a listener on them measured
+# about twice as expensive per statement
+
+@lru_cache(maxsize=None)
+def _query_histogram(operation: str):
+    return DB_QUERY_LATENCY.labels(operation)
+
+def _operation(statement) -> str:
+    if getattr(statement, "is_select", False):
+        return "SELECT"
+    if getattr(statement, "is_insert", False):
+        return "INSERT"
+    if getattr(statement, "is_update", False):
+        return "UPDATE"
+    if getattr(statement, "is_delete", False):
+        return "DELETE"
+    return "OTHER"
+
+# A connection runs one statement at a time, so one slot holds its start time;
+# a failed statement never reaches after_execute and is simply overwritten
+
+def _before_execute(conn, statement, multiparams, params, execution_options):
+    conn.info["query_started"] = time.perf_counter()
+
+class RecentLatency:
+    """
+    Moving average of statement latency for admission control (src/admission.py).
+    Each statement moves it by `weight`; while nothing runs it fades with
+    `half_life`, so a DB that went quiet after a stall does not look slow forever.
+    """
+
+    def __init__(self, half_life: float, weight: float = 0.05):
+        self.half_life = half_life
+        self.weight = weight
+        self.value = 0.0
+        self.updated = time.perf_counter()
+
+    def observe(self, seconds: float, now: float) -> None:
+        self.value += self.weight * (seconds - self.value)
+        self.updated = now
+
+    def reset(self) -> None:
+        self.value = 0.0
+
+    def current(self, now: Optional[float] = None) -> float:
+        idle = (time.perf_counter() if now is None else now) - self.updated
+        return self.value * 0.5 ** (max(idle, 0.0) / self.half_life)
+
+db_latency = RecentLatency(settings.admission_db_latency_half_life_seconds)
+
+def _after_execute(conn, statement, multiparams, params, execution_options, result):
+    now = time.perf_counter()
+    elapsed = now - conn.info["query_started"]
+    _query_histogram(_operation(statement)).observe(elapsed)
+    db_latency.observe(elapsed, now)
+
+def instrument_queries(engine: Engine) -> None:
+    """Time every statement `engine` sends into DB_QUERY_LATENCY."""
+    event.listen(engine, "before_execute", _before_execute)
+    event.listen(engine, "after_execute", _after_execute)
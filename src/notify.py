@@ -0,0 +1,241 @@
+import asyncio
+import datetime
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import Settings, settings
+from src.db import Job, Notification, utcnow
+
+logger = logging.getLogger(__name__)
+
+class NotifyTarget(ABC):
+    """
+    One integration told about finished transcodes. Each job maps to a key
+    naming what to refresh; completions with the same key are coalesced into
+    one call.
+    """
+
+    name: str
+
+    def __init__(self, url: str, api_key: str, debounce_seconds: float):
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        self.debounce = datetime.timedelta(seconds=debounce_seconds)
+
+    @abstractmethod
+    def key_for(self, job: Job) -> Optional[str]:
+        """What to refresh for a finished job, or None if this target does not care."""
+
+    def batches(self, keys: List[str]) -> List[List[str]]:
+        """How due keys are split into calls; one call per key by default."""
+        return [[key] for key in keys]
+
+    @abstractmethod
+    async def send(self, http: httpx.AsyncClient, keys: List[str]) -> None:
+        """Make one call covering `keys`. Raises on failure."""
+
+class JellyfinTarget(NotifyTarget):
+    """Reports changed folders to Jellyfin, which rescans only those paths."""
+
+    name = "jellyfin"
+
+    def key_for(self, job: Job) -> Optional[str]:
+        return os.path.dirname(job.output_path) if job.output_path else None
+
+    def batches(self, keys: List[str]) -> List[List[str]]:
+        return [keys]  # One request takes any number of paths
+
+    async def send(self, http: httpx.AsyncClient, keys: List[str]) -> None:
+        response = await http.post(
+            f"{self.url}/Library/Media/Updated",
+            headers={"X-Emby-Token": self.api_key},
+            json={"Updates": [{"Path": key, "UpdateType": "Modified"} for key in keys]},
+        )
+        response.raise_for_status()
+
+class ArrTarget(NotifyTarget):
+    """Asks Sonarr or Radarr to rescan a series or movie through its command API."""
+
+    job_type: str
+    command: str
+    id_field: str
+
+    def key_for(self, job: Job) -> Optional[str]:
+        if job.job_type != self.job_type or job.media_id is None:
+            return None
+        return str(job.media_id)
+
+    async def send(self, http: httpx.AsyncClient, keys: List[str]) -> None:
+        for key in keys:
+            response = await http.post(
+                f"{self.url}/api/v3/command",
+                headers={"X-Api-Key": self.api_key},
+                json={"name": self.command, self.id_field: int(key)},
+            )
+            response.raise_for_status()
+
+class SonarrTarget(ArrTarget):
+    name, job_type, command, id_field = "sonarr", "episode", "RescanSeries", "seriesId"
+
+class RadarrTarget(ArrTarget):
+    name, job_type, command, id_field = "radarr", "movie", "RescanMovie", "movieId"
+
+def targets_from_settings(settings: Settings = settings) -> Dict[str, NotifyTarget]:
+    """The targets with a configured URL, by name."""
+    configured = [
+        (JellyfinTarget, settings.jellyfin_url, settings.jellyfin_api_key, settings.jellyfin_debounce_seconds),
+        (SonarrTarget, settings.sonarr_url, settings.sonarr_api_key, settings.sonarr_debounce_seconds),
+        (RadarrTarget, settings.radarr_url, settings.radarr_api_key, settings.radarr_debounce_seconds),
+    ]
+    return {cls.name: cls(url, api_key, debounce) for cls, url, api_key, debounce in configured if url}
+
+def outbox_rows(job: Job, targets: Dict[str, NotifyTarget]) -> List[Notification]:
+    """Notifications owed for a job that just finished; add them in the same transaction."""
+    now = utcnow()
+    rows = []
+    for target in targets.values():
+        key = target.key_for(job)
+        if key is not None:
+            rows.append(Notification(target=target.name, key=key, job_id=job.id, created_at=now, next_attempt_at=now))
+    return rows
+
+def retry_delay(attempts: int, settings: Settings = settings) -> datetime.timedelta:
+    """Exponential backoff after the `attempts`-th failed call."""
+    return datetime.timedelta(seconds=min(
+        settings.notify_retry_base_seconds * 2 ** (attempts - 1),
+        settings.notify_retry_max_seconds,
+    ))
+
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    # SQLite hands DateTime columns back naive
+    return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+
+class Outbox:
+    """
+    Delivers pending notifications. Rows are grouped by (target, key); a group
+    is due once its newest row is older than the target's debounce window, or
+    its oldest has waited max_delay, so a season backfill turns into one rescan
+    per series and folder rather than one per episode.
+
+    A sender claims a group's rows by pushing next_attempt_at past the call
+    timeout, so several API processes never send the same group twice. On
+    success the rows are deleted; on failure they are pushed back by the
+    backoff, and marked dead after max_attempts.
+    """
+
+    def __init__(self, http: httpx.AsyncClient, targets: Dict[str, NotifyTarget], settings: Settings = settings):
+        self.http = http
+        self.targets = targets
+        self.settings = settings
+        self.max_delay = datetime.timedelta(seconds=settings.notify_max_delay_seconds)
+        self.claim_for = datetime.timedelta(seconds=2 * settings.notify_timeout_seconds)
+
+    async def due_groups(self, session: AsyncSession, now: datetime.datetime) -> Dict[str, list]:
+        """{target: [(key, newest id, attempts so far)]} for the groups due at `now`."""
+        groups = await session.execute(
+            select(
+                Notification.target,
+                Notification.key,
+                func.min(Notification.created_at),
+                func.max(Notification.created_at),
+                func.max(Notification.id),
+                func.max(Notification.attempts),
+            )
+            .where(Notification.status == "pending", Notification.next_attempt_at <= now)
+            .group_by(Notification.target, Notification.key)
+        )
+        due = {}
+        for target_name, key, oldest, newest, last_id, attempts in groups:
+            target = self.targets.get(target_name)
+            if target is None:
+                continue
+            if as_utc(newest) + target.debounce <= now or as_utc(oldest) + self.max_delay <= now:
+                due.setdefault(target_name, []).append((key, last_id, attempts))
+        return due
+
+    async def deliver_due(self, session: AsyncSession, now: Optional[datetime.datetime] = None) -> int:
+        """Send every due group. Returns the number of calls that succeeded."""
+        now = now or utcnow()
+        sent = 0
+        for target_name, groups in (await self.due_groups(session, now)).items():
+            target = self.targets[target_name]
+            by_key = {key: (last_id, attempts) for key, last_id, attempts in groups}
+            for keys in target.batches(list(by_key)):
+                sent += await self._deliver(session, target, {key: by_key[key] for key in keys}, now)
+        return sent
+
+    async def _deliver(self, session: AsyncSession, target: NotifyTarget, groups: dict, now: datetime.datetime) -> int:
+        claimed = {}
+        for key, (last_id, _) in groups.items():
+            ids = (await session.execute(
+                update(Notification)
+                .where(
+                    Notification.target == target.name,
+                    Notification.key == key,
+                    Notification.id <= last_id,
+                    Notification.status == "pending",
+                    Notification.next_attempt_at <= now,
+                )
+                .values(next_attempt_at=now + self.claim_for)
+                .returning(Notification.id)
+                .execution_options(synchronize_session=False)
+            )).scalars().all()
+            if ids:
+                claimed[key] = ids
+        await session.commit()
+        if not claimed:
+            return 0  # Another sender got there first
+
+        ids = [row_id for row_ids in claimed.values() for row_id in row_ids]
+        try:
+            await target.send(self.http, list(claimed))
+        except Exception as exc:
+            attempts = max(groups[key][1] for key in claimed) + 1
+            dead = attempts >= self.settings.notify_max_attempts
+            logger.warning("Notifying %s of %s failed (attempt %d): %s", target.name, list(claimed), attempts, exc)
+            await session.execute(
+                update(Notification)
+                .where(Notification.id.in_(ids))
+                .values(
+                    attempts=attempts,
+                    status="dead" if dead else "pending",
+                    next_attempt_at=now + retry_delay(attempts, self.settings),
+                    last_error=str(exc)[:500],
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return 0
+
+        await session.execute(
+            delete(Notification).where(Notification.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return 1
+
+def pooled_http_client(settings: Settings = settings) -> httpx.AsyncClient:
+    """One keep-alive connection pool shared by every outbound notification."""
+    return httpx.AsyncClient(
+        timeout=settings.notify_timeout_seconds,
+        limits=httpx.Limits(
+            max_connections=settings.notify_max_connections,
+            max_keepalive_connections=settings.notify_max_connections,
+        ),
+    )
+
+async def run_outbox(session_factory, outbox: Outbox, interval: Optional[float] = None):
+    """Periodically deliver due notifications."""
+    interval = interval or settings.notify_poll_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as session:
+                await outbox.deliver_due(session)
+        except Exception:
+            logger.exception("Notification pass failed")
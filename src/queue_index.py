@@ -0,0 +1,199 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import threading
+from typing import Collection, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from src.config import settings
+from src.db import Job
+from src.workers import accepts
+
+logger = logging.getLogger(__name__)
+
+class PendingEntry(NamedTuple):
+    """What dispatch needs to know about a pending job."""
+    schedule_key: float
+    id: int
+    size_class: str
+    encoder: Optional[str]
+    size_bytes: Optional[int]
+
+    @classmethod
+    def of(cls, job: Job) -> "PendingEntry":
+        return cls(job.schedule_key, job.id, job.size_class, job.encoder, job.size_bytes)
+
+# Columns in PendingEntry order, for queries and RETURNING clauses
+PENDING_ENTRY_COLUMNS = (Job.schedule_key, Job.id, Job.size_class, Job.encoder, Job.size_bytes)
+
+def pending_entries_query():
+    """Every pending job, to (re)build the index. Served by ix_jobs_status_schedule_key."""
+    return select(*PENDING_ENTRY_COLUMNS).where(Job.status == "pending")
+
+class PendingIndex:
+    """
+    In-process copy of the pending queue: per size class and encoder,
+    (schedule_key, id) pairs in claim order. /job/next picks its jobs here and
+    claims them by id with a conditional UPDATE, instead of searching the jobs
+    table. Splitting by encoder means a worker never walks past jobs it lacks
+    the encoder for.
+
+    The DB stays the source of truth. An entry is only a hint: the claim still
+    checks status = 'pending', and an entry whose job was claimed elsewhere is
+    dropped when its claim fails. Jobs this process has not seen (queued by
+    another API process) are still claimed by the DB query once the index has
+    nothing for a worker, and are picked up by the next reconcile.
+
+    The index is only consulted once warmed with load(); until then every
+    claim goes to the DB. The service layer keeps it current on insert,
+    claim, reclaim, reprioritisation and status changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self._entries: Dict[int, PendingEntry] = {}
+        self._queues: Dict[Tuple[str, Optional[str]], List[Tuple[float, int]]] = {}
+        # Bumped on every change; load() uses it to keep changes made while
+        # its snapshot was being read
+        self._version = 0
+        self._changed_at: Dict[int, int] = {}
+        # Jobs discarded since the last load, so a late add() cannot revive them
+        self._discarded: Set[int] = set()
+
+    @property
+    def version(self) -> int:
+        """Take before reading a snapshot for load()."""
+        return self._version
+
+    def load(self, rows: Iterable[tuple], since_version: int) -> None:
+        """
+        Reconcile with a snapshot of the pending jobs read after `since_version`.
+        Jobs added or removed since then already reflect newer state than the
+        snapshot and are left alone.
+        """
+        with self._lock:
+            newer = {job_id for job_id, version in self._changed_at.items() if version > since_version}
+            snapshot = {}
+            for row in rows:
+                entry = PendingEntry(*row)
+                if entry.id not in newer:
+                    snapshot[entry.id] = entry
+            for job_id, entry in list(self._entries.items()):
+                if job_id not in newer and job_id not in snapshot:
+                    self._remove(job_id)
+            for entry in snapshot.values():
+                if self._entries.get(entry.id) != entry:
+                    self._put(entry)
+            self._changed_at = {job_id: self._changed_at[job_id] for job_id in newer}
+            self._discarded &= newer
+            self.ready = True
+
+    def reset(self) -> None:
+        with self._lock:
+            self.ready = False
+            self._entries, self._queues, self._changed_at, self._discarded = {}, {}, {}, set()
+
+    def add(self, entries: Iterable[tuple]) -> None:
+        """
+        Newly inserted pending jobs. The insert is committed before it gets
+        here, so another request may already have claimed a job; those stay out.
+        """
+        self._update(entries, revive=False)
+
+    def put(self, entries: Iterable[tuple]) -> None:
+        """Jobs that are pending again (reclaimed) or were re-keyed while pending."""
+        self._update(entries, revive=True)
+
+    def _update(self, entries: Iterable[tuple], revive: bool) -> None:
+        if not self.ready:
+            return
+        with self._lock:
+            self._version += 1
+            for row in entries:
+                entry = PendingEntry(*row)
+                if entry.id in self._discarded:
+                    if not revive:
+                        continue
+                    self._discarded.discard(entry.id)
+                self._put(entry)
+                self._changed_at[entry.id] = self._version
+
+    def discard(self, job_ids: Iterable[int]) -> None:
+        """Jobs that are no longer pending, or were never claimable."""
+        if not self.ready:
+            return
+        with self._lock:
+            self._version += 1
+            for job_id in job_ids:
+                self._remove(job_id)
+                self._changed_at[job_id] = self._version
+                self._discarded.add(job_id)
+
+    def candidates(self, count: int, worker=None, skip: Collection[int] = (), order: Collection[tuple] = ()) -> List[int]:
+        """
+        Ids of up to `count` jobs `worker` would be handed, in claim order: any
+        job for an unregistered worker, otherwise the steps of its claim_order
+        (`order`), skipping jobs it cannot run and the ids in `skip`.
+        """
+        with self._lock:
+            if worker is None:
+                queue = (job_id for _, job_id in heapq.merge(*self._queues.values()) if job_id not in skip)
+                return list(itertools.islice(queue, count))
+
+            picked = []
+            for size_class, max_key in order:
+                queues = [
+                    queue for (queue_class, encoder), queue in self._queues.items()
+                    if queue_class == size_class and (encoder is None or encoder in worker.encoders)
+                ]
+                for key, job_id in heapq.merge(*queues):
+                    if len(picked) >= count:
+                        return picked
+                    if max_key is not None and key > max_key:
+                        break
+                    entry = self._entries[job_id]
+                    if job_id not in skip and job_id not in picked and accepts(worker, entry.size_bytes, entry.encoder):
+                        picked.append(job_id)
+            return picked
+
+    def job_ids(self) -> set:
+        with self._lock:
+            return set(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _put(self, entry: PendingEntry) -> None:
+        self._remove(entry.id)
+        self._entries[entry.id] = entry
+        bisect.insort(self._queues.setdefault((entry.size_class, entry.encoder), []), (entry.schedule_key, entry.id))
+
+    def _remove(self, job_id: int) -> None:
+        entry = self._entries.pop(job_id, None)
+        if entry is None:
+            return
+        queue = self._queues[entry.size_class, entry.encoder]
+        del queue[bisect.bisect_left(queue, (entry.schedule_key, entry.id))]
+
+pending_index = PendingIndex()
+
+async def reconcile_once(session_factory) -> None:
+    """Rebuild the index from the jobs table, keeping changes made meanwhile."""
+    since_version = pending_index.version
+    async with session_factory() as session:
+        rows = (await session.execute(pending_entries_query())).all()
+    pending_index.load(rows, since_version)
+
+async def run_index_reconciler(session_factory, interval: Optional[float] = None):
+    """Periodically pick up jobs queued or claimed by other API processes."""
+    interval = interval or settings.queue_index_reconcile_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_once(session_factory)
+        except Exception:
+            logger.exception("Queue index reconcile failed")
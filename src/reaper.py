@@ -0,0 +1,35 @@
+import asyncio
+import logging
+from typing import Optional
+
+from src.config import settings
+from src.dispatch import job_notifier
+from src.JobService import AsyncJobService, ServiceContext
+
+logger = logging.getLogger(__name__)
+
+async def reclaim_once(
+    session_factory, max_attempts: Optional[int] = None, context: Optional[ServiceContext] = None,
+) -> int:
+    """Run a single reaper pass in its own session."""
+    async with session_factory() as session:
+        return await AsyncJobService(session, context).reclaim_expired_jobs(max_attempts)
+
+async def run_lease_reaper(
+    session_factory,
+    interval: Optional[float] = None,
+    max_attempts: Optional[int] = None,
+    context: Optional[ServiceContext] = None,
+):
+    """Periodically hand jobs from dead workers back to the queue."""
+    interval = interval or settings.reaper_interval_seconds
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reclaimed = await reclaim_once(session_factory, max_attempts, context)
+        except Exception:
+            logger.exception("Lease reaper pass failed")
+            continue
+        if reclaimed:
+            logger.info("Reclaimed %d jobs with expired leases", reclaimed)
+            job_notifier.notify()
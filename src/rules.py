@@ -0,0 +1,161 @@
+import json
+from functools import lru_cache
+from typing import TYPE_CHECKING, FrozenSet, Iterable, NamedTuple, Optional, Union
+
+from pydantic import BaseModel, field_validator
+
+if TYPE_CHECKING:
+    from src.schemas.radarr import RadarrMediaInfo
+    from src.schemas.sonarr import SonarrMediaInfo
+
+# Radarr/Sonarr report codecs by encoder or marketing name; rules compare formats
+CODEC_ALIASES = {
+    "x265": "hevc",
+    "h265": "hevc",
+    "h.265": "hevc",
+    "x264": "h264",
+    "avc": "h264",
+    "h.264": "h264",
+    "ac-3": "ac3",
+    "dd": "ac3",
+    "e-ac-3": "eac3",
+    "ddp": "eac3",
+    "dd+": "eac3",
+}
+
+def normalize_codec(codec: str) -> str:
+    codec = codec.strip().lower()
+    return CODEC_ALIASES.get(codec, codec)
+
+class MediaKey(NamedTuple):
+    """The parts of a file's mediaInfo the rules look at, normalised."""
+    job_type: str
+    video_codec: str
+    audio_codec: str
+    height: int
+    width: int
+    audio_channels: float
+    hdr: bool
+
+def media_key(job_type: str, media: Union["RadarrMediaInfo", "SonarrMediaInfo"]) -> MediaKey:
+    return MediaKey(
+        job_type=job_type,
+        video_codec=normalize_codec(media.videoCodec),
+        audio_codec=normalize_codec(media.audioCodec),
+        height=media.height,
+        width=media.width,
+        audio_channels=media.audioChannels,
+        hdr=bool(media.videoDynamicRange),
+    )
+
+class TranscodeProfile(BaseModel):
+    """
+    A target format. The profile applies to files of `job_types` (any type if
+    empty) that are at least `min_height` tall. A file it applies to needs no
+    transcode when it already meets every target; empty codec sets accept any
+    codec and unset limits are not checked.
+    """
+    name: str
+    job_types: FrozenSet[str] = frozenset()
+    min_height: int = 0
+
+    # Codec the transcode produces; only workers that can encode it get the job
+    encoder: Optional[str] = None
+
+    video_codecs: FrozenSet[str] = frozenset()
+    audio_codecs: FrozenSet[str] = frozenset()
+    max_height: Optional[int] = None
+    max_width: Optional[int] = None
+    max_audio_channels: Optional[float] = None
+    allow_hdr: bool = True
+
+    model_config = {
+        "frozen": True
+    }
+
+    @field_validator("video_codecs", "audio_codecs", mode="before")
+    @classmethod
+    def _normalize_codecs(cls, codecs: Iterable[str]):
+        return frozenset(normalize_codec(codec) for codec in codecs)
+
+    @field_validator("encoder")
+    @classmethod
+    def _normalize_encoder(cls, encoder: Optional[str]):
+        return encoder and normalize_codec(encoder)
+
+    def applies_to(self, media: MediaKey) -> bool:
+        return (
+            (not self.job_types or media.job_type in self.job_types)
+            and media.height >= self.min_height
+        )
+
+    def is_met_by(self, media: MediaKey) -> bool:
+        return (
+            (not self.video_codecs or media.video_codec in self.video_codecs)
+            and (not self.audio_codecs or media.audio_codec in self.audio_codecs)
+            and (self.max_height is None or media.height <= self.max_height)
+            and (self.max_width is None or media.width <= self.max_width)
+            and (self.max_audio_channels is None or media.audio_channels <= self.max_audio_channels)
+            and (self.allow_hdr or not media.hdr)
+        )
+
+class TranscodeDecision(NamedTuple):
+    profile: Optional[str]
+    transcode: bool
+
+class RuleEngine:
+    """
+    Decides, from a webhook's mediaInfo, which profile a file targets and
+    whether it needs transcoding at all. The first profile that applies wins;
+    a file no profile applies to is queued as before, without a profile.
+
+    Profiles are validated and normalised once when the engine is built, and
+    decisions are cached per distinct mediaInfo, so the webhook path only pays
+    for a tuple lookup in the common case.
+    """
+
+    def __init__(self, profiles: Iterable[TranscodeProfile]):
+        self.profiles = tuple(profiles)
+        self.encoders = {profile.name: profile.encoder for profile in self.profiles}
+        self._evaluate = lru_cache(maxsize=4096)(self._evaluate_uncached)
+
+    def decide(self, job_type: str, media: Union["RadarrMediaInfo", "SonarrMediaInfo"]) -> TranscodeDecision:
+        return self._evaluate(media_key(job_type, media))
+
+    def _evaluate_uncached(self, media: MediaKey) -> TranscodeDecision:
+        for profile in self.profiles:
+            if profile.applies_to(media):
+                return TranscodeDecision(profile.name, not profile.is_met_by(media))
+        return TranscodeDecision(None, True)
+
+    def encoder_for(self, profile: Optional[str]) -> Optional[str]:
+        return self.encoders.get(profile)
+
+DEFAULT_PROFILES = [
+    # Keep 4K sources 4K (HDR included), only the video needs to be HEVC
+    {
+        "name": "uhd-hevc",
+        "encoder": "hevc",
+        "min_height": 1440,
+        "video_codecs": ["hevc"],
+        "max_height": 2160,
+    },
+    {
+        "name": "hd-hevc",
+        "encoder": "hevc",
+        "video_codecs": ["hevc"],
+        "audio_codecs": ["aac", "ac3", "eac3"],
+        "max_height": 1080,
+        "max_audio_channels": 6,
+        "allow_hdr": False,
+    },
+]
+
+def load_rule_engine(profiles_path: str = "") -> RuleEngine:
+    """Build the engine from a JSON list of profiles at `profiles_path`, or the defaults."""
+    if profiles_path:
+        with open(profiles_path) as profiles_file:
+            raw_profiles = json.load(profiles_file)
+    else:
+        raw_profiles = DEFAULT_PROFILES
+    return RuleEngine(TranscodeProfile.model_validate(profile) for profile in raw_profiles)
@@ -1,2 +1,16 @@
-from .radarr import *
-from .sonarr import *
\ No newline at end of file
+import importlib
+
+# The full *arr payload models are large; they load the first time a name from
+# them is looked up here, so importing src.schemas (or src.schemas.webhook)
+# stays cheap
+
+_SUBMODULES = ("radarr", "sonarr")
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    for submodule in _SUBMODULES:
+        module = importlib.import_module(f"{__name__}.{submodule}")
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
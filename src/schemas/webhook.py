@@ -0,0 +1,83 @@
+import importlib
+from typing import TYPE_CHECKING, ClassVar, List, Optional, Union
+
+from pydantic import BaseModel, PrivateAttr
+
+if TYPE_CHECKING:
+    from .radarr import RadarrWebhookPayload
+    from .sonarr import SonarrWebhookPayload
+
+# Just the fields the pipeline reads from an import webhook. Validating these
+# from the raw bytes skips everything else in the payload (images, episodes,
+# custom formats, overviews); the complete payload stays available via full(),
+# and its models are only imported then.
+
+class WebhookEvent(BaseModel):
+    eventType: str
+
+class MediaInfoFields(BaseModel):
+    audioChannels: float
+    audioCodec: str
+    height: int
+    width: int
+    videoCodec: str
+    videoDynamicRange: str
+
+class MediaFileFields(BaseModel):
+    id: int
+    path: str
+    size: int
+    mediaInfo: MediaInfoFields
+
+class MediaRef(BaseModel):
+    id: int
+
+class WebhookImport(BaseModel):
+    eventType: str
+    instanceName: str
+    downloadId: Optional[str] = None
+
+    _raw: bytes = PrivateAttr(b"")
+    _full = PrivateAttr(None)
+
+    full_model_path: ClassVar[str]   # "module:Model" of the complete payload
+
+    @classmethod
+    def from_json(cls, body: bytes):
+        payload = cls.model_validate_json(body)
+        payload._raw = body
+        return payload
+
+    def full(self):
+        """The complete *arr payload, validated from the raw bytes on first use."""
+        if self._full is None:
+            self._full = full_model(self.full_model_path).model_validate_json(self._raw)
+        return self._full
+
+def full_model(path: str):
+    module, name = path.split(":")
+    return getattr(importlib.import_module(module), name)
+
+class RadarrImport(WebhookImport):
+    movie: MediaRef
+    movieFile: MediaFileFields
+
+    full_model_path = "src.schemas.radarr:RadarrWebhookPayload"
+
+class SonarrImport(WebhookImport):
+    series: MediaRef
+    episodes: List[MediaRef]
+    episodeFile: MediaFileFields
+
+    full_model_path = "src.schemas.sonarr:SonarrWebhookPayload"
+
+def webhook_event(body: bytes) -> str:
+    """eventType alone, so Test/Grab/Rename events can be answered without validating the rest."""
+    return WebhookEvent.model_validate_json(body).eventType
+
+def is_radarr(payload) -> bool:
+    """Whether a slim or full payload is Radarr's; only Radarr's carry a movie."""
+    return hasattr(payload, "movie")
+
+AnyRadarrPayload = Union[RadarrImport, "RadarrWebhookPayload"]
+AnySonarrPayload = Union[SonarrImport, "SonarrWebhookPayload"]
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import subprocess
+from functools import partial
+from typing import Callable, List, NamedTuple, Optional
+
+from src.config import Settings, settings
+
+class ValidationResult(NamedTuple):
+    errors: List[str]
+    checksum: Optional[str] = None   # sha256 of the output, when it could be read
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+def file_checksum(path: str, chunk_size: Optional[int] = None) -> str:
+    """sha256 of a file, read in fixed-size chunks (settings.validation_chunk_bytes) into one reused buffer."""
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size or settings.validation_chunk_bytes)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while read := f.readinto(buffer):
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+# Container checks only read element/box headers, never the media itself
+
+MATROSKA_MAGIC = b"\x1a\x45\xdf\xa3"
+MATROSKA_SEGMENT = 0x18538067
+
+def _read_vint(f, keep_marker: bool):
+    """An EBML variable-length integer: (value, all value bits set), or None at EOF."""
+    first = f.read(1)
+    if not first:
+        return None
+    length = 9 - first[0].bit_length()
+    if length > 8:
+        return None
+    rest = f.read(length - 1)
+    if len(rest) != length - 1:
+        return None
+    value = first[0] if keep_marker else first[0] & (0xFF >> length)
+    for byte in rest:
+        value = (value << 8) | byte
+    return value, value == (1 << (7 * length)) - 1
+
+def matroska_errors(f, size: int) -> List[str]:
+    """The EBML header and Segment must be present and the Segment must end at EOF."""
+    f.seek(0)
+    header_id, header_size = _read_vint(f, True), _read_vint(f, False)
+    if header_id is None or header_size is None:
+        return ["Matroska EBML header is truncated"]
+    f.seek(header_size[0], os.SEEK_CUR)
+
+    segment_id, segment_size = _read_vint(f, True), _read_vint(f, False)
+    if segment_id is None or segment_size is None or segment_id[0] != MATROSKA_SEGMENT:
+        return ["Matroska Segment element is missing"]
+    value, unknown = segment_size
+    if unknown:
+        return []  # Live-written file without a final size; nothing to compare
+    if f.tell() + value != size:
+        return [f"Matroska Segment ends at byte {f.tell() + value}, file has {size}"]
+    return []
+
+def mp4_errors(f, size: int) -> List[str]:
+    """Top-level boxes must tile the file exactly and include a moov box."""
+    f.seek(0)
+    offset, boxes = 0, set()
+    while offset < size:
+        header = f.read(8)
+        if len(header) < 8:
+            return [f"MP4 box header at byte {offset} is truncated"]
+        box_size, box_type = struct.unpack(">I4s", header)
+        if box_size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return [f"MP4 box header at byte {offset} is truncated"]
+            box_size = struct.unpack(">Q", large)[0]
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < 8:
+            return [f"MP4 box at byte {offset} has invalid size {box_size}"]
+        boxes.add(box_type)
+        offset += box_size
+        f.seek(offset)
+    if offset != size:
+        return [f"MP4 box runs to byte {offset}, file has {size}"]
+    if b"moov" not in boxes:
+        return ["MP4 has no moov box"]
+    return []
+
+def container_errors(path: str) -> List[str]:
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(12)
+        if head.startswith(MATROSKA_MAGIC):
+            return matroska_errors(f, size)
+        if head[4:8] == b"ftyp":
+            return mp4_errors(f, size)
+    return ["Unrecognised container (expected Matroska/WebM or MP4)"]
+
+def ffprobe_duration(path: str, ffprobe: Optional[str] = None) -> Optional[float]:
+    """Container duration in seconds, or None when ffprobe is unavailable or fails."""
+    ffprobe = ffprobe or settings.ffprobe_path
+    if shutil.which(ffprobe) is None:
+        return None
+    result = subprocess.run(
+        [ffprobe, "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    try:
+        return float(json.loads(result.stdout)["format"]["duration"])
+    except (KeyError, ValueError):
+        return None
+
+class JobValidator:
+    """
+    Checks a worker's output before it replaces the library file: it must exist,
+    its size and duration must be in tolerance of the source, and its container
+    must be intact. The sha256 of the output is computed in the same pass.
+
+    Validation reads whole files, so the API runs it on its validation_pool
+    (see ServiceContext) rather than on the event loop.
+    """
+
+    def __init__(
+        self,
+        settings: Settings = settings,
+        probe_duration: Optional[Callable[[str], Optional[float]]] = None,
+    ):
+        self.settings = settings
+        self.probe_duration = probe_duration or partial(ffprobe_duration, ffprobe=settings.ffprobe_path)
+
+    def validate(self, source_path: str, output_path: str) -> ValidationResult:
+        if not os.path.isfile(output_path):
+            return ValidationResult([f"Output {output_path} does not exist"])
+
+        errors = container_errors(output_path)
+        if os.path.isfile(source_path):
+            errors += self._size_errors(source_path, output_path)
+            errors += self._duration_errors(source_path, output_path)
+        return ValidationResult(errors, file_checksum(output_path, self.settings.validation_chunk_bytes))
+
+    def _size_errors(self, source_path: str, output_path: str) -> List[str]:
+        source_size = os.path.getsize(source_path)
+        if not source_size:
+            return []
+        ratio = os.path.getsize(output_path) / source_size
+        if not self.settings.validation_min_size_ratio <= ratio <= self.settings.validation_max_size_ratio:
+            return [f"Output is {ratio:.1%} of the source size"]
+        return []
+
+    def _duration_errors(self, source_path: str, output_path: str) -> List[str]:
+        source_duration = self.probe_duration(source_path)
+        output_duration = self.probe_duration(output_path)
+        if source_duration is None or output_duration is None:
+            return []
+        allowed = max(1.0, source_duration * self.settings.validation_duration_tolerance)
+        if abs(output_duration - source_duration) > allowed:
+            return [f"Output runs {output_duration:.1f}s, source {source_duration:.1f}s"]
+        return []
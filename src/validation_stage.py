@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from typing import Optional
+
+from src.config import settings
+from src.dispatch import result_notifier, validation_notifier
+from src.JobService import AsyncJobService, ServiceContext
+
+logger = logging.getLogger(__name__)
+
+async def validate_once(session_factory, context: Optional[ServiceContext] = None):
+    """Claim and validate one submitted output. Returns the finished job, or None if none was waiting."""
+    async with session_factory() as session:
+        service = AsyncJobService(session, context)
+        jobs = await service.claim_validations(1)
+        if not jobs:
+            return None
+        job = await service.finish_validation(jobs[0])
+    result_notifier.notify()
+    return job
+
+async def run_validator(session_factory, poll_interval: float, context: Optional[ServiceContext] = None):
+    """Drain validating jobs one at a time, sleeping until the next submission when idle."""
+    while True:
+        # Watch before claiming so an output submitted mid-claim still wakes us
+        submitted = validation_notifier.watch()
+        try:
+            job = await validate_once(session_factory, context)
+        except Exception:
+            logger.exception("Validation pass failed")
+            job = None
+
+        if job is None:
+            await validation_notifier.wait(submitted, poll_interval)
+            continue
+        logger.info("Job %d is %s", job.id, job.status)
+
+async def run_validation_stage(
+    session_factory,
+    concurrency: Optional[int] = None,
+    poll_interval: Optional[float] = None,
+    context: Optional[ServiceContext] = None,
+):
+    """
+    Run `concurrency` validators side by side. Each hands its file I/O to the
+    context's validation_pool, so they validate that many outputs at once.
+    """
+    concurrency = concurrency or settings.validation_workers
+    poll_interval = poll_interval or settings.validation_poll_seconds
+    await asyncio.gather(*(run_validator(session_factory, poll_interval, context) for _ in range(concurrency)))
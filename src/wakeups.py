@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import socket
+import tempfile
+from typing import Iterable, Optional
+
+from sqlalchemy.engine import make_url
+
+from src.config import Settings, settings
+from src.dispatch import JobNotifier
+
+logger = logging.getLogger(__name__)
+
+def wakeup_dir(settings: Settings = settings) -> str:
+    """
+    Where the API processes serving one database meet: settings.wakeup_dir, or
+    a directory under the system temp dir named after the database URL.
+    """
+    if settings.wakeup_dir:
+        return settings.wakeup_dir
+    url = make_url(settings.database_url)
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        key = os.path.abspath(url.database)
+    else:
+        key = url.render_as_string(hide_password=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"transcoder-wakeups-{digest}")
+
+class WakeupBus:
+    """
+    Fans notifier wakeups out to the other API processes on the same host.
+
+    Each process binds a Unix datagram socket named after its pid in a shared
+    directory. A notification sends the notifier's one-byte channel to every
+    other socket there; the receiving process wakes its own waiters, which
+    re-run their claim against the DB, so a dropped datagram only costs the
+    latency of a long-poll timeout. Sockets left by dead processes are removed
+    the first time a send to them is refused.
+    """
+
+    def __init__(self, directory: str, notifiers: Iterable[JobNotifier], name: Optional[str] = None):
+        self.directory = directory
+        self.notifiers = {notifier.channel: notifier for notifier in notifiers}
+        self.path = os.path.join(directory, f"{name or os.getpid()}.sock")
+        self._sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self) -> None:
+        """Bind this process's socket, read it on the running loop and attach to the notifiers."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)  # Left by an earlier process with the same pid
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(self.path)
+        sock.setblocking(False)
+        self._sock = sock
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._receive)
+        for notifier in self.notifiers.values():
+            notifier.relay = self
+
+    def stop(self) -> None:
+        for notifier in self.notifiers.values():
+            if notifier.relay is self:
+                notifier.relay = None
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    def peers(self) -> list:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return [
+            os.path.join(self.directory, name)
+            for name in names
+            if name.endswith(".sock") and os.path.join(self.directory, name) != self.path
+        ]
+
+    def publish(self, channel: bytes) -> None:
+        """Tell every other process to wake `channel`. Safe to call from any thread."""
+        sock = self._sock
+        if sock is None:
+            return
+        for peer in self.peers():
+            try:
+                sock.sendto(channel, peer)
+            except BlockingIOError:
+                pass  # Its buffer is full of unread wakeups already
+            except ConnectionRefusedError:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(peer)  # Nobody is bound to it any more
+            except OSError as exc:
+                logger.debug("Wakeup to %s failed: %s", peer, exc)
+
+    def _receive(self) -> None:
+        channels = set()
+        while True:
+            try:
+                channels.update(self._sock.recv(64))
+            except (BlockingIOError, InterruptedError):
+                break
+        for channel in channels:
+            notifier = self.notifiers.get(bytes((channel,)))
+            if notifier is not None:
+                notifier.wake()
@@ -0,0 +1,83 @@
+import datetime
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import exists, or_, select
+
+from src.config import Settings, settings
+from src.db import Job, Worker
+from src.rules import normalize_codec
+
+# Jobs are split into two size classes so that dispatch can stay index-backed:
+# big nodes look at large jobs first, everyone else at small ones first
+LARGE = "large"
+SMALL = "small"
+
+class WorkerCapabilities(BaseModel):
+    """What a worker can take on, registered with PUT /workers/{worker_id}."""
+    cores: int = Field(ge=1)
+    ram_mb: int = Field(ge=0)
+    encoders: List[str] = []                       # codecs it can encode, e.g. ["hevc", "h264"]
+    max_file_size_bytes: Optional[int] = None      # largest source it accepts; None for no limit
+
+    @field_validator("encoders")
+    @classmethod
+    def _normalize_encoders(cls, encoders: List[str]) -> List[str]:
+        return sorted({normalize_codec(encoder) for encoder in encoders})
+
+class WorkerResponse(WorkerCapabilities):
+    id: str
+    registered_at: Optional[datetime.datetime] = None
+    updated_at: Optional[datetime.datetime] = None
+
+    model_config = {
+        "from_attributes": True
+    }
+
+def job_size_class(size_bytes: Optional[int], height: Optional[int], settings: Settings = settings) -> str:
+    """4K sources and anything over settings.large_job_bytes are large jobs."""
+    if (height or 0) > 1080 or (size_bytes or 0) >= settings.large_job_bytes:
+        return LARGE
+    return SMALL
+
+def is_big_node(worker, settings: Settings = settings) -> bool:
+    return worker.cores >= settings.large_job_min_cores and worker.ram_mb >= settings.large_job_min_ram_mb
+
+def big_nodes_query(settings: Settings = settings):
+    """Whether any registered worker is a big node."""
+    return select(exists().where(
+        Worker.cores >= settings.large_job_min_cores,
+        Worker.ram_mb >= settings.large_job_min_ram_mb,
+    ))
+
+def claim_order(
+    worker, now: float, big_nodes: bool = True, settings: Settings = settings,
+) -> List[Tuple[str, Optional[float]]]:
+    """
+    (size class, latest schedule key or None) steps a worker claims from, in
+    order of preference. Big nodes take large jobs first. Other workers take
+    small jobs first; without a big node registered (`big_nodes`) they move
+    on to large ones once small work runs out. Either way a large job left
+    waiting settings.large_job_fallback_seconds past its slot comes first, so
+    large jobs never starve, even if the big nodes have gone away.
+    """
+    if is_big_node(worker, settings):
+        return [(LARGE, None), (SMALL, None)]
+    order = [(LARGE, now - settings.large_job_fallback_seconds), (SMALL, None)]
+    if not big_nodes:
+        order.append((LARGE, None))
+    return order
+
+def accepts(worker, size_bytes: Optional[int], encoder: Optional[str]) -> bool:
+    """Whether `worker` can run a job at all; capability_criteria in Python."""
+    return (
+        (encoder is None or encoder in worker.encoders)
+        and (worker.max_file_size_bytes is None or size_bytes is None or size_bytes <= worker.max_file_size_bytes)
+    )
+
+def capability_criteria(worker) -> list:
+    """WHERE clauses restricting the pending queue to jobs `worker` accepts."""
+    criteria = [or_(Job.encoder.is_(None), Job.encoder.in_(worker.encoders))]
+    if worker.max_file_size_bytes is not None:
+        criteria.append(or_(Job.size_bytes.is_(None), Job.size_bytes <= worker.max_file_size_bytes))
+    return criteria
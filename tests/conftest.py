@@ -1,42 +1,114 @@
+import asyncio
+import tempfile
+from pathlib import Path
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
-from src.db import Base
+from src.db import Base, create_async_db_engine, create_db_engine
 from src.factories import JobFactory
+from src.JobService import AsyncJobService
+from src.metrics import db_latency
+from src.queue_index import pending_index
 from main import app, get_db_session
 
-TEST_DATABASE_URL = "sqlite:///:memory:"
+# The app reaches the DB through an async engine and the tests through a sync
+# one, so the test DB is a throwaway file both engines can open.
+TEST_DATABASE_URL = f"sqlite:///{Path(tempfile.mkdtemp()) / 'test_jobs.db'}"
 
-engine = create_engine(
-    TEST_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
-)
+engine = create_db_engine(TEST_DATABASE_URL)
 
 TestingSessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 Base.metadata.create_all(bind=engine)
 
+def async_sessionmaker_for(url):
+    """Async sessions on `url` for the app under test."""
+    # TestClient runs each request on its own event loop, so connections
+    # must not be pooled across requests
+    async_engine = create_async_db_engine(url, poolclass=NullPool)
+
+    # The engine's first-connect hook is guarded by an asyncio.Lock; run it
+    # once here so requests racing on different loops never contend for it
+    async def connect_once():
+        async with async_engine.connect():
+            pass
+
+    asyncio.run(connect_once())
+    return async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+class SyncJobService:
+    """
+    AsyncJobService for synchronous tests: each call runs to completion in its
+    own session and event loop, the way a request would. Returned jobs are
+    detached, so re-read them rather than refreshing them.
+    """
+
+    def __init__(self, sessions: async_sessionmaker):
+        self.sessions = sessions
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            async def run():
+                async with self.sessions() as session:
+                    return await getattr(AsyncJobService(session), name)(*args, **kwargs)
+            return asyncio.run(run())
+        return call
+
+def override_db_session(url):
+    AsyncTestingSessionLocal = async_sessionmaker_for(url)
+
+    async def override_get_db_session():
+        async with AsyncTestingSessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = override_get_db_session
+
 @pytest.fixture()
 def db_session():
     """Fresh DB session for each test."""
-    Base.metadata.drop_all(bind=engine)   # reset DB
-    Base.metadata.create_all(bind=engine)
+    # Empty the tables rather than dropping them; the schema is built once above
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
 
     session = TestingSessionLocal()
     JobFactory._meta.sqlalchemy_session = session
 
     # Override FastAPI DB dependency for this test only
-    def override_get_db_session():
-        try:
-            yield session
-        finally:
-            pass
-
-    app.dependency_overrides[get_db_session] = override_get_db_session
+    override_db_session(TEST_DATABASE_URL)
 
     yield session
 
     session.close()
+    app.dependency_overrides.pop(get_db_session, None)
+    pending_index.reset()
+    app.state.webhook_replies.clear()
+    db_latency.reset()
+
+@pytest.fixture()
+def async_db_sessionmaker(db_session):
+    """Async sessions on the same DB as db_session, for driving async services directly."""
+    return async_sessionmaker_for(TEST_DATABASE_URL)
+
+@pytest.fixture()
+def jobs(async_db_sessionmaker):
+    """The job service on the db_session DB."""
+    return SyncJobService(async_db_sessionmaker)
+
+@pytest.fixture()
+def file_db_sessionmaker(tmp_path):
+    """Separate file-backed DB, for tests that need real concurrency."""
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    file_engine = create_db_engine(url)
+    Base.metadata.create_all(bind=file_engine)
+    FileSessionLocal = sessionmaker(bind=file_engine, autoflush=False, autocommit=False)
+
+    override_db_session(url)
+
+    yield FileSessionLocal
+
+    app.dependency_overrides.pop(get_db_session, None)
+    file_engine.dispose()
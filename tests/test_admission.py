@@ -0,0 +1,96 @@
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from src.admission import AdmissionControl
+from src.config import Settings
+from src.db import Job
+from src.factories import RadarrWebhookPayloadFactory
+from src.metrics import RecentLatency, registry
+from worker.client import JobClient
+
+client = TestClient(app)
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+def admission(monkeypatch, depth=None, latency=None, **overrides) -> AdmissionControl:
+    """Install admission control with these settings and signals on the app."""
+    control = AdmissionControl(
+        Settings(**overrides),
+        queue_depth=lambda: depth,
+        latency=latency or RecentLatency(half_life=5),
+    )
+    monkeypatch.setattr(app.state, "admission", control)
+    return control
+
+def test_webhooks_are_refused_while_the_queue_is_too_deep(db_session, monkeypatch):
+    admission(monkeypatch, depth=100, admission_max_pending=100)
+    shed_before = sample("transcoder_requests_shed_total", endpoint_class="webhook", reason="queue_depth")
+
+    response = client.post("/webhook/radarr", json=RadarrWebhookPayloadFactory().model_dump())
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+    assert db_session.query(Job).count() == 0
+    assert sample("transcoder_requests_shed_total", endpoint_class="webhook", reason="queue_depth") == shed_before + 1
+
+def test_webhooks_are_refused_while_the_db_is_slow_until_it_recovers(db_session, monkeypatch):
+    latency = RecentLatency(half_life=0.05)
+    now = time.perf_counter()
+    for _ in range(100):
+        latency.observe(2.0, now)
+    admission(monkeypatch, latency=latency, admission_max_db_latency_ms=250)
+
+    response = client.post("/webhook/radarr", json=RadarrWebhookPayloadFactory().model_dump())
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+
+    # With nothing running the average fades, and webhooks are let in again
+    time.sleep(0.5)
+    response = client.post("/webhook/radarr", json=RadarrWebhookPayloadFactory().model_dump())
+    assert response.status_code == 200
+
+def test_workers_are_served_while_webhook_slots_are_exhausted(db_session, monkeypatch):
+    control = admission(monkeypatch, admission_webhook_concurrency=4)
+    control.webhooks.in_flight = 4   # An import burst holds every webhook slot
+    admitted_before = sample("transcoder_requests_admitted_total", endpoint_class="worker")
+
+    webhook = client.post("/webhook/radarr", json=RadarrWebhookPayloadFactory().model_dump())
+    claim = client.get("/job/next", params={"worker_id": "w1"})
+
+    assert webhook.status_code == 503
+    assert claim.status_code == 404   # Served: the queue is just empty
+    assert sample("transcoder_requests_admitted_total", endpoint_class="worker") == admitted_before + 1
+
+def test_worker_requests_past_their_limit_get_retry_after(db_session, monkeypatch):
+    control = admission(monkeypatch, admission_worker_concurrency=2)
+    control.workers.in_flight = 2
+
+    response = client.get("/job/next", params={"worker_id": "w1"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_slots_are_released_after_each_request(db_session, monkeypatch):
+    control = admission(monkeypatch)
+
+    assert client.post("/webhook/radarr", json=RadarrWebhookPayloadFactory().model_dump()).status_code == 200
+    assert client.get("/job/next", params={"worker_id": "w1"}).status_code == 200
+    client.post("/webhook/radarr", json={"eventType": "Download"})   # Rejected by validation
+
+    assert control.webhooks.in_flight == 0
+    assert control.workers.in_flight == 0
+
+@pytest.mark.parametrize("status_code", [429, 503])
+def test_worker_backs_off_when_claims_are_shed(monkeypatch, status_code):
+    slept = []
+    monkeypatch.setattr(time, "sleep", slept.append)
+    transport = httpx.MockTransport(lambda request: httpx.Response(status_code, headers={"Retry-After": "3"}))
+    jobs = JobClient(httpx.Client(transport=transport, base_url="http://api"), "w1")
+
+    assert jobs.claim() is None
+    assert slept == [3.0]
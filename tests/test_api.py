@@ -1,12 +1,30 @@
+import asyncio
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect, text, update
 from main import app
 from tests.conftest import TestingSessionLocal
-from src.factories import JobFactory, JobValidationRequestFactory, RadarrWebhookPayloadFactory, SonarrWebhookPayloadFactory
-from src.JobService import JobService
-from src.db import Job
+from src.factories import JobFactory, JobValidationRequestFactory, RadarrWebhookPayloadFactory, SonarrWebhookPayloadFactory, write_matroska
+from src.JobService import JobFilter, JobSpec, encode_cursor, jobs_query, pending_queue_query, source_path_query
+from src.db import Job, MigrationError, migrate
+from src.validation_stage import validate_once
+from worker.client import JobCancelled, JobClient
 
 client = TestClient(app)
 
+def expire_lease(db_session, job_id):
+    db_session.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(lease_expires_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1))
+    )
+    db_session.commit()
+
 def test_radarr_webhook_creates_job(db_session):
     payload = RadarrWebhookPayloadFactory()
 
@@ -19,7 +37,7 @@ def test_radarr_webhook_creates_job(db_session):
     data = response.json()
 
     assert data["status"] == "pending"
-    assert data["path"] in payload.movieFile.path
+    assert data["source_path"] == payload.movieFile.path
 
 def test_sonarr_webhook_creates_job(db_session):
     payload = SonarrWebhookPayloadFactory()
@@ -33,31 +51,35 @@ def test_sonarr_webhook_creates_job(db_session):
     data = response.json()
 
     assert data["status"] == "pending"
-    assert data["path"] in payload.episodeFile.path
+    assert data["source_path"] == payload.episodeFile.path
  
-def test_worker_updates_job(db_session):
-    source_path = "/path/to/media/file.mkv"
+def test_worker_updates_job(db_session, async_db_sessionmaker, jobs, tmp_path):
+    source_path = write_matroska(tmp_path / "file.mkv")
     print(db_session.query(Job).all())
-    job = JobService(db_session).add_job(source_path)
-    job = JobService(db_session).get_next_pending_job()
+    job = jobs.add_job(source_path)
+    [job] = jobs.claim_pending_jobs()
 
     assert job.status == "processing"
     assert job.output_path is not None
     assert isinstance(job, Job)
 
+    job.output_path = write_matroska(tmp_path / "file.hevc.mkv", 2048)
     validation_payload = JobValidationRequestFactory(output_path=job.output_path)
     print(f"Validation payload: {validation_payload.model_dump()}")
     assert validation_payload.output_path == job.output_path
 
     response = client.patch(f"/job/{job.id}", json=validation_payload.model_dump())
 
-    assert response.status_code == 200
+    assert response.status_code == 202
+    assert response.json()["status"] == "validating"
 
-    data = response.json()
+    asyncio.run(validate_once(async_db_sessionmaker))
+    data = client.get(f"/job/{job.id}").json()
     
     assert data["status"] == "done"
     assert data["output_path"] == job.output_path == validation_payload.output_path
     assert data["id"] == job.id
+    assert len(data["output_checksum"]) == 64
 
 def test_worker_gets_next_job(db_session):
     job = JobFactory()
@@ -70,22 +92,300 @@ def test_worker_gets_next_job(db_session):
     assert data["output_path"] == job.output_path
     assert data["status"] == "processing"
 
-def test_JobService_validate_job(db_session):
-    source_path = "/path/to/media/file.mkv"
-    job = JobService(db_session).add_job(source_path)
-    job = JobService(db_session).get_next_pending_job()
-    output_path = job.output_path
-    validated_job = JobService(db_session).validate_job(job.id, output_path)
+def test_JobService_validate_job(db_session, async_db_sessionmaker, jobs, tmp_path):
+    source_path = write_matroska(tmp_path / "file.mkv")
+    job = jobs.add_job(source_path)
+    [job] = jobs.claim_pending_jobs()
+    output_path = write_matroska(tmp_path / "file.hevc.mkv")
+    assert jobs.submit_output(job.id, output_path).status == "validating"
+    asyncio.run(validate_once(async_db_sessionmaker))
+    validated_job = jobs.get_job(job.id)
 
     assert validated_job.status == "done"
     assert validated_job.output_path == output_path
     assert validated_job.id == job.id
 
-def test_JobService_add_job(db_session):
+def test_JobService_add_job(jobs):
     source_path = "/path/to/media/file.mkv"
 
-    job_response = JobService(db_session).add_job(source_path)
+    job_response = jobs.add_job(source_path)
     assert job_response.source_path == source_path
     assert job_response.status == "pending"
     assert job_response.id is not None
     assert isinstance(job_response, Job)
+
+def test_worker_claims_batch_of_jobs(db_session):
+    jobs = JobFactory.create_batch(3)
+
+    response = client.get("/job/next", params={"count": 2})
+    assert response.status_code == 200
+    data = response.json()
+
+    assert len(data) == 2
+    assert all(item["status"] == "processing" for item in data)
+    oldest = sorted(jobs, key=lambda j: (j.created_at, j.id))[:2]
+    assert {item["id"] for item in data} == {job.id for job in oldest}
+
+    response = client.get("/job/next", params={"count": 5})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    response = client.get("/job/next", params={"count": 5})
+    assert response.status_code == 404
+
+def test_concurrent_workers_never_claim_same_job(file_db_sessionmaker):
+    session = file_db_sessionmaker()
+    JobFactory._meta.sqlalchemy_session = session
+    job_ids = {job.id for job in JobFactory.create_batch(60)}
+    session.close()
+
+    def worker(_):
+        claimed = []
+        while True:
+            response = client.get("/job/next", params={"count": 2})
+            if response.status_code == 404:
+                return claimed
+            assert response.status_code == 200
+            claimed.extend(item["id"] for item in response.json())
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        results = list(pool.map(worker, range(12)))
+
+    claimed_ids = [job_id for claimed in results for job_id in claimed]
+    assert len(claimed_ids) == len(set(claimed_ids))
+    assert set(claimed_ids) == job_ids
+
+def test_worker_heartbeat_extends_lease(db_session):
+    JobFactory()
+    job = client.get("/job/next", params={"worker_id": "node-a"}).json()
+    assert job["worker_id"] == "node-a"
+    assert job["lease_expires_at"] is not None
+
+    response = client.post(f"/job/{job['id']}/heartbeat", json={"worker_id": "node-a"})
+    assert response.status_code == 200
+    assert response.json()["lease_expires_at"] >= job["lease_expires_at"]
+
+    response = client.post(f"/job/{job['id']}/heartbeat", json={"worker_id": "node-b"})
+    assert response.status_code == 409
+
+    response = client.post("/job/999999/heartbeat", json={"worker_id": "node-a"})
+    assert response.status_code == 404
+
+def test_JobService_reclaims_expired_leases(db_session, jobs):
+    jobs.add_job("/path/to/media/file.mkv")
+    [job] = jobs.claim_pending_jobs(worker_id="node-a")
+
+    # Nothing to reclaim while the lease is live
+    assert jobs.reclaim_expired_jobs(max_attempts=2) == 0
+
+    expire_lease(db_session, job.id)
+    assert jobs.reclaim_expired_jobs(max_attempts=2) == 1
+    job = jobs.get_job(job.id)
+    assert job.status == "pending"
+    assert job.attempts == 1
+    assert job.worker_id is None
+
+    [job] = jobs.claim_pending_jobs(worker_id="node-b")
+    expire_lease(db_session, job.id)
+    assert jobs.reclaim_expired_jobs(max_attempts=2) == 1
+    job = jobs.get_job(job.id)
+    assert job.status == "failed"
+    assert job.attempts == 2
+
+def test_long_poll_returns_job_queued_while_waiting(file_db_sessionmaker):
+    payload = RadarrWebhookPayloadFactory()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        started = time.monotonic()
+        waiting = pool.submit(client.get, "/job/next", params={"wait": 10})
+        time.sleep(0.3)
+        assert not waiting.done()
+
+        assert client.post("/webhook/radarr", json=payload.model_dump()).status_code == 200
+        response = waiting.result(timeout=5)
+
+    assert time.monotonic() - started < 5
+    assert response.status_code == 200
+    assert response.json()["source_path"] == payload.movieFile.path
+    assert response.json()["status"] == "processing"
+
+def test_long_poll_times_out_with_no_jobs(db_session):
+    started = time.monotonic()
+    response = client.get("/job/next", params={"wait": 0.2})
+
+    assert response.status_code == 404
+    assert time.monotonic() - started >= 0.2
+
+def _query_plan(session, query):
+    compiled = query.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    rows = session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return " | ".join(row[-1] for row in rows)
+
+def test_queue_query_uses_status_schedule_key_index(db_session):
+    JobFactory.create_batch(20)
+    plan = _query_plan(db_session, pending_queue_query(5))
+
+    assert "ix_jobs_status_schedule_key" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_dedupe_query_uses_source_path_index(db_session):
+    plan = _query_plan(db_session, source_path_query("/path/to/media/file.mkv"))
+
+    assert "ux_jobs_source_path" in plan
+
+def test_duplicate_source_path_is_rejected(db_session, jobs):
+    jobs.add_job("/path/to/media/file.mkv")
+
+    with pytest.raises(HTTPException) as exc:
+        jobs.add_job("/path/to/media/file.mkv")
+
+    assert exc.value.status_code == 400
+    assert db_session.query(Job).count() == 1
+
+def test_migrate_upgrades_legacy_jobs_table(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    with legacy.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE jobs (id INTEGER NOT NULL, job_type VARCHAR NOT NULL, "
+            "source_path VARCHAR NOT NULL, output_path VARCHAR, status VARCHAR, "
+            "created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id))"
+        ))
+        conn.execute(text(
+            "INSERT INTO jobs (id, job_type, source_path, status) VALUES "
+            "(1, 'movie', '/a.mkv', 'done'), (3, 'episode', '/b.mkv', 'pending')"
+        ))
+
+    migrate(legacy)
+
+    indexes = {index["name"] for index in inspect(legacy).get_indexes("jobs")}
+    assert {"ix_jobs_status_schedule_key", "ux_jobs_source_path"} <= indexes
+    columns = {column["name"] for column in inspect(legacy).get_columns("jobs")}
+    assert {"worker_id", "lease_expires_at", "attempts"} <= columns
+    with legacy.connect() as conn:
+        assert conn.execute(text("SELECT id FROM jobs ORDER BY id")).scalars().all() == [1, 3]
+    legacy.dispose()
+
+def test_migrate_refuses_to_drop_duplicate_jobs(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    with legacy.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE jobs (id INTEGER NOT NULL, job_type VARCHAR NOT NULL, "
+            "source_path VARCHAR NOT NULL, output_path VARCHAR, status VARCHAR, "
+            "created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id))"
+        ))
+        conn.execute(text(
+            "INSERT INTO jobs (id, job_type, source_path, status) VALUES "
+            "(1, 'movie', '/a.mkv', 'done'), (2, 'movie', '/a.mkv', 'pending')"
+        ))
+
+    with pytest.raises(MigrationError, match="/a.mkv"):
+        migrate(legacy)
+
+    with legacy.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM jobs")).scalar() == 2
+    legacy.dispose()
+
+def test_anonymous_claim_is_not_leased(jobs):
+    jobs.add_job("/path/to/media/file.mkv")
+    [job] = jobs.claim_pending_jobs()
+
+    assert job.worker_id is None
+    assert job.lease_expires_at is None
+    assert jobs.reclaim_expired_jobs(max_attempts=1) == 0
+
+def test_stale_worker_cannot_finish_reclaimed_job(db_session, jobs, tmp_path):
+    jobs.add_job(write_matroska(tmp_path / "file.mkv"))
+    [job] = jobs.claim_pending_jobs(worker_id="node-a")
+    expire_lease(db_session, job.id)
+    jobs.reclaim_expired_jobs(max_attempts=3)
+    [job] = jobs.claim_pending_jobs(worker_id="node-b")
+
+    output_path = write_matroska(tmp_path / "file.hevc.mkv")
+    response = client.patch(f"/job/{job.id}", json={"output_path": output_path, "worker_id": "node-a"})
+    assert response.status_code == 409
+
+    response = client.patch(f"/job/{job.id}", json={"output_path": output_path, "worker_id": "node-b"})
+    assert response.status_code == 202
+    assert response.json()["status"] == "validating"
+
+def test_job_listing_pages_newest_first(db_session):
+    JobFactory.create_batch(25)
+    expected = [
+        job.id for job in sorted(db_session.query(Job), key=lambda job: (job.created_at, job.id), reverse=True)
+    ]
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/jobs", params={"limit": 10, **({"cursor": cursor} if cursor else {})}).json()
+        seen += [job["id"] for job in page["jobs"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+
+def test_job_listing_filters(db_session):
+    movie = JobFactory.create(job_type="movie", status="done", source_path="/media/movies/a.mkv")
+    JobFactory.create(job_type="episode", status="done", source_path="/media/tv/b.mkv")
+    JobFactory.create(job_type="movie", status="pending", source_path="/media/movies/c.mkv")
+    JobFactory.create(job_type="movie", status="done", source_path="/media/moviesX/d.mkv")
+    # Paths are case-sensitive, whatever SQLite's LIKE thinks
+    upper = JobFactory.create(job_type="movie", status="done", source_path="/Media/Movies/e.mkv")
+
+    params = {"status": "done", "job_type": "movie", "path_prefix": "/media/movies/"}
+    page = client.get("/jobs", params=params).json()
+    assert [job["id"] for job in page["jobs"]] == [movie.id]
+
+    # LIKE wildcards in the prefix are matched literally
+    assert client.get("/jobs", params={"path_prefix": "/media/mo_ies/"}).json()["jobs"] == []
+    assert client.get("/jobs", params={"path_prefix": "/media/%"}).json()["jobs"] == []
+    page = client.get("/jobs", params={"path_prefix": "/Media/"}).json()
+    assert [job["id"] for job in page["jobs"]] == [upper.id]
+
+    window = {
+        "created_after": movie.created_at.isoformat(),
+        "created_before": (movie.created_at + datetime.timedelta(microseconds=1)).isoformat(),
+    }
+    page = client.get("/jobs", params=window).json()
+    assert [job["id"] for job in page["jobs"]] == [movie.id]
+
+def test_job_listing_rejects_bad_cursor(db_session):
+    assert client.get("/jobs", params={"cursor": "not-a-cursor"}).status_code == 400
+
+def test_job_listing_seeks_on_created_at_index(db_session):
+    JobFactory.create_batch(20)
+    page = jobs_query(JobFilter(), cursor=encode_cursor(JobFactory.create())).limit(10)
+    plan = _query_plan(db_session, page)
+
+    assert "ix_jobs_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+def test_path_prefix_filter_seeks_on_source_path_index(db_session):
+    JobFactory.create_batch(20)
+    plan = _query_plan(db_session, jobs_query(JobFilter(path_prefix="/media/movies/")).limit(10))
+
+    assert "ux_jobs_source_path" in plan
+
+def test_job_export_streams_ndjson(db_session):
+    JobFactory.create_batch(7, status="done")
+    JobFactory.create_batch(3, status="failed")
+
+    response = client.get("/jobs/export", params={"status": "done"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 7
+    assert {line["status"] for line in lines} == {"done"}
+
+def test_heartbeat_on_cancelled_job_is_gone(jobs):
+    jobs.add_jobs([JobSpec(source_path="/movies/old.mkv", media_key="Radarr/movie/1")])
+    [job] = jobs.claim_pending_jobs(worker_id="node-a")
+
+    jobs.add_jobs([JobSpec(source_path="/movies/new.mkv", media_key="Radarr/movie/1")])
+    response = client.post(f"/job/{job.id}/heartbeat", json={"worker_id": "node-a"})
+
+    assert response.status_code == 410
+    assert "cancelled" in response.json()["detail"]
+    with pytest.raises(JobCancelled):
+        JobClient(client, "node-a").heartbeat(job.id)
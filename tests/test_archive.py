@@ -0,0 +1,93 @@
+import asyncio
+import dataclasses
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from main import app
+from src.archive import archive_expired
+from src.config import settings
+from src.db import ArchivedJob, Job, utcnow
+from src.factories import JobFactory, RadarrWebhookPayloadFactory
+from src.JobService import JobSpec, archived_query
+
+client = TestClient(app)
+
+LONG_AGO = utcnow() - datetime.timedelta(days=90)
+
+def _finished_jobs(db_session, count, status="done", updated_at=LONG_AGO):
+    """(id, source_path) of new jobs; the ORM objects are gone once archived."""
+    jobs = JobFactory.create_batch(count, status=status)
+    for job in jobs:
+        job.updated_at = updated_at
+    db_session.commit()
+    return [(job.id, job.source_path) for job in jobs]
+
+def test_archive_moves_old_finished_jobs_in_batches(db_session, async_db_sessionmaker):
+    old = _finished_jobs(db_session, 5) + _finished_jobs(db_session, 2, status="cancelled")
+    recent = _finished_jobs(db_session, 2, updated_at=utcnow())
+    pending = JobFactory.create(status="pending")
+    pending_id = pending.id
+    batches = dataclasses.replace(settings, archive_batch_size=3, archive_pause_seconds=0)
+
+    moved = asyncio.run(archive_expired(async_db_sessionmaker, batches))
+
+    assert moved == 7
+    assert {job.id for job in db_session.query(ArchivedJob)} == {job_id for job_id, _ in old}
+    assert {job.id for job in db_session.query(Job)} == {job_id for job_id, _ in recent} | {pending_id}
+
+def test_archive_keeps_newest_job_in_place(db_session, jobs):
+    finished = _finished_jobs(db_session, 3)
+
+    moved = jobs.archive_batch(utcnow(), 10)
+
+    # Removing max(id) would let SQLite hand the same id to the next job
+    assert moved == 2
+    assert db_session.query(Job).one().id == finished[-1][0]
+
+def test_archived_source_path_is_still_a_duplicate(db_session, async_db_sessionmaker, jobs):
+    payload = RadarrWebhookPayloadFactory()
+    first = client.post("/webhook/radarr", json=payload.model_dump()).json()
+    db_session.query(Job).filter(Job.id == first["id"]).update({"status": "done", "updated_at": LONG_AGO})
+    db_session.commit()
+    _finished_jobs(db_session, 1, updated_at=utcnow())
+
+    assert asyncio.run(archive_expired(async_db_sessionmaker)) == 1
+
+    # Another import of the same file, not a retry of the first delivery
+    response = client.post("/webhook/radarr", json={**payload.model_dump(), "downloadId": "another-download"})
+    assert response.status_code == 400
+    [(job, created)] = jobs.add_jobs([JobSpec(source_path=payload.movieFile.path)])
+    assert not created and job.id == first["id"]
+
+def test_archived_dedupe_query_uses_index(db_session):
+    query = archived_query([JobSpec(source_path="/path/to/media/file.mkv")])
+    compiled = query.compile(dialect=db_session.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = " | ".join(row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+    assert "ux_jobs_archive_source_path" in plan
+
+def test_archived_jobs_are_readable(db_session, jobs):
+    done = [job_id for job_id, _ in _finished_jobs(db_session, 3)]
+    failed = [job_id for job_id, _ in _finished_jobs(db_session, 2, status="failed")]
+    done_path = db_session.get(Job, done[1]).source_path
+    _finished_jobs(db_session, 1, updated_at=utcnow())
+    jobs.archive_batch(utcnow() - datetime.timedelta(days=1), 100)
+
+    page = client.get("/archive/jobs", params={"limit": 2}).json()
+    assert [job["id"] for job in page] == done[:2]
+    assert all(job["archived_at"] for job in page)
+
+    rest = client.get("/archive/jobs", params={"after_id": page[-1]["id"]}).json()
+    assert [job["id"] for job in rest] == done[2:] + failed
+
+    failures = client.get("/archive/jobs", params={"status": "failed"}).json()
+    assert [job["id"] for job in failures] == failed
+
+    by_path = client.get("/archive/jobs", params={"source_path": done_path}).json()
+    assert [job["id"] for job in by_path] == [done[1]]
+
+    response = client.get(f"/job/{done[0]}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
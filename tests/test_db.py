@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import DateTime, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.schema import CreateTable
+
+from src.config import Settings
+from src.db import Base, create_async_db_engine, create_db_engine
+
+def test_settings_read_from_environment():
+    settings = Settings.from_env({
+        "DATABASE_URL": "postgresql://transcoder@db/jobs",
+        "SQLITE_BUSY_TIMEOUT_MS": "250",
+    })
+
+    assert settings.database_url == "postgresql://transcoder@db/jobs"
+    assert settings.sqlite_busy_timeout_ms == 250
+    assert settings.sqlite_journal_mode == "WAL"
+
+def test_file_engine_is_tuned_and_pooled(tmp_path):
+    settings = Settings(sqlite_busy_timeout_ms=1234, sqlite_cache_size_kib=2048)
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'jobs.db'}", settings)
+
+    assert isinstance(engine.pool, QueuePool)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -2048
+    engine.dispose()
+
+def test_memory_engine_shares_one_connection():
+    engine = create_db_engine("sqlite:///:memory:")
+
+    assert isinstance(engine.pool, StaticPool)
+
+def test_timestamps_are_timestamptz_on_postgresql():
+    for table in Base.metadata.sorted_tables:
+        ddl = str(CreateTable(table).compile(dialect=postgresql.dialect()))
+        assert "WITHOUT TIME ZONE" not in ddl
+        assert all(column.type.timezone for column in table.columns if isinstance(column.type, DateTime))
+
+def test_postgresql_urls_get_installed_drivers():
+    pytest.importorskip("psycopg")
+    url = "postgresql://transcoder@db/jobs"
+
+    assert create_db_engine(url).url.drivername == "postgresql+psycopg"
+    assert create_async_db_engine(url).url.drivername == "postgresql+asyncpg"
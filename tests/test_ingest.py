@@ -0,0 +1,231 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from main import app
+from src.config import settings
+from src.db import Job
+from src.factories import RadarrMediaInfoFactory, RadarrWebhookPayloadFactory, SonarrWebhookPayloadFactory
+from src.ingest import IngestBuffer, ReplyCache
+from src.JobService import JobResponse, JobSpec
+from src.schemas.webhook import SonarrImport
+
+client = TestClient(app)
+
+def test_batch_webhook_returns_result_per_item(db_session):
+    movie = RadarrWebhookPayloadFactory()
+    episode = SonarrWebhookPayloadFactory()
+    grab = SonarrWebhookPayloadFactory(eventType="Grab")
+
+    response = client.post("/webhook/batch", json=[
+        movie.model_dump(),
+        episode.model_dump(),
+        movie.model_dump(),
+        grab.model_dump(),
+    ])
+
+    assert response.status_code == 200
+    results = response.json()
+    assert [item["status"] for item in results] == ["created", "created", "duplicate", "ignored"]
+    assert results[0]["job"]["source_path"] == movie.movieFile.path
+    assert results[0]["job"]["status"] == "pending"
+    assert results[1]["job"]["source_path"] == episode.episodeFile.path
+    assert results[2]["job"]["id"] == results[0]["job"]["id"]
+    assert results[3]["job"] is None
+    assert db_session.query(Job).count() == 2
+
+def test_batch_webhook_reports_invalid_items_without_dropping_the_rest(db_session):
+    movie = RadarrWebhookPayloadFactory()
+    broken = SonarrWebhookPayloadFactory().model_dump()
+    del broken["episodeFile"]
+
+    response = client.post("/webhook/batch", json=[broken, movie.model_dump()])
+
+    assert response.status_code == 200
+    results = response.json()
+    assert results[0]["status"] == "invalid"
+    assert "episodeFile" in results[0]["error"]
+    assert results[1]["status"] == "created"
+    assert db_session.query(Job).count() == 1
+
+def test_single_webhook_rejects_duplicate(db_session):
+    payload = RadarrWebhookPayloadFactory()
+
+    assert client.post("/webhook/radarr", json=payload.model_dump()).status_code == 200
+    # Same file from another download: not a retry
+    response = client.post("/webhook/radarr", json={**payload.model_dump(), "downloadId": "another-download"})
+
+    assert response.status_code == 400
+
+def test_retried_webhook_returns_original_job(db_session):
+    payload = RadarrWebhookPayloadFactory()
+    first = client.post("/webhook/radarr", json=payload.model_dump())
+    statements = []
+    listener = lambda conn, statement, *args: statements.append(statement)
+    event.listen(Engine, "before_execute", listener)
+    try:
+        retry = client.post("/webhook/radarr", json=payload.model_dump())
+    finally:
+        event.remove(Engine, "before_execute", listener)
+
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert statements == []  # answered from the reply cache
+    assert db_session.query(Job).count() == 1
+
+def test_retry_after_restart_is_recognised_from_the_db(db_session):
+    payload = SonarrWebhookPayloadFactory()
+    first = client.post("/webhook/sonarr", json=payload.model_dump()).json()
+    app.state.webhook_replies.clear()  # as after a restart
+
+    retry = client.post("/webhook/sonarr", json=payload.model_dump())
+
+    assert retry.status_code == 200
+    assert retry.json()["id"] == first["id"]
+    assert retry.json()["idempotency_key"] == f"{payload.downloadId}/{payload.episodeFile.id}"
+
+def test_reply_cache_is_bounded_and_expires():
+    replies = ReplyCache(max_entries=2, ttl=60)
+    for key in "abc":
+        replies.put(key, JobResponse(id=1, source_path=key, output_path=key, status="pending"))
+    assert replies.get("a") is None and len(replies) == 2
+
+    replies.ttl = -1
+    replies.put("d", JobResponse(id=2, source_path="d", output_path="d", status="pending"))
+    assert replies.get("d") is None
+
+def test_non_import_events_skip_validation(db_session):
+    # A Test event carries none of the import fields, and needs none of them
+    response = client.post("/webhook/radarr", json={"eventType": "Test", "instanceName": "Radarr"})
+
+    assert response.status_code == 204
+    assert db_session.query(Job).count() == 0
+
+def test_import_missing_used_fields_is_rejected(db_session):
+    payload = RadarrWebhookPayloadFactory().model_dump()
+    del payload["movieFile"]["mediaInfo"]["height"]
+
+    response = client.post("/webhook/radarr", json=payload)
+
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["movieFile", "mediaInfo", "height"]
+
+def test_fast_path_keeps_full_payload_for_lazy_access():
+    payload = SonarrWebhookPayloadFactory()
+
+    parsed = SonarrImport.from_json(payload.model_dump_json().encode())
+
+    assert parsed.episodeFile.path == payload.episodeFile.path
+    assert parsed.full() == payload
+    assert parsed.full() is parsed.full()
+
+def test_ingest_buffer_coalesces_concurrent_webhooks_into_one_commit(async_db_sessionmaker):
+    commits = []
+
+    def count_commit(conn):
+        commits.append(1)
+
+    buffer = IngestBuffer(window=0.05, max_batch=100)
+
+    async def burst():
+        async with async_db_sessionmaker() as session:
+            event.listen(session.bind.sync_engine, "commit", count_commit)
+            return await asyncio.gather(*(
+                buffer.submit(session, JobSpec(source_path=f"/media/show/{n}.mkv"))
+                for n in range(20)
+            ))
+
+    results = asyncio.run(burst())
+
+    assert len(commits) == 1
+    assert all(created for _, created in results)
+    assert [job.source_path for job, _ in results] == [f"/media/show/{n}.mkv" for n in range(20)]
+    assert len({job.id for job, _ in results}) == 20
+
+def test_ingest_buffer_survives_cancelled_leader(async_db_sessionmaker):
+    buffer = IngestBuffer(window=0.05, max_batch=100)
+
+    async def scenario():
+        async with async_db_sessionmaker() as session:
+            leader = asyncio.create_task(buffer.submit(session, JobSpec(source_path="/media/show/1.mkv")))
+            follower = asyncio.create_task(buffer.submit(session, JobSpec(source_path="/media/show/2.mkv")))
+            await asyncio.sleep(0)
+            leader.cancel()
+
+            job, created = await asyncio.wait_for(follower, timeout=5)
+            later, later_created = await asyncio.wait_for(
+                buffer.submit(session, JobSpec(source_path="/media/show/3.mkv")), timeout=5
+            )
+            return job, created, later, later_created
+
+    job, created, later, later_created = asyncio.run(scenario())
+
+    assert created and job.source_path == "/media/show/2.mkv"
+    assert later_created and later.source_path == "/media/show/3.mkv"
+
+def _upgrade(payload, path):
+    """The same media imported again from a new download, as a new file."""
+    upgrade = payload.model_copy(deep=True)
+    upgrade.isUpgrade = True
+    upgrade.downloadId = f"{payload.downloadId}:{path}"
+    media_file = upgrade.movieFile if hasattr(upgrade, "movieFile") else upgrade.episodeFile
+    media_file.path = path
+    media_file.id += 1
+    return upgrade
+
+def test_upgrade_supersedes_live_jobs_for_the_same_movie(db_session):
+    payload = RadarrWebhookPayloadFactory()
+    queued = client.post("/webhook/radarr", json=payload.model_dump()).json()
+    claimed_payload = RadarrWebhookPayloadFactory()
+    claimed = client.post("/webhook/radarr", json=claimed_payload.model_dump()).json()
+    client.get("/job/next", params={"worker_id": "node-a"})
+    client.get("/job/next", params={"worker_id": "node-a"})
+    # Same movie id, but another Radarr instance keeps its own copy
+    other_instance = RadarrWebhookPayloadFactory(movie=payload.movie, instanceName="Radarr 4K")
+    kept = client.post("/webhook/radarr", json=other_instance.model_dump()).json()
+
+    upgrade = client.post("/webhook/radarr", json=_upgrade(payload, "/movies/upgrade.mkv").model_dump())
+    client.post("/webhook/radarr", json=_upgrade(claimed_payload, "/movies/upgrade-2.mkv").model_dump())
+
+    assert upgrade.status_code == 200
+    assert upgrade.json()["status"] == "pending"
+    statuses = {job.id: job.status for job in db_session.query(Job)}
+    assert statuses[queued["id"]] == "cancelled"
+    assert statuses[claimed["id"]] == "cancelled"
+    assert statuses[kept["id"]] == "pending"
+    assert "Superseded" in db_session.get(Job, queued["id"]).error_message
+
+def test_ignored_upgrade_still_supersedes_live_jobs(db_session, monkeypatch):
+    payload = RadarrWebhookPayloadFactory()
+    queued = client.post("/webhook/radarr", json=payload.model_dump()).json()
+    batched_payload = RadarrWebhookPayloadFactory()
+    batched = client.post("/webhook/radarr", json=batched_payload.model_dump()).json()
+    monkeypatch.setattr(settings, "transcode_skip_action", "ignore")
+
+    # The upgrades already meet their profile, so no job is queued for them
+    upgrade = _upgrade(payload, "/movies/upgrade.mkv")
+    upgrade.movieFile.mediaInfo = RadarrMediaInfoFactory(videoCodec="x265")
+    batched_upgrade = _upgrade(batched_payload, "/movies/upgrade-2.mkv")
+    batched_upgrade.movieFile.mediaInfo = RadarrMediaInfoFactory(videoCodec="x265")
+
+    assert client.post("/webhook/radarr", json=upgrade.model_dump()).status_code == 204
+    response = client.post("/webhook/batch", json=[batched_upgrade.model_dump()])
+    assert response.json()[0]["status"] == "ignored"
+
+    assert db_session.get(Job, queued["id"]).status == "cancelled"
+    assert db_session.get(Job, batched["id"]).status == "cancelled"
+    assert db_session.query(Job).count() == 2
+
+def test_upgrade_supersedes_by_series_and_episodes(db_session):
+    payload = SonarrWebhookPayloadFactory()
+    first = client.post("/webhook/sonarr", json=payload.model_dump()).json()
+    other_episode = _upgrade(payload, "/tv/other-episode.mkv")
+    other_episode.episodes[0].id += 1
+    second = client.post("/webhook/sonarr", json=other_episode.model_dump()).json()
+
+    client.post("/webhook/sonarr", json=_upgrade(payload, "/tv/upgrade.mkv").model_dump())
+
+    assert db_session.get(Job, first["id"]).status == "cancelled"
+    assert db_session.get(Job, second["id"]).status == "pending"
@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from prometheus_client.parser import text_string_to_metric_families
+
+from main import app
+from src.factories import JobFactory, write_matroska
+from src.metrics import registry
+
+client = TestClient(app)
+ROOT = Path(__file__).resolve().parent.parent
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+def scraped(text: str, name: str, **labels) -> float:
+    return next(
+        sample.value
+        for family in text_string_to_metric_families(text)
+        for sample in family.samples
+        if sample.name == name and sample.labels == labels
+    )
+
+def test_metrics_endpoint_exposes_route_latency(db_session):
+    client.get("/job/12345")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/job/{job_id}"' in response.text
+    assert sample(
+        "transcoder_http_request_duration_seconds_count", method="GET", route="/job/{job_id}", status="404"
+    ) >= 1
+
+def test_transitions_are_counted(jobs, tmp_path):
+    before = {
+        move: sample("transcoder_job_transitions_total", from_status=move[0], to_status=move[1])
+        for move in [("new", "pending"), ("pending", "processing"), ("processing", "validating")]
+    }
+    jobs.add_job(write_matroska(tmp_path / "file.mkv"))
+    [job] = jobs.claim_pending_jobs()
+    client.patch(f"/job/{job.id}", json={"output_path": write_matroska(tmp_path / "file.hevc.mkv")})
+
+    for (from_status, to_status), count in before.items():
+        assert sample("transcoder_job_transitions_total", from_status=from_status, to_status=to_status) == count + 1
+
+def test_queue_depth_is_counted_on_scrape(jobs):
+    JobFactory.create_batch(2)
+    assert scraped(client.get("/metrics").text, "transcoder_jobs", status="pending") == 2
+
+    # Rows written by another process (here, behind the service's back) count too
+    JobFactory()
+    jobs.add_job("/media/new.mkv")
+    jobs.claim_pending_jobs()
+    text = client.get("/metrics").text
+    assert scraped(text, "transcoder_jobs", status="pending") == 3
+    assert scraped(text, "transcoder_jobs", status="processing") == 1
+
+def test_scrapes_sum_every_process_in_multiprocess_mode(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PYTHONPATH": str(ROOT)}
+    def run(code: str) -> str:
+        return subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        ).stdout
+
+    for _ in range(2):   # Two API processes, one claim each
+        run("from src.metrics import record_transition; record_transition('pending', 'processing')")
+    text = run("from src.metrics import render; print(render({'pending': 4})[0].decode())")
+
+    assert scraped(text, "transcoder_job_transitions_total", from_status="pending", to_status="processing") == 2
+    assert scraped(text, "transcoder_jobs", status="pending") == 4
+
+def test_db_statements_are_timed(db_session):
+    before = sample("transcoder_db_query_duration_seconds_count", operation="SELECT")
+    client.get("/job/12345")
+    assert sample("transcoder_db_query_duration_seconds_count", operation="SELECT") > before
@@ -0,0 +1,165 @@
+import asyncio
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from src.config import Settings
+from src.db import Notification, utcnow
+from src.factories import JobFactory, SonarrWebhookPayloadFactory, write_matroska
+from src.ingest import job_spec_from_payload
+from src.JobService import default_context
+from src.notify import JellyfinTarget, NotifyTarget, Outbox, RadarrTarget, SonarrTarget, outbox_rows
+from src.validation_stage import validate_once
+
+class StandIn:
+    """A local HTTP server standing in for Jellyfin or an *arr, recording what it is sent."""
+
+    def __init__(self, failures: int = 0):
+        self.requests = []
+        self.failures = failures
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stand_in.requests.append((self.path, dict(self.headers), body))
+                status = 500 if stand_in.failures else 204
+                stand_in.failures = max(stand_in.failures - 1, 0)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture()
+def stand_ins():
+    servers = {"jellyfin": StandIn(), "sonarr": StandIn(), "radarr": StandIn()}
+    yield servers
+    for server in servers.values():
+        server.close()
+
+def targets_for(stand_ins):
+    return {
+        "jellyfin": JellyfinTarget(stand_ins["jellyfin"].url, "jf-key", debounce_seconds=60),
+        "sonarr": SonarrTarget(stand_ins["sonarr"].url, "sonarr-key", debounce_seconds=15),
+        "radarr": RadarrTarget(stand_ins["radarr"].url, "radarr-key", debounce_seconds=15),
+    }
+
+def finish(db_session, targets, jobs):
+    for job in jobs:
+        db_session.add_all(outbox_rows(job, targets))
+    db_session.commit()
+
+def deliver(async_db_sessionmaker, targets, now, settings=Settings()):
+    async def run():
+        async with httpx.AsyncClient() as http, async_db_sessionmaker() as session:
+            return await Outbox(http, targets, settings).deliver_due(session, now)
+    return asyncio.run(run())
+
+def test_targets_must_implement_key_for_and_send():
+    class KeyOnly(NotifyTarget):
+        name = "key-only"
+
+        def key_for(self, job):
+            return str(job.id)
+
+    with pytest.raises(TypeError):
+        KeyOnly("http://localhost", "", 0)
+
+def test_season_backfill_coalesces_into_one_call_per_series_and_folder(db_session, async_db_sessionmaker, stand_ins):
+    targets = targets_for(stand_ins)
+    episodes = [
+        JobFactory(status="done", job_type="episode", media_id=7, output_path=f"/tv/Show/Season 1/e{n}.mkv")
+        for n in range(20)
+    ]
+    movie = JobFactory(status="done", job_type="movie", media_id=3, output_path="/movies/Film/film.mkv")
+    finish(db_session, targets, [*episodes, movie])
+
+    # Still inside every debounce window: nothing is sent yet
+    assert deliver(async_db_sessionmaker, targets, utcnow()) == 0
+
+    sent = deliver(async_db_sessionmaker, targets, utcnow() + datetime.timedelta(seconds=61))
+
+    assert sent == 3
+    (path, headers, body), = stand_ins["jellyfin"].requests
+    assert path == "/Library/Media/Updated"
+    assert headers["X-Emby-Token"] == "jf-key"
+    assert sorted(update["Path"] for update in body["Updates"]) == ["/movies/Film", "/tv/Show/Season 1"]
+    assert [body for _, _, body in stand_ins["sonarr"].requests] == [{"name": "RescanSeries", "seriesId": 7}]
+    assert [body for _, _, body in stand_ins["radarr"].requests] == [{"name": "RescanMovie", "movieId": 3}]
+    assert db_session.execute(select(Notification)).scalars().all() == []
+
+def test_max_delay_caps_debounce_under_a_steady_trickle(db_session, async_db_sessionmaker, stand_ins):
+    targets = {"sonarr": targets_for(stand_ins)["sonarr"]}
+    finish(db_session, targets, [JobFactory(status="done", media_id=7)])
+    oldest = db_session.execute(select(Notification)).scalar_one()
+    oldest.created_at = utcnow() - datetime.timedelta(seconds=700)
+    db_session.commit()
+    finish(db_session, targets, [JobFactory(status="done", media_id=7)])
+
+    assert deliver(async_db_sessionmaker, targets, utcnow()) == 1
+    assert len(stand_ins["sonarr"].requests) == 1
+
+def test_failed_calls_retry_with_backoff(db_session, async_db_sessionmaker, stand_ins):
+    stand_ins["sonarr"].failures = 2
+    targets = {"sonarr": targets_for(stand_ins)["sonarr"]}
+    finish(db_session, targets, [JobFactory(status="done", media_id=7)])
+    now = utcnow() + datetime.timedelta(seconds=16)
+    settings = Settings(notify_retry_base_seconds=5, notify_max_attempts=3)
+
+    assert deliver(async_db_sessionmaker, targets, now, settings) == 0
+    row = db_session.execute(select(Notification)).scalar_one()
+    assert (row.attempts, row.status) == (1, "pending")
+    assert "500" in row.last_error
+
+    # Not due again until the backoff has passed
+    assert deliver(async_db_sessionmaker, targets, now + datetime.timedelta(seconds=4), settings) == 0
+    assert len(stand_ins["sonarr"].requests) == 1
+
+    assert deliver(async_db_sessionmaker, targets, now + datetime.timedelta(seconds=6), settings) == 0
+    db_session.refresh(row)
+    assert row.attempts == 2
+
+    # Second retry waits twice as long
+    assert deliver(async_db_sessionmaker, targets, now + datetime.timedelta(seconds=15), settings) == 0
+    assert deliver(async_db_sessionmaker, targets, now + datetime.timedelta(seconds=17), settings) == 1
+    assert len(stand_ins["sonarr"].requests) == 3
+
+def test_gives_up_after_max_attempts(db_session, async_db_sessionmaker, stand_ins):
+    stand_ins["radarr"].failures = 10
+    targets = {"radarr": targets_for(stand_ins)["radarr"]}
+    finish(db_session, targets, [JobFactory(status="done", job_type="movie", media_id=3)])
+    settings = Settings(notify_max_attempts=1)
+
+    assert deliver(async_db_sessionmaker, targets, utcnow() + datetime.timedelta(seconds=16), settings) == 0
+    assert db_session.execute(select(Notification.status)).scalar_one() == "dead"
+    assert deliver(async_db_sessionmaker, targets, utcnow() + datetime.timedelta(days=1), settings) == 0
+
+def test_successful_validation_queues_notifications(db_session, async_db_sessionmaker, jobs, stand_ins, tmp_path, monkeypatch):
+    monkeypatch.setattr(default_context(), "notify_targets", targets_for(stand_ins))
+    spec = job_spec_from_payload(SonarrWebhookPayloadFactory(episodeFile__path=write_matroska(tmp_path / "e1.mkv")))
+    (job, _), = jobs.add_jobs([spec])
+    [job] = jobs.claim_pending_jobs()
+
+    jobs.submit_output(job.id, write_matroska(tmp_path / "e1.hevc.mkv"))
+    asyncio.run(validate_once(async_db_sessionmaker))
+
+    rows = db_session.execute(select(Notification).order_by(Notification.target)).scalars().all()
+    assert [(row.target, row.key, row.job_id) for row in rows] == [
+        ("jellyfin", str(tmp_path), job.id),
+        ("sonarr", str(spec.media_id), job.id),
+    ]
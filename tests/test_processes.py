@@ -0,0 +1,72 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, inspect, text
+
+from src.db import Base, prepare_database
+from src.dispatch import JobNotifier
+from src.wakeups import WakeupBus
+
+def test_prepare_database_migrates_once_under_concurrent_startup(tmp_path):
+    path = tmp_path / "jobs.db"
+    legacy = create_engine(f"sqlite:///{path}")
+    with legacy.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE jobs (id INTEGER NOT NULL, job_type VARCHAR NOT NULL, "
+            "source_path VARCHAR NOT NULL, output_path VARCHAR, status VARCHAR, "
+            "created_at DATETIME, updated_at DATETIME, PRIMARY KEY (id))"
+        ))
+    legacy.dispose()
+
+    # Each "process" has its own engine; unlocked, they race on the same ALTERs
+    engines = [create_engine(f"sqlite:///{path}") for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=len(engines)) as pool:
+        list(pool.map(prepare_database, engines))
+
+    inspector = inspect(engines[0])
+    assert set(Base.metadata.tables) <= set(inspector.get_table_names())
+    assert {"attempts", "media_key", "idempotency_key"} <= {c["name"] for c in inspector.get_columns("jobs")}
+    for engine in engines:
+        engine.dispose()
+
+def _buses(tmp_path, count):
+    notifiers = [(JobNotifier(b"j"), JobNotifier(b"r")) for _ in range(count)]
+    buses = [WakeupBus(str(tmp_path), pair, name=f"p{n}") for n, pair in enumerate(notifiers)]
+    return notifiers, buses
+
+def test_notify_in_one_process_wakes_waiters_in_the_others(tmp_path):
+    async def scenario():
+        notifiers, buses = _buses(tmp_path, 3)
+        for bus in buses:
+            bus.start()
+        try:
+            parked = [jobs.watch() for jobs, _ in notifiers[1:]]
+            results = notifiers[2][1].watch()
+            notifiers[0][0].notify()
+            woken = await asyncio.gather(*(jobs.wait(event, 2) for (jobs, _), event in zip(notifiers[1:], parked)))
+            assert woken == [True, True]
+            # Only the notified channel is woken
+            assert not await notifiers[2][1].wait(results, 0.1)
+        finally:
+            for bus in buses:
+                bus.stop()
+
+    asyncio.run(scenario())
+
+def test_sockets_of_dead_processes_are_removed(tmp_path):
+    async def scenario():
+        notifiers, buses = _buses(tmp_path, 2)
+        buses[0].start()
+        # A socket file nobody is bound to any more, as a killed process leaves
+        stale = WakeupBus(str(tmp_path), (), name="dead")
+        stale.start()
+        stale._loop.remove_reader(stale._sock.fileno())
+        stale._sock.close()
+
+        notifiers[0][0].notify()
+        assert not os.path.exists(stale.path)
+        buses[0].stop()
+        assert os.listdir(tmp_path) == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,199 @@
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.orm import sessionmaker
+
+from src.db import Base, Job, create_db_engine, utcnow
+from src.factories import JobFactory
+from src.JobService import AsyncJobService, JobSpec, pending_queue_query
+from src.queue_index import pending_index, reconcile_once
+from src.workers import LARGE, WorkerCapabilities
+from tests.conftest import SyncJobService, async_sessionmaker_for
+
+@pytest.fixture()
+def index_db(tmp_path):
+    """A file DB with sync and async sessions and a warmed pending index."""
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_sessions = async_sessionmaker_for(url)
+    asyncio.run(reconcile_once(async_sessions))
+
+    yield sessionmaker(bind=engine, autoflush=False, autocommit=False), async_sessions
+
+    pending_index.reset()
+    engine.dispose()
+
+def _db_pending_ids(session_factory) -> set:
+    with session_factory() as session:
+        return set(session.execute(select(Job.id).where(Job.status == "pending")).scalars())
+
+def _specs(prefix: str, count: int, **fields):
+    return [JobSpec(source_path=f"{prefix}/{n}.mkv", **fields) for n in range(count)]
+
+def test_index_claims_in_db_order(index_db):
+    sessions, async_sessions = index_db
+    service = SyncJobService(async_sessions)
+    service.add_jobs(_specs("/a", 5, job_type="movie") + _specs("/b", 5, priority=3))
+    service.add_jobs(_specs("/c", 3, size_class=LARGE, encoder="av1"))
+    with sessions() as session:
+        expected = session.execute(pending_queue_query(100)).scalars().all()
+
+    claimed = [job.id for job in service.claim_pending_jobs(count=100)]
+
+    assert claimed == expected
+    assert len(pending_index) == 0
+
+def test_index_respects_worker_capabilities(index_db):
+    sessions, async_sessions = index_db
+    service = SyncJobService(async_sessions)
+    service.add_jobs(_specs("/small", 2, encoder="hevc") + _specs("/av1", 2, encoder="av1"))
+    service.add_jobs(_specs("/large", 2, size_class=LARGE, encoder="hevc"))
+    service.register_worker("big-node", WorkerCapabilities(cores=64, ram_mb=131072, encoders=["hevc"]))
+    service.register_worker("small-node", WorkerCapabilities(cores=2, ram_mb=2048, encoders=["hevc"]))
+
+    claimed = service.claim_pending_jobs(count=10, worker_id="small-node")
+
+    assert sorted(job.source_path for job in claimed) == ["/small/0.mkv", "/small/1.mkv"]
+    assert pending_index.job_ids() == _db_pending_ids(sessions)
+
+def test_index_falls_back_to_large_jobs_without_a_big_node(index_db):
+    sessions, async_sessions = index_db
+    service = SyncJobService(async_sessions)
+    [(large, _)] = service.add_jobs(_specs("/large", 1, size_class=LARGE, encoder="hevc"))
+    [(small, _)] = service.add_jobs(_specs("/small", 1, encoder="hevc"))
+    service.register_worker("mid-node", WorkerCapabilities(cores=12, ram_mb=65536, encoders=["hevc"]))
+
+    [first] = service.claim_pending_jobs(worker_id="mid-node")
+    [second] = service.claim_pending_jobs(worker_id="mid-node")
+
+    assert (first.id, second.id) == (small.id, large.id)
+    assert len(pending_index) == 0
+
+def test_index_skips_jobs_claimed_by_another_process(index_db):
+    sessions, async_sessions = index_db
+    service = SyncJobService(async_sessions)
+    first, second = [job for job, _ in service.add_jobs(_specs("/a", 2))]
+    with sessions() as session:
+        # Another API process claims the first job behind this index's back
+        session.execute(update(Job).where(Job.id == first.id).values(status="processing"))
+        session.commit()
+
+    [claimed] = service.claim_pending_jobs()
+
+    assert claimed.id == second.id
+    assert len(pending_index) == 0
+
+def test_jobs_queued_by_another_process_are_claimed_and_reconciled(index_db):
+    sessions, async_sessions = index_db
+    with sessions() as session:
+        JobFactory._meta.sqlalchemy_session = session
+        # Not through the service, so this index never heard of them
+        outside = JobFactory.create_batch(3)
+        outside_ids = {job.id for job in outside}
+        assert len(pending_index) == 0
+
+    claimed = SyncJobService(async_sessions).claim_pending_jobs()
+    assert claimed[0].id in outside_ids
+
+    asyncio.run(reconcile_once(async_sessions))
+    assert pending_index.job_ids() == _db_pending_ids(sessions) == outside_ids - {claimed[0].id}
+
+def test_reclaimed_and_reprioritised_jobs_are_reindexed(index_db):
+    sessions, async_sessions = index_db
+    service = SyncJobService(async_sessions)
+    [(job, _), (other, _)] = service.add_jobs(_specs("/a", 2))
+    [claimed] = service.claim_pending_jobs(worker_id="node-a")
+    with sessions() as session:
+        expired = utcnow() - datetime.timedelta(seconds=1)
+        session.execute(update(Job).where(Job.id == claimed.id).values(lease_expires_at=expired))
+        session.commit()
+    assert pending_index.job_ids() == {other.id}
+
+    assert service.reclaim_expired_jobs(max_attempts=3) == 1
+    assert pending_index.job_ids() == {job.id, other.id}
+
+    service.set_priority(other.id, 10)
+    [first] = service.claim_pending_jobs()
+
+    assert first.id == other.id
+
+def test_index_and_db_agree_under_concurrent_insert_and_claim(index_db):
+    sessions, async_sessions = index_db
+    inserters, batches, batch_size, claimers = 4, 10, 5, 6
+    claimed = []
+
+    async def insert(n):
+        for batch in range(batches):
+            async with async_sessions() as session:
+                await AsyncJobService(session).add_jobs(_specs(f"/insert/{n}/{batch}", batch_size))
+            await asyncio.sleep(0)
+
+    async def claim(n):
+        for _ in range(batches * 2):
+            async with async_sessions() as session:
+                jobs = await AsyncJobService(session).claim_pending_jobs(count=2, worker_id=f"node-{n}")
+            claimed.extend(job.id for job in jobs)
+            await asyncio.sleep(0)
+
+    async def reconcile():
+        for _ in range(10):
+            await reconcile_once(async_sessions)
+            await asyncio.sleep(0.001)
+
+    async def load():
+        await asyncio.gather(
+            *(insert(n) for n in range(inserters)),
+            *(claim(n) for n in range(claimers)),
+            reconcile(),
+        )
+
+    asyncio.run(load())
+    assert pending_index.job_ids() == _db_pending_ids(sessions)
+
+    async def drain():
+        while True:
+            async with async_sessions() as session:
+                jobs = await AsyncJobService(session).claim_pending_jobs(count=5)
+            if not jobs:
+                return
+            claimed.extend(job.id for job in jobs)
+
+    asyncio.run(drain())
+    assert len(claimed) == len(set(claimed)) == inserters * batches * batch_size
+    assert len(pending_index) == 0 and not _db_pending_ids(sessions)
+
+def test_index_and_db_agree_across_threads(index_db):
+    sessions, async_sessions = index_db
+    service = SyncJobService(async_sessions)
+
+    def insert(n):
+        for batch in range(10):
+            service.add_jobs(_specs(f"/thread/{n}/{batch}", 4))
+
+    def claim(n):
+        ids = []
+        for _ in range(15):
+            ids += [job.id for job in service.claim_pending_jobs(count=2)]
+        return ids
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        inserts = [pool.submit(insert, n) for n in range(4)]
+        claims = [pool.submit(claim, n) for n in range(4)]
+        claimed = [job_id for future in claims for job_id in future.result()]
+        for future in inserts:
+            future.result()
+
+    assert len(claimed) == len(set(claimed))
+    assert pending_index.job_ids() == _db_pending_ids(sessions)
+
+def test_superseded_jobs_leave_the_index(index_db):
+    sessions, async_sessions = index_db
+    service = SyncJobService(async_sessions)
+    [(old, _)] = service.add_jobs([JobSpec(source_path="/movies/old.mkv", media_key="Radarr/movie/7")])
+    [(new, _)] = service.add_jobs([JobSpec(source_path="/movies/new.mkv", media_key="Radarr/movie/7")])
+
+    assert pending_index.job_ids() == _db_pending_ids(sessions) == {new.id}
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from main import app
+from src.config import settings
+from src.db import Job
+from src.factories import RadarrMediaInfoFactory, RadarrWebhookPayloadFactory, SonarrMediaInfoFactory
+from src.rules import load_rule_engine
+
+client = TestClient(app)
+
+def test_default_rules_skip_files_already_in_target_format():
+    rules = load_rule_engine()
+
+    hevc_aac = RadarrMediaInfoFactory(videoCodec="x265", audioCodec="AAC", audioChannels=6.0)
+    assert rules.decide("movie", hevc_aac) == ("hd-hevc", False)
+
+    h264 = RadarrMediaInfoFactory(videoCodec="x264")
+    assert rules.decide("movie", h264) == ("hd-hevc", True)
+
+    hdr_1080p = SonarrMediaInfoFactory(videoCodec="h265", audioCodec="AAC", audioChannels=2, height=1080, videoDynamicRange="HDR")
+    assert rules.decide("episode", hdr_1080p) == ("hd-hevc", True)
+
+    hdr_4k = SonarrMediaInfoFactory(videoCodec="HEVC", audioCodec="TrueHD", height=2160, width=3840, videoDynamicRange="HDR")
+    assert rules.decide("episode", hdr_4k) == ("uhd-hevc", False)
+
+def test_rules_load_profiles_from_json(tmp_path):
+    profiles_path = tmp_path / "profiles.json"
+    profiles_path.write_text(json.dumps([
+        {"name": "movies-av1", "job_types": ["movie"], "video_codecs": ["av1"]},
+    ]))
+    rules = load_rule_engine(str(profiles_path))
+
+    assert rules.decide("movie", RadarrMediaInfoFactory(videoCodec="AV1")) == ("movies-av1", False)
+    # No profile applies to episodes, so they are queued as before
+    assert rules.decide("episode", SonarrMediaInfoFactory()) == (None, True)
+
+def test_rules_reject_invalid_profiles(tmp_path):
+    profiles_path = tmp_path / "profiles.json"
+    profiles_path.write_text(json.dumps([{"video_codecs": ["hevc"]}]))
+
+    with pytest.raises(ValidationError):
+        load_rule_engine(str(profiles_path))
+
+def test_webhook_for_file_in_target_format_is_recorded_done(db_session):
+    payload = RadarrWebhookPayloadFactory()
+    payload.movieFile.mediaInfo = RadarrMediaInfoFactory(videoCodec="x265")
+
+    response = client.post("/webhook/radarr", json=payload.model_dump())
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "done"
+    assert data["profile"] == "hd-hevc"
+    assert data["output_path"] == payload.movieFile.path
+
+    assert client.get("/job/next").status_code == 404
+
+def test_webhook_records_chosen_profile(db_session):
+    payload = RadarrWebhookPayloadFactory()
+
+    response = client.post("/webhook/radarr", json=payload.model_dump())
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    assert db_session.query(Job).one().profile == "hd-hevc"
+
+def test_webhook_for_file_in_target_format_can_be_ignored(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "transcode_skip_action", "ignore")
+    payload = RadarrWebhookPayloadFactory()
+    payload.movieFile.mediaInfo = RadarrMediaInfoFactory(videoCodec="x265")
+
+    response = client.post("/webhook/radarr", json=payload.model_dump())
+
+    assert response.status_code == 204
+    assert db_session.query(Job).count() == 0
@@ -0,0 +1,96 @@
+import datetime
+
+from fastapi.testclient import TestClient
+
+from main import app
+from src.factories import RadarrWebhookPayloadFactory
+from src.db import QueueFlow
+from src.JobService import JobSpec, default_context
+from src.scheduler import Scheduler, parse_weights
+
+client = TestClient(app)
+scheduler = default_context().scheduler   # the one the `jobs` fixture queues with
+
+def _claim_paths(jobs, count):
+    return [job.source_path for job in jobs.claim_pending_jobs(count)]
+
+def test_season_pack_does_not_starve_a_new_movie(jobs):
+    jobs.add_jobs([
+        JobSpec(source_path=f"/tv/show/s01e{n:02}.mkv", job_type="episode", instance_name="sonarr")
+        for n in range(1, 21)
+    ])
+    jobs.add_jobs([JobSpec(source_path="/movies/new.mkv", job_type="movie", instance_name="radarr")])
+
+    assert _claim_paths(jobs, 3) == ["/tv/show/s01e01.mkv", "/movies/new.mkv", "/tv/show/s01e02.mkv"]
+
+def test_instances_share_the_queue_by_weight(jobs, monkeypatch):
+    monkeypatch.setattr(scheduler, "instance_weights", {"sonarr-4k": 2.0})
+    jobs.add_jobs([
+        JobSpec(source_path=f"/tv/{instance}/{n}.mkv", instance_name=instance)
+        for instance in ("sonarr", "sonarr-4k")
+        for n in range(4)
+    ])
+
+    claimed = _claim_paths(jobs, 6)
+    assert sum(path.startswith("/tv/sonarr-4k/") for path in claimed) == 4
+
+def test_priority_moves_job_ahead(jobs):
+    jobs.add_jobs([JobSpec(source_path=f"/tv/{n}.mkv") for n in range(3)])
+    last = jobs.add_jobs([JobSpec(source_path="/tv/3.mkv")])[0][0]
+
+    response = client.post(f"/job/{last.id}/priority", json={"priority": 1})
+    assert response.status_code == 200
+    assert response.json()["priority"] == 1
+
+    assert _claim_paths(jobs, 1) == ["/tv/3.mkv"]
+
+    response = client.post(f"/job/{last.id}/priority", json={"priority": 2})
+    assert response.status_code == 400
+
+def test_webhook_priority_comes_from_query(jobs):
+    jobs.add_jobs([JobSpec(source_path=f"/tv/{n}.mkv") for n in range(3)])
+    payload = RadarrWebhookPayloadFactory()
+
+    response = client.post("/webhook/radarr", params={"priority": 5}, json=payload.model_dump())
+    assert response.status_code == 200
+    assert response.json()["priority"] == 5
+
+    assert client.get("/job/next").json()["source_path"] == payload.movieFile.path
+
+def test_shortest_job_first(jobs, monkeypatch):
+    monkeypatch.setattr(scheduler, "sjf_bytes_per_second", 1_000_000)
+    jobs.add_jobs([
+        JobSpec(source_path="/movies/long.mkv", instance_name="radarr", size_bytes=8_000_000_000),
+        JobSpec(source_path="/movies/short.mkv", instance_name="radarr", size_bytes=400_000_000),
+    ])
+
+    assert _claim_paths(jobs, 2) == ["/movies/short.mkv", "/movies/long.mkv"]
+
+def test_duplicates_and_done_records_leave_the_flow_clock_alone(db_session, jobs):
+    jobs.add_jobs([JobSpec(source_path="/tv/1.mkv", instance_name="sonarr")])
+    flow = db_session.get(QueueFlow, scheduler.flow("episode", "sonarr"))
+    next_slot = flow.next_slot
+
+    jobs.add_jobs([
+        JobSpec(source_path="/tv/1.mkv", instance_name="sonarr"),                  # duplicate
+        JobSpec(source_path="/tv/2.mkv", instance_name="sonarr", status="done"),   # already meets its profile
+    ])
+    db_session.refresh(flow)
+    assert flow.next_slot == next_slot
+
+    [(job, created)] = jobs.add_jobs([JobSpec(source_path="/tv/3.mkv", instance_name="sonarr")])
+    db_session.refresh(flow)
+    assert created and job.fair_slot == next_slot
+    assert flow.next_slot == next_slot + scheduler.spacing("episode", "sonarr")
+
+def test_old_jobs_age_past_later_priority_jobs():
+    local = Scheduler(fair_share_slot_seconds=60, priority_step_seconds=600, job_type_weights={"movie": 2})
+    queued_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+
+    # A priority-1 job queued more than one priority step later goes behind
+    assert local.schedule_key(queued_at) < local.schedule_key(queued_at + 601, priority=1)
+    assert local.spacing("movie", "radarr") == 30
+
+def test_parse_weights():
+    assert parse_weights("movie=2, episode=0.5,") == {"movie": 2.0, "episode": 0.5}
+    assert parse_weights("") == {}
@@ -0,0 +1,64 @@
+import datetime
+import json
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect
+
+from benchmarks.bench_startup import import_profile
+from main import create_app
+from src.config import Settings
+from src.db import Base
+from src.queue_index import pending_index
+
+# Kept out of `import main` so a cold start only pays for what serving needs
+DEFERRED_MODULES = {"faker", "factory", "src.factories", "src.schemas.radarr", "src.schemas.sonarr"}
+
+def test_importing_main_skips_heavy_modules_and_the_database():
+    profile = import_profile("main")
+
+    assert {"main", "src.db", "src.JobService"} <= profile.modules
+    assert not DEFERRED_MODULES & profile.modules
+    assert profile.created_files == []
+
+def test_full_payload_models_load_on_first_use():
+    from src.factories import RadarrWebhookPayloadFactory
+    from src.schemas.webhook import RadarrImport
+
+    payload = RadarrWebhookPayloadFactory()
+    slim = RadarrImport.from_json(payload.model_dump_json().encode())
+
+    assert slim.full().movie.title == payload.movie.title
+
+def test_create_app_migrates_and_warms_on_startup(tmp_path):
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    app = create_app(Settings(database_url=url, wakeup_dir=str(tmp_path / "wakeups")))
+
+    assert not (tmp_path / "app.db").exists()
+    with TestClient(app) as client:
+        assert set(Base.metadata.tables) <= set(inspect(create_engine(url)).get_table_names())
+        assert pending_index.ready
+        assert client.get("/jobs").json() == {"jobs": [], "next_cursor": None}
+    assert not pending_index.ready
+
+def test_create_app_applies_its_own_settings(tmp_path):
+    from src.factories import RadarrWebhookPayloadFactory
+
+    profiles_path = tmp_path / "profiles.json"
+    app = create_app(Settings(
+        database_url=f"sqlite:///{tmp_path / 'app.db'}",
+        wakeup_dir=str(tmp_path / "wakeups"),
+        lease_duration_seconds=30,
+        webhook_reply_cache_size=7,
+        transcode_profiles_path=str(profiles_path),
+    ))
+    assert app.state.webhook_replies.max_entries == 7
+
+    # The profiles are read on first use, not when the app is built
+    profiles_path.write_text(json.dumps([{"name": "movies-only", "job_types": ["movie"], "video_codecs": ["hevc"]}]))
+    with TestClient(app) as client:
+        job = client.post("/webhook/radarr", json=RadarrWebhookPayloadFactory().model_dump()).json()
+        assert job["profile"] == "movies-only"
+
+        claimed = client.get("/job/next", params={"worker_id": "w1"}).json()
+        expires_at = datetime.datetime.fromisoformat(claimed["lease_expires_at"])
+        assert expires_at - datetime.datetime.fromisoformat(claimed["updated_at"]) <= datetime.timedelta(seconds=30)
@@ -0,0 +1,149 @@
+import asyncio
+import datetime
+import hashlib
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from main import app
+from src.config import Settings
+from src.factories import write_matroska
+from src.JobService import AsyncJobService
+from src.validation import JobValidator, container_errors, file_checksum
+from src.validation_stage import validate_once
+
+client = TestClient(app)
+
+def mp4_box(kind: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+def test_checksum_streams_in_chunks(tmp_path):
+    path = tmp_path / "out.mkv"
+    data = os.urandom(100_003)
+    path.write_bytes(data)
+
+    assert file_checksum(str(path), chunk_size=4096) == hashlib.sha256(data).hexdigest()
+
+def test_truncated_matroska_fails_integrity(tmp_path):
+    path = write_matroska(tmp_path / "out.mkv", 10_000)
+    assert container_errors(path) == []
+
+    with open(path, "r+b") as f:
+        f.truncate(5_000)
+    assert "Segment ends at byte" in container_errors(path)[0]
+
+def test_mp4_boxes_must_tile_file_and_include_moov(tmp_path):
+    path = tmp_path / "out.mp4"
+    path.write_bytes(mp4_box(b"ftyp", b"isom") + mp4_box(b"moov", b"\0" * 64) + mp4_box(b"mdat", b"\0" * 512))
+    assert container_errors(str(path)) == []
+
+    path.write_bytes(mp4_box(b"ftyp", b"isom") + mp4_box(b"mdat", b"\0" * 512))
+    assert container_errors(str(path)) == ["MP4 has no moov box"]
+
+    path.write_bytes(mp4_box(b"ftyp", b"isom") + mp4_box(b"moov", b"\0" * 64)[:40])
+    assert "runs to byte" in container_errors(str(path))[0]
+
+def test_unknown_container_fails(tmp_path):
+    path = tmp_path / "out.mkv"
+    path.write_bytes(os.urandom(1000))
+    assert container_errors(str(path))
+
+def test_size_and_duration_tolerances(tmp_path):
+    source = write_matroska(tmp_path / "source.mkv", 100_000)
+    tiny = write_matroska(tmp_path / "tiny.mkv", 1_000)
+    output = write_matroska(tmp_path / "output.mkv", 40_000)
+    durations = {source: 3600.0, tiny: 3600.0, output: 1800.0}
+    validator = JobValidator(Settings(), probe_duration=durations.get)
+
+    assert validator.validate(source, tiny).errors == ["Output is 1.0% of the source size"]
+    assert validator.validate(source, output).errors == ["Output runs 1800.0s, source 3600.0s"]
+
+    durations[output] = 3590.0
+    result = validator.validate(source, output)
+    assert result.ok
+    assert result.checksum == file_checksum(output)
+
+def test_invalid_output_fails_job_with_reason(async_db_sessionmaker, jobs, tmp_path):
+    jobs.add_job(write_matroska(tmp_path / "file.mkv"))
+    [job] = jobs.claim_pending_jobs()
+
+    jobs.submit_output(job.id, str(tmp_path / "missing.mkv"))
+    asyncio.run(validate_once(async_db_sessionmaker))
+    job = jobs.get_job(job.id)
+
+    assert job.status == "failed"
+    assert "does not exist" in job.error_message
+    assert job.output_checksum is None
+
+def submitted_job(jobs, tmp_path):
+    """A claimed job whose worker has just submitted a valid output."""
+    jobs.add_job(write_matroska(tmp_path / "file.mkv"))
+    [job] = jobs.claim_pending_jobs()
+    response = client.patch(f"/job/{job.id}", json={"output_path": write_matroska(tmp_path / "file.hevc.mkv")})
+    assert response.status_code == 202
+    return job
+
+def test_validation_runs_off_the_event_loop(jobs, async_db_sessionmaker, tmp_path, monkeypatch):
+    validate = JobValidator.validate
+
+    def slow_validate(self, source_path, output_path):
+        time.sleep(0.5)   # stands in for hashing a very large file
+        return validate(self, source_path, output_path)
+
+    monkeypatch.setattr(JobValidator, "validate", slow_validate)
+
+    # Submitting never waits for validation
+    started = time.perf_counter()
+    job = submitted_job(jobs, tmp_path)
+    assert time.perf_counter() - started < 0.5
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        validated = await validate_once(async_db_sessionmaker)
+        ticker.cancel()
+        return validated, ticks
+
+    validated, ticks = asyncio.run(run())
+    assert validated.id == job.id
+    assert validated.status == "done"
+    assert ticks >= 20
+
+def test_client_can_wait_for_the_result(jobs, async_db_sessionmaker, tmp_path):
+    job = submitted_job(jobs, tmp_path)
+    assert client.get(f"/job/{job.id}").json()["status"] == "validating"
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        waiting = pool.submit(client.get, f"/job/{job.id}", params={"wait": 10})
+        time.sleep(0.2)
+        asyncio.run(validate_once(async_db_sessionmaker))
+        started = time.perf_counter()
+        response = waiting.result()
+
+    assert response.json()["status"] == "done"
+    assert time.perf_counter() - started < 5
+
+def test_dead_validator_lease_is_taken_over(jobs, async_db_sessionmaker, tmp_path):
+    job = submitted_job(jobs, tmp_path)
+
+    async def claims():
+        async with async_db_sessionmaker() as session:
+            service = AsyncJobService(session)
+            dead = await service.claim_validations(1, lease=datetime.timedelta(seconds=-1))
+            live = await service.claim_validations(1)
+            blocked = await service.claim_validations(1)
+            return dead, live, blocked
+
+    dead, live, blocked = asyncio.run(claims())
+    assert [j.id for j in dead] == [j.id for j in live] == [job.id]
+    assert blocked == []
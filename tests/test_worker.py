@@ -0,0 +1,107 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from tests.conftest import SyncJobService
+from src.factories import write_matroska
+from src.JobService import JobSpec
+from src.validation_stage import validate_once
+from worker.client import JobClient
+from worker.encoders import Encoder, FakeEncoder, Probe
+from worker.runner import run_once
+from worker.segments import plan_segments
+from worker.transcode import TranscodeCancelled, transcode
+
+client = TestClient(app)
+
+def test_segments_start_on_keyframes():
+    keyframes = [0, 2.5, 5, 7.5, 10, 12.5, 15, 17.5]
+    segments = plan_segments(20, keyframes, 4)
+
+    assert [(s.start, s.end) for s in segments] == [(0, 5), (5, 10), (10, 15), (15, 20)]
+    assert all(s.start in keyframes for s in segments)
+
+def test_segments_without_keyframes_cover_whole_input():
+    assert [(s.start, s.end) for s in plan_segments(20, [], 4)] == [(0, 20)]
+    assert [(s.start, s.end) for s in plan_segments(20, [0, 10], 1)] == [(0, 20)]
+
+def test_transcode_encodes_segments_in_parallel_processes(tmp_path):
+    source = tmp_path / "movie.mkv"
+    source.write_bytes(os.urandom(300_000))
+    output = tmp_path / "movie.hevc.mkv"
+    encoder = FakeEncoder(bytes_per_second=10_000, keyframe_interval=1.0)
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        transcode(str(source), str(output), "hevc", encoder, pool, processes=4, min_segment_seconds=5)
+
+    assert output.read_bytes() == source.read_bytes()
+
+def test_worker_claims_transcodes_and_reports(db_session, async_db_sessionmaker, tmp_path):
+    source = write_matroska(tmp_path / "episode.mkv", 50_000)
+    job = SyncJobService(async_db_sessionmaker).add_job(source)
+
+    jobs = JobClient(client, "node-a")
+    jobs.register({"cores": 4, "ram_mb": 8192, "encoders": ["hevc"]})
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        done = run_once(jobs, FakeEncoder(bytes_per_second=1_000), pool, 2, str(tmp_path))
+
+    assert done["id"] == job.id
+    assert done["status"] == "validating"
+    assert done["output_path"] == str(tmp_path / "episode.transcoded.mkv")
+    assert os.path.exists(done["output_path"])
+
+    asyncio.run(validate_once(async_db_sessionmaker))
+    assert jobs.result(job.id)["status"] == "done"
+
+    assert run_once(jobs, FakeEncoder(), pool, 2, str(tmp_path)) is None
+
+def test_cancelled_transcode_stops_before_concat(tmp_path):
+    source = tmp_path / "movie.mkv"
+    source.write_bytes(os.urandom(100_000))
+    output = tmp_path / "movie.hevc.mkv"
+    cancelled = threading.Event()
+    cancelled.set()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        with pytest.raises(TranscodeCancelled):
+            transcode(
+                str(source), str(output), "hevc", FakeEncoder(bytes_per_second=1_000), pool,
+                processes=4, min_segment_seconds=5, cancelled=cancelled,
+            )
+
+    assert not output.exists()
+
+def test_encoder_backends_must_implement_every_step():
+    class ProbeOnly(Encoder):
+        def probe(self, source):
+            return Probe(duration=0.0, keyframes=[])
+
+    with pytest.raises(TypeError):
+        ProbeOnly()
+
+def test_worker_abandons_superseded_job(db_session, async_db_sessionmaker, tmp_path):
+    service = SyncJobService(async_db_sessionmaker)
+    source = write_matroska(tmp_path / "episode.mkv", 50_000)
+    [(job, _)] = service.add_jobs([JobSpec(source_path=source, media_key="Sonarr/series/1/episodes/1")])
+    jobs = JobClient(client, "node-a")
+
+    class Superseding(FakeEncoder):
+        def encode_segment(self, *args):
+            # The upgrade arrives while the first segment is being encoded
+            service.add_jobs(
+                [JobSpec(source_path=str(tmp_path / "upgrade.mkv"), media_key="Sonarr/series/1/episodes/1")]
+            )
+            time.sleep(0.3)
+            return super().encode_segment(*args)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        assert run_once(jobs, Superseding(bytes_per_second=1_000), pool, 4, str(tmp_path), heartbeat_interval=0.1) is None
+
+    assert not os.path.exists(tmp_path / "episode.transcoded.mkv")
+    assert service.get_job(job.id).status == "cancelled"
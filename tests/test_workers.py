@@ -0,0 +1,103 @@
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from main import app
+from src.config import settings
+from src.db import Job, utcnow
+from src.factories import JobFactory, RadarrMediaInfoFactory, RadarrWebhookPayloadFactory
+from src.JobService import JobSpec, pending_queue_query
+from src.workers import LARGE
+
+client = TestClient(app)
+
+BIG_NODE = {"cores": 64, "ram_mb": 131072, "encoders": ["HEVC", "x264"]}
+SMALL_NODE = {"cores": 4, "ram_mb": 8192, "encoders": ["hevc"]}
+
+def _queue(jobs):
+    jobs.add_jobs([
+        JobSpec(source_path="/tv/ep1.mkv", encoder="hevc"),
+        JobSpec(source_path="/movies/remux.mkv", encoder="hevc", size_class="large", size_bytes=60 * 1024 ** 3),
+        JobSpec(source_path="/tv/ep2.mkv", encoder="hevc"),
+    ])
+
+def _claim(worker_id):
+    response = client.get("/job/next", params={"worker_id": worker_id})
+    return response.json()["source_path"] if response.status_code == 200 else None
+
+def test_register_worker(db_session):
+    response = client.put("/workers/big-1", json=BIG_NODE)
+
+    assert response.status_code == 200
+    assert response.json()["id"] == "big-1"
+    assert response.json()["encoders"] == ["h264", "hevc"]
+
+    response = client.put("/workers/big-1", json=dict(BIG_NODE, cores=32))
+    assert response.json()["cores"] == 32
+
+def test_big_nodes_take_large_jobs_first(jobs):
+    _queue(jobs)
+    client.put("/workers/big-1", json=BIG_NODE)
+    client.put("/workers/small-1", json=SMALL_NODE)
+
+    assert _claim("small-1") == "/tv/ep1.mkv"
+    assert _claim("big-1") == "/movies/remux.mkv"
+    assert _claim("big-1") == "/tv/ep2.mkv"
+
+def test_small_nodes_leave_large_jobs_to_big_nodes(jobs):
+    _queue(jobs)
+    client.put("/workers/big-1", json=BIG_NODE)
+    client.put("/workers/small-1", json=SMALL_NODE)
+
+    assert _claim("small-1") == "/tv/ep1.mkv"
+    assert _claim("small-1") == "/tv/ep2.mkv"
+    assert _claim("small-1") is None
+    # Unregistered workers still take anything
+    assert _claim("legacy") == "/movies/remux.mkv"
+
+def test_large_jobs_fall_back_to_other_workers_without_a_big_node(jobs):
+    _queue(jobs)
+    client.put("/workers/mid-1", json={"cores": 12, "ram_mb": 65536, "encoders": ["hevc"]})
+
+    assert _claim("mid-1") == "/tv/ep1.mkv"
+    assert _claim("mid-1") == "/tv/ep2.mkv"
+    assert _claim("mid-1") == "/movies/remux.mkv"
+
+def test_overdue_large_jobs_go_to_any_capable_worker(jobs):
+    waited = datetime.timedelta(seconds=settings.large_job_fallback_seconds + 60)
+    JobFactory(source_path="/movies/uhd.mkv", size_class=LARGE, encoder="hevc", schedule_key=(utcnow() - waited).timestamp())
+    _queue(jobs)
+    client.put("/workers/big-1", json=BIG_NODE)
+    client.put("/workers/small-1", json=SMALL_NODE)
+
+    # The big node is busy elsewhere; the job has waited long enough
+    assert _claim("small-1") == "/movies/uhd.mkv"
+    assert _claim("small-1") == "/tv/ep1.mkv"
+
+def test_workers_only_get_jobs_they_can_encode_and_store(jobs):
+    jobs.add_jobs([
+        JobSpec(source_path="/tv/av1.mkv", encoder="av1"),
+        JobSpec(source_path="/tv/big.mkv", encoder="hevc", size_bytes=5 * 1024 ** 3),
+    ])
+    client.put("/workers/small-1", json=dict(SMALL_NODE, max_file_size_bytes=1024 ** 3))
+
+    assert _claim("small-1") is None
+
+def test_webhook_records_job_requirements(db_session):
+    payload = RadarrWebhookPayloadFactory()
+    payload.movieFile.mediaInfo = RadarrMediaInfoFactory(height=2160, width=3840)
+
+    response = client.post("/webhook/radarr", json=payload.model_dump())
+
+    assert response.json()["size_class"] == LARGE
+    assert response.json()["encoder"] == "hevc"
+
+def test_capability_claim_uses_size_class_index(db_session, jobs):
+    _queue(jobs)
+    query = pending_queue_query(1, Job.size_class == LARGE, Job.encoder.in_(["hevc"]))
+    compiled = query.compile(dialect=db_session.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = " | ".join(row[-1] for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+    assert "ix_jobs_status_size_class_schedule_key" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,15 @@
+from .client import JobClient
+from .encoders import BACKENDS, Encoder, FakeEncoder, FfmpegEncoder
+from .runner import run_forever, run_once
+from .transcode import transcode
+
+__all__ = [
+    "BACKENDS",
+    "Encoder",
+    "FakeEncoder",
+    "FfmpegEncoder",
+    "JobClient",
+    "run_forever",
+    "run_once",
+    "transcode",
+]
@@ -0,0 +1,57 @@
+"""
+Reference transcode worker: registers its capabilities, then claims jobs from
+the API, encodes them segment-parallel on a process pool and reports back.
+
+    python -m worker --api-url http://app:8000 --backend ffmpeg --output-dir /media/transcoded
+"""
+import argparse
+import logging
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from worker.client import JobClient
+from worker.encoders import BACKENDS
+from worker.runner import run_forever
+
+def total_ram_mb() -> int:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api-url", default="http://localhost:8000")
+    parser.add_argument("--worker-id", default=socket.gethostname())
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="ffmpeg")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="segments encoded in parallel")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--wait", type=float, default=30.0, help="long-poll seconds per claim")
+    parser.add_argument("--heartbeat-interval", type=float, default=30.0)
+    parser.add_argument("--max-file-size-gb", type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    encoder = BACKENDS[args.backend]()
+
+    with httpx.Client(base_url=args.api_url, timeout=args.wait + 30) as http, \
+            ProcessPoolExecutor(max_workers=args.processes) as pool:
+        client = JobClient(http, args.worker_id)
+        client.register({
+            "cores": os.cpu_count(),
+            "ram_mb": total_ram_mb(),
+            "encoders": encoder.encoders,
+            "max_file_size_bytes": int(args.max_file_size_gb * 1024 ** 3) if args.max_file_size_gb else None,
+        })
+        run_forever(
+            client,
+            encoder,
+            pool,
+            args.processes,
+            args.output_dir,
+            wait=args.wait,
+            heartbeat_interval=args.heartbeat_interval,
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import time
+from typing import Optional
+
+import httpx
+
+# Admission control on the API answers these with a Retry-After when loaded
+SHED_STATUSES = (429, 503)
+
+class JobCancelled(Exception):
+    """The job was cancelled, e.g. superseded by a newer import; stop working on it."""
+
+def retry_after(response: httpx.Response, default: float = 1.0) -> float:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return default
+
+class JobClient:
+    """The worker's side of the job API."""
+
+    def __init__(self, http: httpx.Client, worker_id: str):
+        self.http = http
+        self.worker_id = worker_id
+
+    def register(self, capabilities: dict) -> dict:
+        response = self.http.put(f"/workers/{self.worker_id}", json=capabilities)
+        response.raise_for_status()
+        return response.json()
+
+    def claim(self, wait: float = 0) -> Optional[dict]:
+        """
+        Claim the next job, long-polling up to `wait` seconds. None if there is
+        none, or if the API is shedding load, after waiting as long as it asks.
+        """
+        response = self.http.get("/job/next", params={"worker_id": self.worker_id, "wait": wait})
+        if response.status_code == 404:
+            return None
+        if response.status_code in SHED_STATUSES:
+            time.sleep(retry_after(response))
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def heartbeat(self, job_id: int) -> bool:
+        """
+        Extend the lease on `job_id`. False if the lease was lost to the reaper;
+        raises JobCancelled if the job was cancelled.
+        """
+        response = self.http.post(f"/job/{job_id}/heartbeat", json={"worker_id": self.worker_id})
+        if response.status_code == 409:
+            return False
+        if response.status_code == 410:
+            raise JobCancelled(response.json()["detail"])
+        response.raise_for_status()
+        return True
+
+    def complete(self, job_id: int, output_path: str) -> dict:
+        """Submit the output; the job comes back in validating."""
+        response = self.http.patch(
+            f"/job/{job_id}",
+            json={"output_path": output_path, "worker_id": self.worker_id},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def result(self, job_id: int, wait: float = 0) -> dict:
+        """The job, once its validation has finished or `wait` seconds have passed."""
+        response = self.http.get(f"/job/{job_id}", params={"wait": wait})
+        response.raise_for_status()
+        return response.json()
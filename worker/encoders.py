@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple
+
+from worker.segments import Segment
+
+class Probe(NamedTuple):
+    duration: float             # seconds
+    keyframes: List[float]      # keyframe timestamps, seconds
+
+class Encoder(ABC):
+    """
+    Encoder backend. The worker probes the source once, encodes its segments in
+    parallel (each call may run in a different process, so backends must be
+    picklable) and concatenates them into the output.
+    """
+
+    # Codecs the backend can produce, registered as the worker's encoders
+    encoders: List[str] = []
+    extension = ".mkv"
+
+    @abstractmethod
+    def probe(self, source: str) -> Probe:
+        """Duration and keyframes of `source`, to plan its segments."""
+
+    @abstractmethod
+    def encode_segment(self, source: str, segment: Segment, output: str, codec: str) -> None:
+        """Encode one segment of `source` to `output` with `codec`."""
+
+    @abstractmethod
+    def concat(self, source: str, segments: List[str], output: str) -> None:
+        """Join the encoded segments, in order, into `output`."""
+
+class FfmpegEncoder(Encoder):
+    """Encodes with the ffmpeg/ffprobe binaries; video per segment, audio once at concat."""
+
+    CODECS = {
+        "hevc": "libx265",
+        "h264": "libx264",
+        "av1": "libsvtav1",
+    }
+    encoders = list(CODECS)
+
+    def __init__(self, ffmpeg: str = "ffmpeg", ffprobe: str = "ffprobe", threads: int = 0):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.threads = threads  # per segment; 0 lets ffmpeg decide
+
+    def probe(self, source: str) -> Probe:
+        result = subprocess.run(
+            [
+                self.ffprobe, "-v", "error",
+                "-select_streams", "v:0",
+                "-skip_frame", "nokey",
+                "-show_entries", "format=duration:frame=pts_time",
+                "-of", "json",
+                source,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        info = json.loads(result.stdout)
+        keyframes = [float(frame["pts_time"]) for frame in info.get("frames", []) if "pts_time" in frame]
+        return Probe(float(info["format"]["duration"]), keyframes)
+
+    def encode_segment(self, source: str, segment: Segment, output: str, codec: str) -> None:
+        subprocess.run(
+            [
+                self.ffmpeg, "-v", "error", "-y",
+                "-ss", str(segment.start),
+                "-i", source,
+                "-t", str(segment.end - segment.start),
+                "-map", "0:v:0", "-an",
+                "-c:v", self.CODECS[codec],
+                "-threads", str(self.threads),
+                output,
+            ],
+            check=True,
+        )
+
+    def concat(self, source: str, segments: List[str], output: str) -> None:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as listing:
+            listing.writelines(f"file '{path}'\n" for path in segments)
+        try:
+            subprocess.run(
+                [
+                    self.ffmpeg, "-v", "error", "-y",
+                    "-f", "concat", "-safe", "0", "-i", listing.name,
+                    "-i", source,
+                    "-map", "0:v", "-map", "1:a?",
+                    "-c:v", "copy", "-c:a", "aac",
+                    output,
+                ],
+                check=True,
+            )
+        finally:
+            os.unlink(listing.name)
+
+class FakeEncoder(Encoder):
+    """
+    Local ffmpeg stand-in for tests and benchmarks: no binaries or GPU needed.
+
+    Any file counts as `bytes_per_second` of media with a keyframe every
+    `keyframe_interval` seconds. Encoding a segment copies its bytes after
+    hashing them `rounds` times, so the work is CPU-bound and proportional to
+    the segment's length, and the concatenated output equals the source.
+    """
+
+    encoders = ["hevc", "h264", "av1"]
+
+    def __init__(self, bytes_per_second: int = 1_000_000, keyframe_interval: float = 2.0, rounds: int = 1):
+        self.bytes_per_second = bytes_per_second
+        self.keyframe_interval = keyframe_interval
+        self.rounds = rounds
+
+    def probe(self, source: str) -> Probe:
+        duration = os.path.getsize(source) / self.bytes_per_second
+        count = int(duration / self.keyframe_interval) + 1
+        return Probe(duration, [n * self.keyframe_interval for n in range(count)])
+
+    def encode_segment(self, source: str, segment: Segment, output: str, codec: str) -> None:
+        start = round(segment.start * self.bytes_per_second)
+        end = round(segment.end * self.bytes_per_second)
+        with open(source, "rb") as src:
+            src.seek(start)
+            data = src.read(end - start)
+        for _ in range(self.rounds):
+            hashlib.sha256(data).digest()
+        with open(output, "wb") as out:
+            out.write(data)
+
+    def concat(self, source: str, segments: List[str], output: str) -> None:
+        with open(output, "wb") as out:
+            for path in segments:
+                with open(path, "rb") as segment:
+                    shutil.copyfileobj(segment, out)
+
+BACKENDS = {
+    "ffmpeg": FfmpegEncoder,
+    "fake": FakeEncoder,
+}
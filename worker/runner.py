@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+from concurrent.futures import Executor
+from typing import Optional
+
+from worker.client import JobCancelled, JobClient
+from worker.encoders import Encoder
+from worker.transcode import TranscodeCancelled, transcode
+
+logger = logging.getLogger(__name__)
+
+class Heartbeat:
+    """
+    Keeps a job's lease alive from a background thread while it is encoded.
+    The heartbeat doubles as the cancellation channel: a cancelled job sets
+    `cancelled`, which the transcode checks between segments.
+    """
+
+    def __init__(self, client: JobClient, job_id: int, interval: float):
+        self.client = client
+        self.job_id = job_id
+        self.interval = interval
+        self.lost = False
+        self.cancelled = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                if not self.client.heartbeat(self.job_id):
+                    self.lost = True
+                    logger.warning("Lost the lease on job %d", self.job_id)
+                    return
+            except JobCancelled as exc:
+                self.cancelled.set()
+                logger.info("Abandoning job %d: %s", self.job_id, exc)
+                return
+            except Exception:
+                logger.exception("Heartbeat for job %d failed", self.job_id)
+
+def output_path_for(job: dict, output_dir: str, encoder: Encoder) -> str:
+    stem = os.path.splitext(os.path.basename(job["source_path"]))[0]
+    return os.path.join(output_dir, f"{stem}.{job.get('profile') or 'transcoded'}{encoder.extension}")
+
+def run_once(
+    client: JobClient,
+    encoder: Encoder,
+    pool: Executor,
+    processes: int,
+    output_dir: str,
+    wait: float = 0,
+    heartbeat_interval: float = 30.0,
+) -> Optional[dict]:
+    """
+    Claim one job, transcode it and submit the output for validation. Returns
+    the submitted job, or None when no job was queued within `wait` seconds or
+    the job could not be finished, e.g. because it was cancelled while being
+    encoded. A job that fails to encode is not reported;
+    its lease runs out and the reaper retries it elsewhere.
+    """
+    job = client.claim(wait)
+    if job is None:
+        return None
+
+    output_path = output_path_for(job, output_dir, encoder)
+    with Heartbeat(client, job["id"], heartbeat_interval) as heartbeat:
+        try:
+            transcode(
+                job["source_path"], output_path, job.get("encoder") or "hevc", encoder, pool, processes,
+                cancelled=heartbeat.cancelled,
+            )
+        except TranscodeCancelled:
+            return None
+        except Exception:
+            logger.exception("Transcoding job %d failed", job["id"])
+            return None
+    if heartbeat.lost or heartbeat.cancelled.is_set():
+        return None
+    return client.complete(job["id"], output_path)
+
+def run_forever(client: JobClient, *args, wait: float = 30.0, **kwargs) -> None:
+    while True:
+        job = run_once(client, *args, wait=wait, **kwargs)
+        if job is not None:
+            logger.info("Job %d is %s", job["id"], job["status"])
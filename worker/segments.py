@@ -0,0 +1,27 @@
+import bisect
+from typing import List, NamedTuple, Sequence
+
+class Segment(NamedTuple):
+    index: int
+    start: float   # seconds
+    end: float
+
+def plan_segments(duration: float, keyframes: Sequence[float], count: int) -> List[Segment]:
+    """
+    Split [0, duration) into at most `count` segments that each start on a
+    keyframe, cutting at the keyframe nearest to an even split. Without usable
+    keyframes the whole input is one segment.
+    """
+    keyframes = sorted(k for k in keyframes if 0 < k < duration)
+    cuts = []
+    for n in range(1, count):
+        if not keyframes:
+            break
+        ideal = duration * n / count
+        i = bisect.bisect_left(keyframes, ideal)
+        nearest = min(keyframes[max(i - 1, 0):i + 1], key=lambda k: abs(k - ideal))
+        if not cuts or nearest > cuts[-1]:
+            cuts.append(nearest)
+
+    bounds = [0.0, *cuts, duration]
+    return [Segment(index, start, end) for index, (start, end) in enumerate(zip(bounds, bounds[1:]))]
@@ -0,0 +1,55 @@
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Optional
+
+from worker.encoders import Encoder
+from worker.segments import plan_segments
+
+class TranscodeCancelled(Exception):
+    pass
+
+def transcode(
+    source: str,
+    output: str,
+    codec: str,
+    encoder: Encoder,
+    pool: Executor,
+    processes: int,
+    min_segment_seconds: float = 30.0,
+    workdir: Optional[str] = None,
+    cancelled: Optional[threading.Event] = None,
+) -> str:
+    """
+    Transcode `source` into `output`: split it at keyframes into up to
+    `processes` segments of at least `min_segment_seconds`, encode them in
+    parallel on `pool` and concatenate the results.
+
+    Once `cancelled` is set, segments not yet started are dropped, the running
+    ones are waited for and TranscodeCancelled is raised instead of concatenating.
+    """
+    probe = encoder.probe(source)
+    count = max(1, min(processes, math.floor(probe.duration / min_segment_seconds)))
+    segments = plan_segments(probe.duration, probe.keyframes, count)
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        paths = [os.path.join(tmp, f"segment-{segment.index:04}{encoder.extension}") for segment in segments]
+        futures = [
+            pool.submit(encoder.encode_segment, source, segment, path, codec)
+            for segment, path in zip(segments, paths)
+        ]
+        running = set(futures)
+        while running:
+            _, running = wait(running, timeout=1.0, return_when=FIRST_COMPLETED)
+            if cancelled is not None and cancelled.is_set():
+                for future in running:
+                    future.cancel()
+                # Let running segments finish before the scratch directory goes away
+                wait(futures)
+                raise TranscodeCancelled(source)
+        for future in futures:
+            future.result()
+        encoder.concat(source, paths, output)
+    return output